@@ -0,0 +1,143 @@
+"""
+Figma 信息提取基准：对比旧版 extract_figma_info（每次调用编译标题正则、两次遍历全部行、
+每行未编译的 re.match / re.sub、链接列表线性去重）与当前实现（codingplan.figma：一次遍历、
+模块级预编译正则、子串预筛、集合去重）在多 MB 设计说明上的耗时，并校验两者结果完全一致。
+
+生成的设计说明由普通段落、Figma 标题段落、「链接:」「交互说明:」键值对和正文链接混合而成，
+--unique-links 控制不同链接的数量（旧版去重开销随之平方增长）。
+
+用法:
+    python benchmarks/bench_figma.py
+    python benchmarks/bench_figma.py --sizes 1,16,64 --unique-links 20000 --repeat 3
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from codingplan.figma import FIGMA_SECTION_HEADERS, FIGMA_URL_PATTERN, FigmaInfo, extract_figma_info  # noqa: E402
+
+
+def legacy_extract_figma_info(content: str) -> FigmaInfo:
+    """旧版实现（原样保留，用于对比耗时与校验结果）"""
+    content = content.replace("\x00", "")
+    links: list[str] = []
+    interaction_parts: list[str] = []
+
+    for m in FIGMA_URL_PATTERN.finditer(content):
+        url = m.group(0).rstrip(".,;:)")
+        if url not in links:
+            links.append(url)
+
+    lines = content.split("\n")
+    in_figma_section = False
+    section_content: list[str] = []
+    header_pattern = re.compile("|".join(FIGMA_SECTION_HEADERS), re.IGNORECASE)
+
+    for line in lines:
+        stripped = line.strip()
+        if header_pattern.match(stripped):
+            if section_content and in_figma_section:
+                interaction_parts.append("\n".join(section_content).strip())
+            in_figma_section = True
+            section_content = []
+            continue
+        if in_figma_section:
+            if stripped.startswith("#") and not stripped.startswith("###"):
+                if section_content:
+                    interaction_parts.append("\n".join(section_content).strip())
+                in_figma_section = False
+                section_content = []
+            else:
+                section_content.append(line)
+
+    if section_content and in_figma_section:
+        interaction_parts.append("\n".join(section_content).strip())
+
+    for line in lines:
+        if re.match(r"^\s*链接\s*[:：]\s*", line, re.IGNORECASE):
+            rest = re.sub(r"^\s*链接\s*[:：]\s*", "", line, flags=re.I).strip()
+            url_match = FIGMA_URL_PATTERN.search(rest)
+            if url_match:
+                u = url_match.group(0).rstrip(".,;:)")
+                if u not in links:
+                    links.append(u)
+        if re.match(r"^\s*交互说明\s*[:：]\s*", line, re.IGNORECASE):
+            rest = re.sub(r"^\s*交互说明\s*[:：]\s*", "", line, flags=re.I).strip()
+            if rest and rest not in interaction_parts:
+                interaction_parts.append(rest)
+
+    interaction_desc = "\n\n".join(p for p in interaction_parts if p).strip()
+    return FigmaInfo(links=links, interaction_desc=interaction_desc or "")
+
+
+def _make_notes(size_mb: float, unique_links: int, seed: int) -> str:
+    """生成约 size_mb MB 的合成设计说明"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts: list[str] = []
+    total = 0
+    i = 0
+    while total < target:
+        kind = rng.random()
+        n = rng.randrange(unique_links)
+        link = f"https://www.figma.com/design/{n:06d}/screen?node-id=1-{n % 97}"
+        if kind < 0.05:
+            block = f"## Figma 设计\n\n页面 {i} 的设计稿见 {link}。\n### 状态\n- 默认态、加载态、空态\n"
+        elif kind < 0.10:
+            block = f"## 交互说明\n点击第 {i} 个卡片进入详情，长按弹出菜单。\n\n## 其它 {i}\n"
+        elif kind < 0.20:
+            block = f"链接: {link}\n交互说明：第 {i % 500} 屏下拉刷新，上滑加载更多\n"
+        elif kind < 0.35:
+            block = f"正文提到设计稿 {link}, 以及接口字段说明。\n"
+        else:
+            block = f"第 {i} 段普通需求描述：用户在列表页浏览商品，支持筛选、排序与分页，\x00数据来自接口。\n"
+        parts.append(block)
+        total += len(block.encode("utf-8"))
+        i += 1
+    return "".join(parts)
+
+
+def _best(fn, content: str, repeat: int) -> tuple[float, FigmaInfo]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(content)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CodingPlan Figma 提取基准（旧版 vs 当前实现）")
+    parser.add_argument("--sizes", default="1,4,8", help="设计说明大小（MB），逗号分隔（默认 1,4,8）")
+    parser.add_argument("--unique-links", type=int, default=5000, help="不同 Figma 链接数（默认 5000）")
+    parser.add_argument("--repeat", type=int, default=3, help="每种实现重复次数，取最快一次（默认 3）")
+    parser.add_argument("--seed", type=int, default=1, help="生成内容的随机种子（默认 1）")
+    args = parser.parse_args()
+
+    print(f"不同链接 {args.unique_links} 个，每项取 {args.repeat} 次中最快 | Python {sys.version.split()[0]}")
+    print(f"{'大小':>6} {'行数':>9} {'链接':>6} {'旧版':>9} {'当前':>9} {'加速':>7} {'结果'}")
+    mismatches = 0
+    for size in [float(x) for x in args.sizes.split(",") if x.strip()]:
+        content = _make_notes(size, args.unique_links, args.seed)
+        legacy_sec, legacy = _best(legacy_extract_figma_info, content, args.repeat)
+        current_sec, current = _best(extract_figma_info, content, args.repeat)
+        same = legacy.links == current.links and legacy.interaction_desc == current.interaction_desc
+        mismatches += not same
+        print(
+            f"{size:>4g}MB {content.count(chr(10)):>9} {len(current.links):>6} {legacy_sec:>8.2f}s"
+            f" {current_sec:>8.2f}s {legacy_sec / current_sec:>6.1f}x {'一致' if same else '不一致'}",
+            flush=True,
+        )
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Prompt 传递方式基准：测量不同大小的 prompt 通过 argv / 临时文件传递给子进程的耗时，
+并找出 argv 方式在当前系统上开始失败（E2BIG）的大小。
+
+用法:
+    python benchmarks/bench_prompt_transport.py
+    python benchmarks/bench_prompt_transport.py --max-kb 8192 --repeat 5
+"""
+
+import argparse
+import errno
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 子进程仅读取输入后退出，测量的是传递本身的开销
+_CHILD_ARGV = [sys.executable, "-c", "import sys; len(sys.argv[1])"]
+_CHILD_FILE = [sys.executable, "-c", "import sys; len(open(sys.argv[1], 'rb').read())"]
+
+
+def _timed(fn, repeat: int):
+    """返回 (平均耗时 ms, 错误说明)"""
+    total = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            fn()
+        except OSError as e:
+            if e.errno == errno.E2BIG:
+                return None, "E2BIG"
+            return None, str(e)
+        total += time.perf_counter() - start
+    return total / repeat * 1000, ""
+
+
+def bench(size: int, repeat: int) -> dict:
+    prompt = "需" * (size // 3) + "x" * (size % 3)  # UTF-8 下约 size 字节
+    data = prompt.encode("utf-8")
+
+    def via_argv():
+        subprocess.run([*_CHILD_ARGV, prompt], check=True)
+
+    def via_file():
+        fd, path = tempfile.mkstemp(suffix=".md")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            subprocess.run([*_CHILD_FILE, path], check=True)
+        finally:
+            Path(path).unlink(missing_ok=True)
+
+    row = {"size": len(data)}
+    for name, fn in (("argv", via_argv), ("file", via_file)):
+        row[name] = _timed(fn, repeat)
+    return row
+
+
+def _fmt(cell) -> str:
+    ms, err = cell
+    return f"{ms:8.1f}ms" if ms is not None else f"{err:>10}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prompt 传递方式基准")
+    parser.add_argument("--max-kb", type=int, default=4096, help="最大 prompt 大小（KiB），默认 4096")
+    parser.add_argument("--repeat", type=int, default=3, help="每个大小重复次数，默认 3")
+    args = parser.parse_args()
+
+    try:
+        arg_max = os.sysconf("SC_ARG_MAX")
+    except (ValueError, OSError, AttributeError):
+        arg_max = -1
+    print(f"平台: {sys.platform} | ARG_MAX: {arg_max} | 环境变量总大小: {sum(len(k) + len(v) + 2 for k, v in os.environ.items())} 字节")
+    print(f"{'大小':>10} | {'argv':>10} | {'file':>10}")
+
+    first_failure = None
+    size = 1024
+    while size <= args.max_kb * 1024:
+        # 在 2 的幂附近额外测量 128 KiB 边界（Linux MAX_ARG_STRLEN）
+        for s in sorted({size - 1024, size} if size == 128 * 1024 else {size}):
+            row = bench(s, args.repeat)
+            print(f"{row['size']:>10} | {_fmt(row['argv'])} | {_fmt(row['file'])}")
+            if first_failure is None and row["argv"][0] is None:
+                first_failure = row["size"]
+        size *= 2
+
+    if first_failure is not None:
+        print(f"\nargv 方式在 prompt 约 {first_failure} 字节时失败；CodingPlan 默认 auto 方式对 64 KiB 以内的 prompt 使用 argv，超过时改用临时文件")
+    else:
+        print("\n在测试范围内 argv 方式均未失败")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
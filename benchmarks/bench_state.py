@@ -0,0 +1,168 @@
+"""
+状态存储基准：对比旧版 JSON 状态文件（每次检查点整体重写 state.json、files_done 为路径列表、
+续传时按文件名建集合筛选）与当前实现（codingplan.state：原子快照 + 步骤日志，files_done 为
+路径 -> 内容指纹的字典）在大量需求文件下的开销。
+
+每种实现先写入 files - sample 个已完成需求的状态，再对 sample 个需求各记录 --steps 个
+步骤检查点与 1 条完成记录，测量此规模下：
+    单次写入    平均每条检查点/完成记录的耗时（含落盘）
+    加载        重新加载状态（当前实现含日志重放）
+    续传筛选    对全部需求文件判断是否已完成（当前实现对已完成文件比较大小与 mtime，变化时校验内容摘要）
+    状态大小    state.json（与 state.journal）字节数
+
+用法:
+    python benchmarks/bench_state.py
+    python benchmarks/bench_state.py --files 1000,10000,50000 --sample 100
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from codingplan.state import WorkflowState, file_fingerprint, file_key  # noqa: E402
+
+
+class LegacyState:
+    """旧版 WorkflowState：每次变更整体重写 state.json（非原子），files_done 为列表"""
+
+    def __init__(self, state_file: Path):
+        self.state_file = state_file
+        self.data: dict = {}
+
+    def load(self):
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            self.data = json.load(f)
+
+    def save(self):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+
+    def add_file_done(self, req_file: Path):
+        files_done = self.data.setdefault("files_done", [])
+        if str(req_file) not in files_done:
+            files_done.append(str(req_file))
+        self.data.get("steps_done", {}).pop(str(req_file.resolve()), None)
+        self.save()
+
+    def mark_step_done(self, req_file: Path, step: int):
+        self.data.setdefault("steps_done", {})[str(req_file.resolve())] = step
+        self.data["current_file"] = str(req_file)
+        self.data["current_step"] = step
+        self.save()
+
+    def pending(self, files: list[Path]) -> list[Path]:
+        names = {Path(p).name for p in self.data.get("files_done", [])}
+        return [f for f in files if f.name not in names]
+
+
+def _make_requirements(req_dir: Path, count: int) -> list[Path]:
+    req_dir.mkdir(parents=True, exist_ok=True)
+    files = []
+    for i in range(count):
+        path = req_dir / f"req-{i:05d}.md"
+        path.write_text(f"# 需求 {i}\n\n合成需求 {i}，用于状态存储基准。\n", encoding="utf-8")
+        files.append(path)
+    return files
+
+
+def _size(*paths: Path) -> int:
+    return sum(p.stat().st_size for p in paths if p.exists())
+
+
+def _bench_legacy(root: Path, files: list[Path], sample: list[Path], steps: int) -> dict:
+    state_file = root / "legacy" / "state.json"
+    state = LegacyState(state_file)
+    state.data = {"req_dir": str(files[0].parent), "current_file": None, "current_step": 0,
+                  "files_done": [str(f) for f in files if f not in set(sample)]}
+    state.save()
+
+    start = time.perf_counter()
+    for req_file in sample:
+        for step in range(1, steps + 1):
+            state.mark_step_done(req_file, step)
+        state.add_file_done(req_file)
+    write_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    state = LegacyState(state_file)
+    state.load()
+    load_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pending = state.pending(files)
+    filter_sec = time.perf_counter() - start
+    return {"write_sec": write_sec, "load_sec": load_sec, "filter_sec": filter_sec,
+            "pending": len(pending), "bytes": _size(state_file)}
+
+
+def _bench_current(root: Path, files: list[Path], sample: list[Path], steps: int) -> dict:
+    state_file = root / "current" / "state.json"
+    state = WorkflowState(state_file)
+    sampled = set(sample)
+    state.data = {"req_dir": str(files[0].parent), "current_file": None, "current_step": 0,
+                  "files_done": {file_key(f): file_fingerprint(f) for f in files if f not in sampled}}
+    state.save()
+
+    start = time.perf_counter()
+    for req_file in sample:
+        fingerprint = file_fingerprint(req_file)
+        for step in range(1, steps + 1):
+            state.mark_step_done(req_file, step)
+        state.add_file_done(req_file, fingerprint)
+    write_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    state = WorkflowState(state_file)
+    state.load()
+    load_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pending = [f for f in files if not state.is_file_done(f)]
+    filter_sec = time.perf_counter() - start
+    return {"write_sec": write_sec, "load_sec": load_sec, "filter_sec": filter_sec,
+            "pending": len(pending), "bytes": _size(state_file, state.journal_file)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CodingPlan 状态存储基准（旧版 JSON 列表 vs 快照 + 步骤日志）")
+    parser.add_argument("--files", default="100,1000,10000", help="需求文件数，逗号分隔（默认 100,1000,10000）")
+    parser.add_argument("--sample", type=int, default=50, help="测量写入的需求数（默认 50，其余预先记为已完成）")
+    parser.add_argument("--steps", type=int, default=9, help="每个需求的步骤检查点数（默认 9）")
+    parser.add_argument("--keep", action="store_true", help="保留生成的临时目录")
+    args = parser.parse_args()
+
+    print(f"每个需求 {args.steps} 个检查点 + 1 条完成记录，测量 {args.sample} 个需求 | Python {sys.version.split()[0]}")
+    print(
+        f"{'文件':>7} {'实现':<8} {'单次写入':>10} {'加载':>10} {'续传筛选':>10} {'状态大小':>10} {'待处理':>6}"
+    )
+    for count in [int(x) for x in args.files.split(",") if x.strip()]:
+        tmp = Path(tempfile.mkdtemp(prefix="codingplan-bench-state-"))
+        try:
+            files = _make_requirements(tmp / "requirements", count)
+            sample = files[-min(args.sample, count):]
+            events = len(sample) * (args.steps + 1)
+            for name, bench in (("旧版", _bench_legacy), ("当前", _bench_current)):
+                r = bench(tmp, files, sample, args.steps)
+                print(
+                    f"{count:>7} {name:<8} {r['write_sec'] / events * 1000:>8.3f}ms {r['load_sec'] * 1000:>8.1f}ms"
+                    f" {r['filter_sec'] * 1000:>8.1f}ms {r['bytes'] / 1024:>8.0f}KB {r['pending']:>6}",
+                    flush=True,
+                )
+        finally:
+            if args.keep:
+                print(f"  保留临时目录: {tmp}")
+            else:
+                shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+工作流编排基准：使用内置模拟 Agent（codingplan.mock_agent）驱动 run_workflow，
+测量 1 / 100 / 1000 个合成需求文件在不同 --jobs 下的总耗时、吞吐量、编排开销与状态读写开销。
+
+每个配置在独立子进程中运行（日志等全局状态互不影响），于临时目录中生成项目。
+
+用法:
+    python benchmarks/bench_workflow.py
+    python benchmarks/bench_workflow.py --files 1,100 --jobs 1,4,16 --latency 0.2
+    python benchmarks/bench_workflow.py --files 1000 --jobs 8 --keep
+
+指标说明:
+    agent 调用      Agent 调用次数（每个需求 Step 1-9 约 9 次，另有 Step 10/11）
+    agent 累计      所有 Agent 调用耗时之和（含模拟 Agent 的进程启动）
+    编排开销        总耗时 - agent 累计 / 有效并发数（近似为 CodingPlan 自身耗时）
+    状态读写        状态写入次数（步骤日志追加 + 快照写入）与累计耗时
+"""
+
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _make_project(root: Path, files: int) -> Path:
+    """生成合成项目：requirements/ 下 files 个需求文件"""
+    req_dir = root / "requirements"
+    req_dir.mkdir(parents=True)
+    for i in range(files):
+        (req_dir / f"req-{i:04d}.md").write_text(
+            f"# 需求 {i}\n\n## 功能描述\n\n合成需求 {i}，用于基准测试。\n\n## 验收标准\n\n- 条件 {i}\n",
+            encoding="utf-8",
+        )
+    return req_dir
+
+
+def _child(args: argparse.Namespace) -> int:
+    """在当前进程中运行一次工作流并把指标写入 args.result"""
+    sys.path.insert(0, str(REPO_ROOT))
+    from codingplan import agent as agent_mod
+    from codingplan import workflow
+
+    stats = {"agent_calls": 0, "agent_sec": 0.0, "state_saves": 0, "state_sec": 0.0}
+    lock = threading.Lock()
+
+    original_run_agent_async = agent_mod.run_agent_async
+
+    async def timed_run_agent_async(*a, **kw):
+        start = time.perf_counter()
+        try:
+            return await original_run_agent_async(*a, **kw)
+        finally:
+            with lock:
+                stats["agent_calls"] += 1
+                stats["agent_sec"] += time.perf_counter() - start
+
+    # 状态写入：日志追加与快照写入（追加触发的合并只计一次）
+    depth = threading.local()
+
+    def timed(original):
+        def wrapper(self, *a, **kw):
+            if getattr(depth, "n", 0):
+                return original(self, *a, **kw)
+            depth.n = 1
+            start = time.perf_counter()
+            try:
+                return original(self, *a, **kw)
+            finally:
+                depth.n = 0
+                with lock:
+                    stats["state_saves"] += 1
+                    stats["state_sec"] += time.perf_counter() - start
+        return wrapper
+
+    agent_mod.run_agent_async = timed_run_agent_async
+    workflow.WorkflowState.save = timed(workflow.WorkflowState.save)
+    workflow.WorkflowState._append = timed(workflow.WorkflowState._append)
+
+    project = Path(args.project)
+    start = time.perf_counter()
+    rc = workflow.run_workflow(project, project / "requirements", fresh=True, jobs=args.child_jobs, use_cache=args.cache)
+    stats["wall_sec"] = time.perf_counter() - start
+    stats["returncode"] = rc
+    Path(args.result).write_text(json.dumps(stats), encoding="utf-8")
+    return 0
+
+
+def _run_config(files: int, jobs: int, args: argparse.Namespace) -> dict:
+    tmp = Path(tempfile.mkdtemp(prefix=f"codingplan-bench-{files}x{jobs}-"))
+    try:
+        _make_project(tmp, files)
+        result_file = tmp / "result.json"
+        env = {
+            **os.environ,
+            "CODINGPLAN_AGENT_CMD": f"{shlex.quote(sys.executable)} -m codingplan.mock_agent",
+            "CODINGPLAN_MOCK_LATENCY": args.latency,
+            "CODINGPLAN_MOCK_FAIL_RATE": "0",
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH")])),
+        }
+        cmd = [
+            sys.executable, __file__, "--child",
+            "--project", str(tmp), "--child-jobs", str(jobs), "--result", str(result_file),
+        ]
+        if args.cache:
+            cmd.append("--cache")
+        subprocess.run(cmd, cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        stats = json.loads(result_file.read_text(encoding="utf-8"))
+    finally:
+        if args.keep:
+            print(f"  保留项目目录: {tmp}")
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+    effective = max(1, min(jobs, files))
+    stats.update(
+        files=files,
+        jobs=jobs,
+        throughput=files / stats["wall_sec"] if stats["wall_sec"] else 0.0,
+        overhead_sec=max(0.0, stats["wall_sec"] - stats["agent_sec"] / effective),
+    )
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CodingPlan 工作流编排基准（模拟 Agent）")
+    parser.add_argument("--files", default="1,100,1000", help="需求文件数，逗号分隔（默认 1,100,1000）")
+    parser.add_argument("--jobs", default="1,4", help="并发数，逗号分隔（默认 1,4）")
+    parser.add_argument("--latency", default="0", help="模拟 Agent 每次调用耗时（秒或区间，如 0.1-0.3），默认 0")
+    parser.add_argument("--cache", action="store_true", help="启用文档缓存（默认关闭，测量完整流程）")
+    parser.add_argument("--keep", action="store_true", help="保留生成的项目目录")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--project", help=argparse.SUPPRESS)
+    parser.add_argument("--child-jobs", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return _child(args)
+
+    file_counts = [int(x) for x in args.files.split(",") if x.strip()]
+    job_counts = [int(x) for x in args.jobs.split(",") if x.strip()]
+    print(f"模拟 Agent 延迟: {args.latency}s | 文档缓存: {'开' if args.cache else '关'} | Python {sys.version.split()[0]}")
+    header = (
+        f"{'文件':>6} {'jobs':>5} {'总耗时':>9} {'吞吐(文件/s)':>12} {'agent 调用':>10} {'agent 累计':>10}"
+        f" {'编排开销':>9} {'开销/调用':>9} {'状态写入':>8} {'状态耗时':>9} {'rc':>3}"
+    )
+    print(header)
+    for files in file_counts:
+        for jobs in job_counts:
+            s = _run_config(files, jobs, args)
+            per_call_ms = s["overhead_sec"] / s["agent_calls"] * 1000 if s["agent_calls"] else 0.0
+            print(
+                f"{s['files']:>6} {s['jobs']:>5} {s['wall_sec']:>8.2f}s {s['throughput']:>12.2f} {s['agent_calls']:>10}"
+                f" {s['agent_sec']:>9.2f}s {s['overhead_sec']:>8.2f}s {per_call_ms:>7.1f}ms"
+                f" {s['state_saves']:>8} {s['state_sec']:>8.3f}s {s['returncode']:>3}",
+                flush=True,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,87 +1,430 @@
 """Cursor Agent CLI 封装"""
 
+import asyncio
+import os
+import shlex
 import subprocess
 import sys
+import tempfile
+import threading
 from pathlib import Path
-from types import SimpleNamespace
-from typing import Optional
+from typing import Any, Callable, Optional
 
+from .config import AGENT_CMD
 from .logger import get_step_timeout_seconds
+from .streamjson import StreamJsonParser, StreamStats
+from .stall import STALL_EXIT_CODE, STALL_NUDGE, Activity, changed_since, check_interval, get_stall_timeout_seconds
+
+# 终止子进程时等待其自行退出的秒数，超过后强制 kill
+_TERMINATE_GRACE_SECONDS = 5
+
+# 读取子进程输出的块大小（按块读取再切行，避免超长行触发 StreamReader 的行长度限制）
+_READ_CHUNK_SIZE = 64 * 1024
+
+# 多个 Agent 并发输出时保证按行完整输出
+_output_lock = threading.Lock()
+
+# Prompt 传递方式（环境变量 CODINGPLAN_PROMPT_TRANSPORT）：
+# - auto: 不超过 ARGV_PROMPT_LIMIT 时作为命令行参数传递，超过时改用 file（默认）
+# - argv: 始终作为命令行参数传递
+# - file: 写入 0600 临时文件，命令行仅传递读取该文件的简短指令（prompt 不出现在 ps 输出中）
+PROMPT_TRANSPORTS = ("auto", "argv", "file")
+
+# auto 下命令行参数传递的 prompt 上限（字节）。Linux 单个参数上限 MAX_ARG_STRLEN 为 128 KiB，
+# 总参数+环境变量受 ARG_MAX 限制，留出余量；实测见 benchmarks/bench_prompt_transport.py
+ARGV_PROMPT_LIMIT = 64 * 1024
+
+# 临时 prompt 文件目录（相对 Agent 工作目录，确保 Agent 有权限读取）
+PROMPT_TMP_DIR = ".codingplan/tmp"
+
+
+def get_agent_cmd() -> list[str]:
+    """
+    Agent 可执行命令，默认 agent
+
+    可通过环境变量 CODINGPLAN_AGENT_CMD 指定（按 shell 规则拆分），
+    如 "python -m codingplan.mock_agent" 使用内置的模拟 Agent
+    """
+    cmd = os.environ.get("CODINGPLAN_AGENT_CMD", "").strip()
+    return shlex.split(cmd) if cmd else [AGENT_CMD]
 
 
 def check_agent_installed() -> bool:
-    """检查 Cursor Agent 是否已安装"""
+    """检查 Cursor Agent 是否已安装（codingplan serve 启动时已检查，其任务设置 CODINGPLAN_AGENT_VERIFIED=1 跳过）"""
+    if os.environ.get("CODINGPLAN_AGENT_VERIFIED") == "1":
+        return True
     try:
         result = subprocess.run(
-            ["agent", "--version"],
+            [*get_agent_cmd(), "--version"],
             capture_output=True,
             text=True,
         )
         return result.returncode == 0
-    except FileNotFoundError:
+    except (FileNotFoundError, PermissionError):
         return False
 
 
-def run_agent(
+def get_prompt_transport() -> str:
+    """从环境变量读取 prompt 传递方式，默认 auto"""
+    transport = os.environ.get("CODINGPLAN_PROMPT_TRANSPORT", "auto").strip().lower()
+    return transport if transport in PROMPT_TRANSPORTS else "auto"
+
+
+def _write_prompt_file(prompt: str, cwd: Path) -> Path:
+    """将 prompt 写入 Agent 工作目录下的 0600 临时文件"""
+    tmp_dir = cwd / PROMPT_TMP_DIR
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    ignore_file = tmp_dir / ".gitignore"
+    if not ignore_file.exists():
+        ignore_file.write_text("*\n", encoding="utf-8")
+    # mkstemp 以 0600 权限创建文件
+    fd, path = tempfile.mkstemp(prefix="prompt-", suffix=".md", dir=tmp_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(prompt)
+    return Path(path)
+
+
+def _file_prompt_pointer(path: Path) -> str:
+    """file 方式下通过命令行传递的简短指令"""
+    return (
+        f"本次任务的完整说明保存在文件 {path} 中。"
+        "请先完整读取该文件，然后严格按照其中的要求执行；不要修改或删除该文件。"
+    )
+
+
+def _build_agent_cmd(
+    prompt: str,
+    mode: str,
+    force: bool,
+    output_format: str,
+    cwd: Optional[Path] = None,
+    transport: Optional[str] = None,
+) -> tuple[list[str], Optional[Path]]:
+    """
+    构造 agent 命令行
+
+    Returns:
+        (命令行, 需在调用结束后删除的临时 prompt 文件)
+    """
+    # 移除 null 字节，否则 subprocess 在 Unix 上会报 ValueError: embedded null byte
+    # （PDF 等二进制文件 read_text 时可能产生 null）
+    prompt_safe = prompt.replace("\x00", "")
+
+    transport = transport or get_prompt_transport()
+
+    prompt_file: Optional[Path] = None
+    agent_cmd = get_agent_cmd()
+    if transport == "file" or (transport == "auto" and len(prompt_safe.encode("utf-8")) > ARGV_PROMPT_LIMIT):
+        prompt_file = _write_prompt_file(prompt_safe, cwd or Path.cwd())
+        cmd = [*agent_cmd, "-p", _file_prompt_pointer(prompt_file)]
+    else:
+        cmd = [*agent_cmd, "-p", prompt_safe]
+
+    cmd += [
+        "--mode", mode,
+        "--output-format", output_format,
+    ]
+    if force:
+        cmd.append("--force")
+    return cmd, prompt_file
+
+
+def _write_output(text: str) -> None:
+    """输出 Agent 日志到终端"""
+    with _output_lock:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+def _write_notice(text: str, prefix: Optional[str]) -> None:
+    """输出超时、卡死等提示（prefix 非空时与 Agent 输出一样加 [prefix] 前缀，并发时可区分所属 job）"""
+    if prefix is None:
+        _write_output(f"\n{text}\n")
+    else:
+        _write_output(f"[{prefix}] {text}\n")
+
+
+async def _pump_output(
+    stream: asyncio.StreamReader,
+    prefix: Optional[str],
+    sink: Optional[list[str]] = None,
+    activity: Optional[Activity] = None,
+    parser: Optional[StreamJsonParser] = None,
+) -> None:
+    """
+    逐行读取子进程输出并输出到终端（prefix 非空时加 [prefix] 前缀）
+
+    sink 非空时同时收集输出；activity 非空时每次读到输出都记录活动时间；
+    parser 非空时（stream-json）输出与收集的均为解析后的可读文本
+    """
+    pending = ""
+    while True:
+        chunk = await stream.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            if parser is None:
+                break
+            text = parser.finish()
+            parser = None
+        else:
+            if activity is not None:
+                activity.touch()
+            text = chunk.decode("utf-8", errors="replace")
+            if parser is not None:
+                text = parser.feed(text)
+        if not text:
+            continue
+        if sink is not None:
+            sink.append(text)
+        if prefix is None:
+            _write_output(text)
+            continue
+        pending += text
+        *lines, pending = pending.split("\n")
+        if lines:
+            _write_output("".join(f"[{prefix}] {line}\n" for line in lines))
+    if pending:
+        _write_output(f"[{prefix}] {pending}\n")
+
+
+async def _terminate(proc: asyncio.subprocess.Process) -> None:
+    """终止子进程：先 terminate，超时后 kill"""
+    if proc.returncode is not None:
+        return
+    try:
+        proc.terminate()
+    except ProcessLookupError:
+        return
+    try:
+        await asyncio.wait_for(proc.wait(), _TERMINATE_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            return
+        await proc.wait()
+
+
+async def _watch_stall(activity: Activity, stall_timeout: int, workdir: Path) -> None:
+    """
+    卡死检测：无输出超过 stall_timeout 秒时检查项目文件是否有修改，
+
+    有修改则视为仍在工作，否则返回（由调用方终止子进程）
+    """
+    interval = min(check_interval(stall_timeout), stall_timeout)
+    while True:
+        await asyncio.sleep(interval)
+        if activity.idle_seconds() < stall_timeout:
+            continue
+        if await asyncio.to_thread(changed_since, workdir, activity.last_wall):
+            activity.touch()
+            continue
+        return
+
+
+async def run_agent_async(
     prompt: str,
     cwd: Optional[Path] = None,
     mode: str = "plan",
     force: bool = True,
     output_format: str = "text",
     timeout: Optional[int] = None,
+    prefix: Optional[str] = None,
+    capture: bool = False,
+    stall_timeout: Optional[int] = None,
+    stall_retries: int = 0,
+    stats: Optional[StreamStats] = None,
+    on_result: Optional[Callable[[subprocess.CompletedProcess], None]] = None,
 ) -> subprocess.CompletedProcess:
     """
-    调用 Cursor Agent 执行任务
+    异步调用 Cursor Agent（asyncio 子进程），可与其他调用并发执行
 
     Args:
         prompt: 任务描述
         cwd: 工作目录（项目根目录）
         mode: plan | ask（Cursor CLI 仅支持此两种模式，plan 可修改文件，ask 只读）
         force: 是否允许直接修改文件（非交互模式必需）
-        output_format: text | json | stream-json
+        output_format: text | json | stream-json（stream-json 时增量解析事件流，终端显示可读进度）
         timeout: 超时秒数，None 时使用环境变量 CODINGPLAN_STEP_TIMEOUT（默认 3600）
+        prefix: 非空时 Agent 输出逐行加 [prefix] 前缀（并发时区分各 job），否则直接输出到终端
+        capture: 为 True 时在输出到终端的同时收集输出，结果的 stdout 为完整输出文本
+        stall_timeout: 卡死窗口秒数，Agent 超过该时间既无输出也未修改项目文件时终止；
+            None 时使用环境变量 CODINGPLAN_STALL_TIMEOUT，0 表示关闭
+        stall_retries: 因卡死被终止后，在 prompt 末尾附加提醒重试的次数（每次重试重新计算超时）
+        stats: stream-json 时累加工具调用、修改文件、tokens、首个输出耗时等指标（可多次调用共用）
+        on_result: 每次调用结束（含卡死重试的每一次）时以结果回调，用于记录返回码、超时等
+
+    prompt 的传递方式（argv / 临时文件）由环境变量 CODINGPLAN_PROMPT_TRANSPORT 决定，见 PROMPT_TRANSPORTS
 
     Returns:
-        subprocess.CompletedProcess
+        subprocess.CompletedProcess（capture 为 True 时含 stdout）；超时返回码为 124，卡死为 125。
+        任务被取消时终止子进程并抛出 CancelledError
     """
-    # 移除 null 字节，否则 subprocess 在 Unix 上会报 ValueError: embedded null byte
-    # （PDF 等二进制文件 read_text 时可能产生 null）
-    prompt_safe = prompt.replace("\x00", "")
+    stall_sec = stall_timeout if stall_timeout is not None else get_stall_timeout_seconds()
+    for attempt in range(stall_retries + 1):
+        result = await _run_agent_once(
+            prompt if attempt == 0 else prompt + STALL_NUDGE,
+            cwd, mode, force, output_format, timeout, prefix, capture, stall_sec, stats,
+        )
+        if on_result is not None:
+            on_result(result)
+        if result.returncode != STALL_EXIT_CODE or attempt == stall_retries:
+            return result
+        _write_notice(f"[卡死] 附加提醒后重试（{attempt + 1}/{stall_retries}）", prefix)
+    return result
 
-    cmd = [
-        "agent",
-        "-p", prompt_safe,
-        "--mode", mode,
-        "--output-format", output_format,
-    ]
-    if force:
-        cmd.append("--force")
 
+async def _run_agent_once(
+    prompt: str,
+    cwd: Optional[Path],
+    mode: str,
+    force: bool,
+    output_format: str,
+    timeout: Optional[int],
+    prefix: Optional[str],
+    capture: bool,
+    stall_timeout: int,
+    stats: Optional[StreamStats],
+) -> subprocess.CompletedProcess:
+    """执行一次 Agent 调用（参数含义见 run_agent_async）"""
+    workdir = Path(cwd) if cwd else Path.cwd()
+    cmd, prompt_file = _build_agent_cmd(prompt, mode, force, output_format, cwd=workdir)
     timeout_sec = timeout if timeout is not None else get_step_timeout_seconds()
+    # 卡死检测需要观察输出，此时即使不加前缀也通过管道读取后再输出到终端
+    stream_json = output_format == "stream-json"
+    piped = prefix is not None or capture or stall_timeout > 0 or stream_json
+    sink: Optional[list[str]] = [] if capture else None
+    activity = Activity()
+    parser = StreamJsonParser(stats) if stream_json else None
     try:
-        return subprocess.run(
-            cmd,
-            cwd=cwd or Path.cwd(),
-            capture_output=False,  # 直接输出到终端，便于用户观察
-            text=True,
-            timeout=timeout_sec,
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=str(workdir),
+            stdout=asyncio.subprocess.PIPE if piped else None,  # 未加前缀时直接输出到终端，便于用户观察
+            stderr=asyncio.subprocess.STDOUT if piped else None,
         )
-    except subprocess.TimeoutExpired:
-        print(f"\n[超时] 本步骤已运行超过 {timeout_sec} 秒，已终止。"
-              f" 可通过环境变量 CODINGPLAN_STEP_TIMEOUT 调整（秒）")
-        return SimpleNamespace(returncode=124)
+
+        async def wait() -> int:
+            if piped:
+                await _pump_output(proc.stdout, prefix, sink, activity, parser)
+            return await proc.wait()
+
+        async def supervise() -> int:
+            if not stall_timeout:
+                return await wait()
+            main = asyncio.ensure_future(wait())
+            watchdog = asyncio.ensure_future(_watch_stall(activity, stall_timeout, workdir))
+            try:
+                await asyncio.wait({main, watchdog}, return_when=asyncio.FIRST_COMPLETED)
+                if main.done():
+                    return main.result()
+                # 子进程的后代进程可能仍持有输出管道，终止后不再等待读取结束
+                await _terminate(proc)
+                _write_notice(
+                    f"[卡死] 已连续 {stall_timeout} 秒无输出且项目文件无修改，已终止。"
+                    f" 可通过 .codingplan/codingplan.conf 的 [watchdog] 或 --stall-timeout 调整（秒）",
+                    prefix,
+                )
+                return STALL_EXIT_CODE
+            finally:
+                for task in (main, watchdog):
+                    task.cancel()
+                await asyncio.gather(main, watchdog, return_exceptions=True)
+
+        try:
+            returncode = await asyncio.wait_for(supervise(), timeout_sec)
+        except asyncio.TimeoutError:
+            await _terminate(proc)
+            _write_notice(
+                f"[超时] 本步骤已运行超过 {timeout_sec} 秒，已终止。"
+                f" 可通过 .codingplan/codingplan.conf 的 [timeouts] 或环境变量 CODINGPLAN_STEP_TIMEOUT 调整（秒）",
+                prefix,
+            )
+            return subprocess.CompletedProcess(cmd, 124, stdout="".join(sink) if sink is not None else None)
+        except asyncio.CancelledError:
+            await _terminate(proc)
+            raise
+        return subprocess.CompletedProcess(cmd, returncode, stdout="".join(sink) if sink is not None else None)
+    finally:
+        if parser is not None:
+            # 超时、卡死或取消时输出读取被中断，仍汇总本次调用的指标
+            parser.finish()
+        if prompt_file is not None:
+            prompt_file.unlink(missing_ok=True)
+
+
+async def run_agents_async(calls: list[dict[str, Any]], max_concurrency: Optional[int] = None) -> list[subprocess.CompletedProcess]:
+    """
+    并发执行多个 Agent 调用
+
+    Args:
+        calls: 每项为 run_agent_async 的关键字参数
+        max_concurrency: 最大并发数，None 表示不限制
+
+    Returns:
+        与 calls 顺序一致的结果列表；任一调用被取消时其余调用一并取消
+    """
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def run_one(kwargs: dict[str, Any]) -> subprocess.CompletedProcess:
+        if semaphore is None:
+            return await run_agent_async(**kwargs)
+        async with semaphore:
+            return await run_agent_async(**kwargs)
+
+    return list(await asyncio.gather(*(run_one(kwargs) for kwargs in calls)))
+
+
+def run_agents(calls: list[dict[str, Any]], max_concurrency: Optional[int] = None) -> list[subprocess.CompletedProcess]:
+    """并发执行多个 Agent 调用（同步封装）"""
+    return asyncio.run(run_agents_async(calls, max_concurrency=max_concurrency))
+
+
+def run_agent(
+    prompt: str,
+    cwd: Optional[Path] = None,
+    mode: str = "plan",
+    force: bool = True,
+    output_format: str = "text",
+    timeout: Optional[int] = None,
+    prefix: Optional[str] = None,
+    capture: bool = False,
+    stall_timeout: Optional[int] = None,
+    stall_retries: int = 0,
+    stats: Optional[StreamStats] = None,
+    on_result: Optional[Callable[[subprocess.CompletedProcess], None]] = None,
+) -> subprocess.CompletedProcess:
+    """
+    调用 Cursor Agent 执行任务（run_agent_async 的同步封装，参数含义相同）
+
+    Returns:
+        subprocess.CompletedProcess
+    """
+    return asyncio.run(run_agent_async(
+        prompt,
+        cwd=cwd,
+        mode=mode,
+        force=force,
+        output_format=output_format,
+        timeout=timeout,
+        prefix=prefix,
+        capture=capture,
+        stall_timeout=stall_timeout,
+        stall_retries=stall_retries,
+        stats=stats,
+        on_result=on_result,
+    ))
 
 
-def run_plan(prompt: str, cwd: Optional[Path] = None) -> subprocess.CompletedProcess:
-    """使用 Plan 模式执行（先规划再实现）"""
-    return run_agent(prompt, cwd=cwd, mode="plan")
+def run_plan(prompt: str, cwd: Optional[Path] = None, **options: Any) -> subprocess.CompletedProcess:
+    """使用 Plan 模式执行（先规划再实现）；options 同 run_agent（timeout、prefix 等）"""
+    return run_agent(prompt, cwd=cwd, mode="plan", **options)
 
 
-def run_ask(prompt: str, cwd: Optional[Path] = None) -> subprocess.CompletedProcess:
-    """使用 Ask 模式执行（只读分析，不修改文件）"""
-    return run_agent(prompt, cwd=cwd, mode="ask", force=False)
+def run_ask(prompt: str, cwd: Optional[Path] = None, **options: Any) -> subprocess.CompletedProcess:
+    """使用 Ask 模式执行（只读分析，不修改文件）；options 同 run_agent"""
+    return run_agent(prompt, cwd=cwd, mode="ask", force=False, **options)
 
 
-def run_implement(prompt: str, cwd: Optional[Path] = None) -> subprocess.CompletedProcess:
-    """使用 Plan 模式执行（可修改文件）"""
-    return run_agent(prompt, cwd=cwd, mode="plan")
+def run_implement(prompt: str, cwd: Optional[Path] = None, **options: Any) -> subprocess.CompletedProcess:
+    """使用 Plan 模式执行（可修改文件）；options 同 run_agent"""
+    return run_agent(prompt, cwd=cwd, mode="plan", **options)
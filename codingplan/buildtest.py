@@ -0,0 +1,259 @@
+"""本地编译/运行/测试执行器：Step 8 直接执行配置的命令，仅在失败时调用 Agent 修复"""
+
+import hashlib
+import os
+import re
+import signal
+import subprocess
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from .config import load_project_config
+
+# 配置节名（.codingplan/codingplan.conf）
+BUILD_SECTION = "build"
+
+# 按执行顺序排列的命令项
+BUILD_STAGES = [
+    ("build", "编译"),
+    ("run", "运行"),
+    ("test", "测试"),
+]
+
+DEFAULT_COMMAND_TIMEOUT = 1800
+DEFAULT_MAX_ATTEMPTS = 5
+
+# 超时终止命令时 SIGTERM 之后等待进程组退出的秒数，之后 SIGKILL
+KILL_GRACE_SECONDS = 5
+
+# 失败输出尾部保留的行数/字符数（写入修复 prompt）
+TAIL_LINES = 150
+TAIL_CHARS = 12000
+
+# 失败输出中的关键行（编译错误、断言失败等）
+_FAILURE_LINE_PATTERN = re.compile(
+    r"(error|failed|failure|exception|traceback|assert|cannot find|undefined|not found|panic|错误|失败)",
+    re.IGNORECASE,
+)
+_MAX_FAILURE_LINES = 40
+
+# 计算失败特征前需抹去的易变内容：时间戳、耗时、内存地址、临时路径、端口、进程号与行号。
+# 其余数字（标识符、断言的期望值/实际值、错误码）保留，不同的失败不会被当作同一失败
+_VOLATILE_PATTERNS = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?z?"), "<time>"),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), "<time>"),
+    (re.compile(r"\b\d+(?:\.\d+)?\s*(?:ns|us|µs|ms|s|sec|secs|seconds?|min|mins|minutes?)\b"), "N s"),
+    (re.compile(r"0x[0-9a-f]+"), "0x"),
+    (re.compile(r"/tmp/[^\s:'\"]+"), "/tmp/…"),
+    (re.compile(r"\b(localhost|127\.0\.0\.1|0\.0\.0\.0|\[::1?\]):\d+"), r"\1:N"),
+    (re.compile(r"\b(pid|port)([ =:#]*)\d+"), r"\1\2N"),
+    (re.compile(r":\d+(?::\d+)?(?=[:)\s]|$)"), ":N"),
+    (re.compile(r"\bline \d+"), "line N"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+@dataclass
+class BuildConfig:
+    """构建测试配置"""
+
+    commands: list[tuple[str, str]]  # (阶段, 命令)
+    workdir: Optional[str] = None
+    timeout: int = DEFAULT_COMMAND_TIMEOUT
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+
+
+@dataclass
+class BuildResult:
+    """一次构建测试的结果"""
+
+    success: bool
+    stage: Optional[str] = None  # 失败阶段
+    command: Optional[str] = None  # 失败命令
+    exit_code: Optional[int] = None
+    exit_desc: str = ""
+    output_tail: str = ""
+    failure_lines: list[str] = field(default_factory=list)
+    log_path: Optional[Path] = None
+    duration_sec: float = 0.0
+
+    @property
+    def signature(self) -> str:
+        """失败特征（阶段 + 退出码 + 输出）"""
+        return failure_signature(f"{self.stage}:{self.exit_code}\n" + "\n".join(self.failure_lines or [self.output_tail]))
+
+
+def load_build_config(project_root: Path) -> Optional[BuildConfig]:
+    """
+    读取 [build] 配置，未配置任何命令时返回 None（Step 8 沿用 Agent 执行）
+
+    示例:
+        [build]
+        build = ./gradlew assemble
+        test = ./gradlew test
+        workdir = app
+        timeout = 1800
+        max_attempts = 5
+    """
+    cp = load_project_config(project_root)
+    if not cp.has_section(BUILD_SECTION):
+        return None
+    section = cp[BUILD_SECTION]
+    commands = [
+        (stage, section.get(stage, "").strip())
+        for stage, _ in BUILD_STAGES
+        if section.get(stage, "").strip()
+    ]
+    if not commands:
+        return None
+    try:
+        timeout = max(1, section.getint("timeout", DEFAULT_COMMAND_TIMEOUT))
+        max_attempts = max(1, section.getint("max_attempts", DEFAULT_MAX_ATTEMPTS))
+    except ValueError:
+        timeout, max_attempts = DEFAULT_COMMAND_TIMEOUT, DEFAULT_MAX_ATTEMPTS
+    workdir = section.get("workdir", "").strip() or None
+    return BuildConfig(commands=commands, workdir=workdir, timeout=timeout, max_attempts=max_attempts)
+
+
+def describe_exit_code(exit_code: int) -> str:
+    """解析退出码含义"""
+    if exit_code == 0:
+        return "成功"
+    if exit_code == 124:
+        return "超时"
+    if exit_code == 126:
+        return "命令不可执行（权限不足或不是可执行文件）"
+    if exit_code == 127:
+        return "命令未找到"
+    if exit_code < 0 or exit_code > 128:
+        signum = -exit_code if exit_code < 0 else exit_code - 128
+        try:
+            name = signal.Signals(signum).name
+        except ValueError:
+            name = f"信号 {signum}"
+        return f"被信号终止（{name}）"
+    return f"退出码 {exit_code}"
+
+
+def stage_label(stage: Optional[str]) -> str:
+    """阶段中文名"""
+    return dict(BUILD_STAGES).get(stage or "", stage or "")
+
+
+def tail_text(text: str) -> str:
+    """输出尾部（限制行数与字符数）"""
+    tail = "\n".join(text.splitlines()[-TAIL_LINES:])
+    return tail[-TAIL_CHARS:]
+
+
+def extract_failure_lines(text: str) -> list[str]:
+    """提取失败输出中的关键行"""
+    lines = [line.strip() for line in text.splitlines() if _FAILURE_LINE_PATTERN.search(line)]
+    return lines[-_MAX_FAILURE_LINES:]
+
+
+# Agent 执行 Step 8 时，要求其在回复中将最后一次失败的命令输出原样放在这两行标记之间（见 prompts.step8_build_test）
+REPORT_BEGIN = "=== CODINGPLAN FAILURE OUTPUT BEGIN ==="
+REPORT_END = "=== CODINGPLAN FAILURE OUTPUT END ==="
+REPORT_PLACEHOLDER = "（失败输出）"
+
+_REPORT_PATTERN = re.compile(re.escape(REPORT_BEGIN) + r"\n(.*?)\n?" + re.escape(REPORT_END), re.DOTALL)
+
+
+def extract_reported_failure(reply: str) -> Optional[str]:
+    """Agent 回复中按约定标记给出的失败输出（取最后一段）；未给出时返回 None"""
+    blocks = [b.strip() for b in _REPORT_PATTERN.findall(reply)]
+    blocks = [b for b in blocks if b and b != REPORT_PLACEHOLDER]  # 回显的 prompt 示例不算
+    return blocks[-1] if blocks else None
+
+
+def failure_signature(text: str) -> str:
+    """
+    失败特征：对关键行（无关键行时取末尾 20 行）抹去易变内容后取哈希。
+
+    连续两次特征相同说明上一轮修复未产生效果
+    """
+    lines = extract_failure_lines(text) or text.strip().splitlines()[-20:]
+    normalized = []
+    for line in lines:
+        line = line.lower()
+        for pattern, repl in _VOLATILE_PATTERNS:
+            line = pattern.sub(repl, line)
+        normalized.append(line.strip())
+    return hashlib.sha1("\n".join(normalized).encode("utf-8", errors="replace")).hexdigest()
+
+
+def _kill_group(proc: subprocess.Popen) -> bytes:
+    """终止命令所在的进程组：先 SIGTERM，KILL_GRACE_SECONDS 秒后 SIGKILL；返回已产生的输出"""
+    for sig in (signal.SIGTERM, getattr(signal, "SIGKILL", signal.SIGTERM)):
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(proc.pid, sig)
+            else:
+                proc.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+        try:
+            stdout, _ = proc.communicate(timeout=KILL_GRACE_SECONDS)
+            return stdout or b""
+        except subprocess.TimeoutExpired as e:
+            partial = e.stdout or b""
+    # 脱离进程组的子进程仍持有输出管道：不再等待输出
+    try:
+        proc.wait(timeout=KILL_GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+        pass
+    return partial
+
+
+def run_build(config: BuildConfig, project_root: Path, log_path: Path) -> BuildResult:
+    """
+    依次执行配置的编译/运行/测试命令，捕获输出写入 log_path
+
+    任一命令失败即停止，返回失败阶段、退出码解析、输出尾部与关键行
+    """
+    cwd = project_root / config.workdir if config.workdir else project_root
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    start = datetime.now()
+    with open(log_path, "w", encoding="utf-8") as log:
+        for stage, command in config.commands:
+            log.write(f"$ {command}  # {stage_label(stage)}（cwd: {cwd}）\n")
+            log.flush()
+            # 命令在独立进程组中运行：超时或中断时终止整个进程组，避免残留的测试服务、构建守护进程影响下一次尝试
+            proc = subprocess.Popen(
+                command,
+                shell=True,
+                cwd=cwd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+            try:
+                stdout, _ = proc.communicate(timeout=config.timeout)
+                output = stdout.decode("utf-8", errors="replace")
+                exit_code = proc.returncode
+            except subprocess.TimeoutExpired:
+                output = _kill_group(proc).decode("utf-8", errors="replace")
+                output += f"\n[超时] 命令运行超过 {config.timeout} 秒，已终止"
+                exit_code = 124
+            except BaseException:
+                _kill_group(proc)
+                raise
+            log.write(output)
+            log.write(f"\n[exit {exit_code}]\n\n")
+            log.flush()
+            if exit_code != 0:
+                return BuildResult(
+                    success=False,
+                    stage=stage,
+                    command=command,
+                    exit_code=exit_code,
+                    exit_desc=describe_exit_code(exit_code),
+                    output_tail=tail_text(output),
+                    failure_lines=extract_failure_lines(output),
+                    log_path=log_path,
+                    duration_sec=(datetime.now() - start).total_seconds(),
+                )
+    return BuildResult(success=True, log_path=log_path, duration_sec=(datetime.now() - start).total_seconds())
@@ -0,0 +1,139 @@
+"""文档类步骤的内容寻址缓存（.codingplan/cache/）"""
+
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+# 缓存格式版本，键的组成方式变化时递增以使旧缓存失效
+CACHE_VERSION = "2"
+
+_CHUNK_SIZE = 1024 * 1024
+
+# 最近计算的文件摘要：(路径, 设备, inode, 大小, mtime_ns) -> sha256；
+# 同一次运行中缓存键、依赖图与检查点对未修改的文件只读取一次
+_DIGEST_MEMO_SIZE = 4096
+_digest_memo: "OrderedDict[tuple, str]" = OrderedDict()
+_digest_lock = threading.Lock()
+
+
+def _memo_key(path: Path, st: os.stat_result) -> tuple:
+    return (os.fspath(path), st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def remember_digest(path: Path, st: os.stat_result, digest: str) -> None:
+    """记录已算出的文件摘要（st 为读取前的 stat，文件此后被修改时不会命中）"""
+    with _digest_lock:
+        key = _memo_key(path, st)
+        _digest_memo[key] = digest
+        _digest_memo.move_to_end(key)
+        while len(_digest_memo) > _DIGEST_MEMO_SIZE:
+            _digest_memo.popitem(last=False)
+
+
+def file_digest(path: Path) -> Optional[str]:
+    """文件内容的 sha256（文件不存在时返回 None）；大小与 mtime 未变时复用最近的计算结果"""
+    try:
+        st = os.stat(path)
+        with _digest_lock:
+            digest = _digest_memo.get(_memo_key(path, st))
+        if digest is not None:
+            return digest
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+    except OSError:
+        return None
+    remember_digest(path, st, digest)
+    return digest
+
+
+class StepCache:
+    """
+    文档类步骤（Step 1-4）的产出缓存（Step 6 读取已实现的代码，不缓存）。
+
+    键为需求文件、渲染后的 prompt、上游产出内容及 scope/hint 的哈希；
+    命中时直接恢复缓存的 outputs/*.md 产出，跳过 Agent 调用。
+    extras 为步骤可能顺带写入的文件（如 uncertain/{名}-uncertain.md），按步骤结束时的状态一并缓存与恢复：
+    当时不存在的文件恢复时删除
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(
+        self,
+        step: int,
+        prompt: str,
+        inputs: list[Path],
+        scope: Optional[str] = None,
+        hint: Optional[str] = None,
+    ) -> str:
+        """计算缓存键"""
+        h = hashlib.sha256()
+        h.update(f"v{CACHE_VERSION}\0step{step}\0".encode())
+        h.update(prompt.encode("utf-8", errors="replace"))
+        for path in inputs:
+            h.update(b"\0input\0")
+            h.update(path.name.encode("utf-8", errors="replace"))
+            h.update(b"\0")
+            h.update((file_digest(path) or "<missing>").encode())
+        h.update(f"\0scope\0{scope or ''}\0hint\0{hint or ''}".encode("utf-8", errors="replace"))
+        return h.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.md"
+
+    def _extra_path(self, key: str, index: int) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.extra{index}"
+
+    def restore(self, key: str, output_path: Path, extras: tuple[Path, ...] = ()) -> bool:
+        """命中时将缓存产出复制到 output_path（extras 同样恢复）并返回 True"""
+        entry = self._entry_path(key)
+        if not entry.is_file():
+            with self._lock:
+                self.misses += 1
+            return False
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(entry, output_path)
+        for i, path in enumerate(extras):
+            saved = self._extra_path(key, i)
+            if saved.is_file():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(saved, path)
+            else:
+                path.unlink(missing_ok=True)
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key: str, output_path: Path, extras: tuple[Path, ...] = ()) -> None:
+        """将步骤产出写入缓存（先写临时文件再重命名，避免并发写入半成品；主产出最后写入，命中时 extras 已就绪）"""
+        if not output_path.is_file():
+            return
+        entry = self._entry_path(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        for i, path in enumerate(extras):
+            if path.is_file():
+                self._copy(path, self._extra_path(key, i))
+            else:
+                self._extra_path(key, i).unlink(missing_ok=True)
+        self._copy(output_path, entry)
+
+    @staticmethod
+    def _copy(src: Path, dst: Path) -> None:
+        tmp = dst.with_name(f"{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+    def summary(self) -> str:
+        """命中统计说明"""
+        return f"文档缓存: 命中 {self.hits} 次，未命中 {self.misses} 次"
@@ -5,9 +5,14 @@ import sys
 from pathlib import Path
 
 from .workflow import run_workflow
+from .watch import DEFAULT_DEBOUNCE
 from . import notify
 from . import __version__
+from . import discovery
 from . import init_cmd
+from . import serve_cmd
+from . import stats_cmd
+from . import worker_cmd
 
 
 def main():
@@ -19,6 +24,12 @@ def main():
         sys.exit(init_cmd.run_init(Path.cwd()))
     if "init" in sys.argv and sys.argv[-1] == "init":
         sys.exit(init_cmd.run_init(Path.cwd()))
+    if len(sys.argv) > 1 and sys.argv[1] == "stats":
+        sys.exit(stats_cmd.run_stats(Path.cwd(), sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        sys.exit(serve_cmd.run_serve(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        sys.exit(worker_cmd.run_worker(Path.cwd(), sys.argv[2:]))
 
     parser = argparse.ArgumentParser(
         prog="codingplan",
@@ -27,10 +38,16 @@ def main():
         epilog="""
 命令:
   init                    创建 .codingplan/email.conf、AGENTS.md、Cursor 规则（9 个）等配置
+  stats                   运行历史统计：各步骤 p50/p95、最慢需求、失败率、趋势（stats -h 查看参数）
+  worker <需求目录>       从共享队列认领需求处理，多台主机/多个进程分摊同一需求目录（worker -h 查看参数）
+  serve                   本机任务队列守护进程：多个项目/CI 通过 HTTP 提交任务，共享并发额度（serve -h 查看参数）
   <需求目录>              处理该目录下所有需求文件
 
 示例:
   codingplan init                     # 创建配置
+  codingplan stats --days 7           # 最近 7 天的运行统计
+  codingplan serve --slots 4          # 启动任务队列守护进程（~/.codingplan/serve/serve.sock）
+  codingplan worker ./reqs            # 在共享项目目录的多台主机上各启动一个，分摊需求
   codingplan ./requirements          # 处理 requirements 目录下所有需求
   codingplan ./docs/reqs -r           # 从上次中断处继续
   codingplan ./reqs -f feature-a.md   # 仅处理指定文件
@@ -39,6 +56,15 @@ def main():
   codingplan ./reqs -u uidesign           # 指定 UI 设计目录（默认即 uidesign）
   codingplan ./reqs -e user@example.com   # 完成后发邮件通知
   codingplan ./reqs -t 7200               # 单步超时 2 小时（默认 1 小时）
+  codingplan ./reqs -j 4                  # 最多同时处理 4 个需求文件
+  codingplan ./reqs -j 4 -I               # 每个需求在独立 git worktree 中实现，按顺序合并
+  codingplan ./reqs --incremental         # 仅重跑需求/设计有变化的步骤
+  codingplan ./reqs --no-convert          # Step 1 不做本地转换，始终由 Agent 规范化
+  codingplan ./reqs --recursive --exclude archive      # 包含子目录中的需求，跳过 archive/ 子目录
+  codingplan ./reqs --order changed       # 新增/修改的需求优先处理
+  codingplan ./reqs --stream-json         # 解析 Agent 事件流，记录各步骤工具调用/tokens 等指标
+  codingplan ./reqs -j 4 --trace run.json # 导出运行追踪（Perfetto / chrome://tracing）
+  codingplan ./reqs -j 2 --watch          # 处理完后持续监听，新增/修改的需求自动处理
 
 前置条件:
   1. 已安装 Cursor CLI: curl https://cursor.com/install -fsS | bash
@@ -107,7 +133,100 @@ def main():
         type=int,
         metavar="SECONDS",
         default=None,
-        help="单步超时秒数（默认 3600）。可设环境变量 CODINGPLAN_STEP_TIMEOUT",
+        help="单步超时秒数（默认 3600）。可设环境变量 CODINGPLAN_STEP_TIMEOUT；按步骤配置见 .codingplan/codingplan.conf [timeouts]",
+    )
+    parser.add_argument(
+        "--stall-timeout",
+        dest="stall_timeout",
+        type=int,
+        metavar="SECONDS",
+        default=None,
+        help="卡死检测：Agent 连续该秒数无输出且未修改项目文件时终止并提醒重试（0 关闭，默认关闭）。"
+             "可设环境变量 CODINGPLAN_STALL_TIMEOUT 或 .codingplan/codingplan.conf [watchdog]",
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="jobs",
+        type=int,
+        metavar="N",
+        default=1,
+        help="并发处理的需求文件数（默认 1，逐个处理）。并发时单个文件失败不影响其他文件，结束后汇总失败",
+    )
+    parser.add_argument(
+        "-I", "--isolate",
+        action="store_true",
+        help="每个需求在独立 git worktree（.codingplan/worktrees/）中实现，完成后按需求顺序合并回当前分支；冲突时中止合并并保留分支",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        help="不使用文档缓存（.codingplan/cache/），Step 1-4 始终调用 Agent",
+    )
+    parser.add_argument(
+        "--no-convert",
+        dest="no_convert",
+        action="store_true",
+        help="Step 1 不做本地转换，始终由 Agent 规范化（默认 .md/.txt/.docx/带文本层的 .pdf 在本地转换为 Markdown）",
+    )
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        help="同时处理子目录中的需求文件（默认仅需求目录顶层）",
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        metavar="PATTERN",
+        help="需求文件包含模式（可多次指定，匹配文件名或相对路径，如 'specs/*.md'），默认 *.md *.txt *.docx *.pdf",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        metavar="PATTERN",
+        help="排除的文件或目录模式（可多次指定，如 archive），隐藏文件/目录与 *.figma.md 始终排除",
+    )
+    parser.add_argument(
+        "--order",
+        choices=sorted(discovery.ORDERS),
+        default=discovery.DEFAULT_ORDER,
+        help="需求处理顺序：path 相对路径（默认）、name 文件名、mtime 最近修改优先、size 小文件优先、"
+             "changed 新增/修改的需求优先",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="增量模式：根据产物依赖图与记录的输入指纹，仅重跑需求、Figma 说明或上游文档有变化的步骤",
+    )
+    parser.add_argument(
+        "--stream-json",
+        dest="stream_json",
+        action="store_true",
+        help="以 --output-format stream-json 运行 Agent，终端显示可读进度，"
+             "各步骤工具调用、修改文件、tokens、首个输出耗时写入 .codingplan/logs/metrics.jsonl",
+    )
+    parser.add_argument(
+        "--trace",
+        dest="trace",
+        type=str,
+        metavar="FILE",
+        default=None,
+        help="将工作流、各需求文件、各步骤、Step 8 重试与 Ask 分析等区间写入 FILE"
+             "（Chrome Trace Event Format，可在 Perfetto / chrome://tracing 打开）",
+    )
+    parser.add_argument(
+        "-w", "--watch",
+        action="store_true",
+        help="处理完现有需求后持续监听需求目录，新增或修改的需求文件自动送入处理；"
+             "队列排空时执行一次项目级检查（Step 10/11），Ctrl+C 结束",
+    )
+    parser.add_argument(
+        "--watch-debounce",
+        dest="watch_debounce",
+        type=float,
+        metavar="SECONDS",
+        default=DEFAULT_DEBOUNCE,
+        help=f"--watch 去抖时间：文件最后一次变化后静默该秒数才开始处理（默认 {DEFAULT_DEBOUNCE:g}）",
     )
     parser.add_argument(
         "-v", "--version",
@@ -118,6 +237,17 @@ def main():
     args = parser.parse_args()
     if args.timeout is not None:
         os.environ["CODINGPLAN_STEP_TIMEOUT"] = str(max(60, args.timeout))
+    if args.stall_timeout is not None:
+        os.environ["CODINGPLAN_STALL_TIMEOUT"] = str(max(0, args.stall_timeout))
+
+    if args.incremental and (args.fresh or args.resume):
+        parser.error("--incremental 不能与 --fresh/--resume 同时使用")
+
+    if args.watch and args.single_file:
+        parser.error("--watch 不能与 --file 同时使用")
+
+    if args.jobs < 1:
+        parser.error("--jobs 必须 >= 1")
 
     if not args.req_dir:
         parser.error("请指定需求目录，或使用 'codingplan init' 创建邮件配置模板")
@@ -157,6 +287,19 @@ def main():
         scope=args.scope,
         hint=args.hint,
         notify_emails=notify_emails,
+        jobs=args.jobs,
+        isolate=args.isolate,
+        use_cache=not args.no_cache,
+        incremental=args.incremental,
+        stream_json=args.stream_json,
+        trace_path=Path(args.trace).resolve() if args.trace else None,
+        watch=args.watch,
+        watch_debounce=max(0.0, args.watch_debounce),
+        local_convert=not args.no_convert,
+        include=args.include,
+        exclude=args.exclude,
+        order=args.order,
+        recursive=args.recursive,
     )
     sys.exit(exit_code)
 
@@ -1,5 +1,6 @@
 """配置与常量定义"""
 
+import configparser
 import os
 from pathlib import Path
 
@@ -8,6 +9,11 @@ DIR_UNCERTAIN = "uncertain"
 DIR_OUTPUTS = "outputs"
 DIR_TESTS = "tests"
 DIR_UI_DESIGN = "uidesign"  # 默认 UI 设计目录（Figma 链接与交互说明）
+# 工作流产出目录（需求目录为项目根目录时，发现需求文件不进入这些目录）
+OUTPUT_DIR_NAMES = (DIR_UNCERTAIN, DIR_OUTPUTS, DIR_TESTS)
+
+# 项目级配置文件（.codingplan/codingplan.conf）：构建测试命令、超时等
+PROJECT_CONFIG_FILE = "codingplan.conf"
 
 # 支持的需求文件扩展名
 REQUIREMENT_EXTENSIONS = {".md", ".txt", ".docx", ".pdf"}
@@ -41,3 +47,16 @@ def get_output_dirs(project_root: Path) -> dict:
     for d in dirs.values():
         d.mkdir(parents=True, exist_ok=True)
     return dirs
+
+
+def load_project_config(project_root: Path) -> configparser.ConfigParser:
+    """读取 .codingplan/codingplan.conf（不存在或解析失败时返回空配置）"""
+    cp = configparser.ConfigParser()
+    conf_file = project_root / ".codingplan" / PROJECT_CONFIG_FILE
+    if conf_file.exists():
+        try:
+            cp.read(conf_file, encoding="utf-8")
+        except configparser.Error as e:
+            print(f"提示: 配置文件解析失败，已忽略（{conf_file}: {e}）")
+            return configparser.ConfigParser()
+    return cp
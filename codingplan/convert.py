@@ -0,0 +1,793 @@
+"""
+需求文档本地转换（Step 1 文档规范化）：将 .md / .txt / .docx / 带文本层的 .pdf 转为 Markdown
+
+    .md     原样使用（去除 BOM、NUL，统一换行）
+    .txt    依次尝试 UTF-8、GB18030 解码，加文件名标题
+    .docx   zipfile 流式读取 word/document.xml（iterparse），保留标题、列表、表格、超链接与加粗
+    .pdf    逐个对象解析，FlateDecode 流式解压页面内容流，按 ToUnicode CMap 解码 Tj/TJ 文本
+
+转换失败（扫描版 PDF、加密、文件损坏等）时抛出 ConversionError，由 Agent 完成 Step 1
+"""
+
+import base64
+import mmap
+import re
+import zipfile
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+from xml.etree import ElementTree
+
+# 可本地转换的格式
+CONVERTIBLE_EXTENSIONS = {".md", ".txt", ".docx", ".pdf"}
+
+# 解码结果中可打印字符占比低于该值时视为提取失败（字体无 ToUnicode 等）
+MIN_PRINTABLE_RATIO = 0.9
+
+
+class ConversionError(ValueError):
+    """本地转换失败（原因用于提示）"""
+
+
+# 文件损坏或格式异常时解析代码可能抛出的异常（转换为 ConversionError）
+_PARSE_ERRORS = (
+    zipfile.BadZipFile, ElementTree.ParseError, zlib.error,
+    KeyError, ValueError, TypeError, IndexError, AttributeError, OverflowError, RecursionError,
+)
+
+
+@dataclass
+class Conversion:
+    """转换结果"""
+
+    markdown: str
+    source_format: str  # md / txt / docx / pdf
+    pages: Optional[int] = None  # PDF 页数
+
+
+def convert_to_markdown(path: Path) -> Conversion:
+    """将需求文件转换为 Markdown；不支持或提取失败时抛出 ConversionError"""
+    suffix = path.suffix.lower()
+    try:
+        if suffix == ".md":
+            return Conversion(_normalize_text(_decode_text(path.read_bytes())), "md")
+        if suffix == ".txt":
+            text = _normalize_text(_decode_text(path.read_bytes()))
+            if not text.lstrip().startswith("#"):
+                text = f"# {path.stem}\n\n{text}"
+            return Conversion(text, "txt")
+        if suffix == ".docx":
+            return Conversion(_check_text(_docx_to_markdown(path)), "docx")
+        if suffix == ".pdf":
+            text, pages = _pdf_to_markdown(path)
+            return Conversion(_check_text(text), "pdf", pages=pages)
+    except ConversionError:
+        raise
+    except OSError as e:
+        raise ConversionError(f"读取失败: {e}") from e
+    except _PARSE_ERRORS as e:
+        # 手写的 PDF 词法、对象流与 CMap 解析遇到畸形输入时可能抛出任意一种，均按转换失败处理
+        raise ConversionError(f"解析失败: {type(e).__name__}: {e}") from e
+    raise ConversionError(f"不支持的格式: {suffix or '无扩展名'}")
+
+
+def _decode_text(data: bytes) -> str:
+    for encoding in ("utf-8-sig", "gb18030"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+def _normalize_text(text: str) -> str:
+    text = text.replace("\x00", "").replace("\r\n", "\n").replace("\r", "\n")
+    return text.strip() + "\n"
+
+
+def _check_text(text: str) -> str:
+    text = _normalize_text(text)
+    visible = [c for c in text if not c.isspace()]
+    if not visible:
+        raise ConversionError("未提取到文本（可能为扫描件或图片）")
+    printable = sum(1 for c in visible if c.isprintable() and c != "\ufffd")
+    if printable / len(visible) < MIN_PRINTABLE_RATIO:
+        raise ConversionError("提取的文本无法解码（字体缺少 Unicode 映射）")
+    return text
+
+
+# ---------------------------------------------------------------- DOCX
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+_HEADING_NAME = re.compile(r"^heading\s*(\d)$", re.IGNORECASE)
+
+
+def _docx_relationships(zf: zipfile.ZipFile) -> dict[str, str]:
+    """超链接 r:id -> URL"""
+    try:
+        with zf.open("word/_rels/document.xml.rels") as f:
+            root = ElementTree.parse(f).getroot()
+    except KeyError:
+        return {}
+    return {rel.get("Id", ""): rel.get("Target", "") for rel in root.iter(_PKG_REL)}
+
+
+def _docx_heading_styles(zf: zipfile.ZipFile) -> dict[str, int]:
+    """段落样式 ID -> 标题级别（Title 为 1，heading N 为 N）"""
+    try:
+        with zf.open("word/styles.xml") as f:
+            root = ElementTree.parse(f).getroot()
+    except KeyError:
+        return {}
+    levels: dict[str, int] = {}
+    for style in root.iter(f"{_W}style"):
+        style_id = style.get(f"{_W}styleId", "")
+        name_el = style.find(f"{_W}name")
+        name = name_el.get(f"{_W}val", "") if name_el is not None else ""
+        m = _HEADING_NAME.match(name.strip())
+        if m:
+            levels[style_id] = int(m.group(1))
+        elif name.strip().lower() == "title":
+            levels[style_id] = 1
+        else:
+            outline = style.find(f"{_W}pPr/{_W}outlineLvl")
+            if outline is not None and outline.get(f"{_W}val", "").isdigit() and int(outline.get(f"{_W}val")) < 9:
+                levels[style_id] = int(outline.get(f"{_W}val")) + 1
+    return levels
+
+
+def _docx_ordered_lists(zf: zipfile.ZipFile) -> set[tuple[str, str]]:
+    """有序列表的 (numId, ilvl)（其余视为无序列表）"""
+    try:
+        with zf.open("word/numbering.xml") as f:
+            root = ElementTree.parse(f).getroot()
+    except KeyError:
+        return set()
+    abstract_ordered: dict[str, set[str]] = {}
+    for abstract in root.iter(f"{_W}abstractNum"):
+        levels = set()
+        for lvl in abstract.iter(f"{_W}lvl"):
+            fmt = lvl.find(f"{_W}numFmt")
+            if fmt is not None and fmt.get(f"{_W}val", "bullet") not in ("bullet", "none"):
+                levels.add(lvl.get(f"{_W}ilvl", "0"))
+        abstract_ordered[abstract.get(f"{_W}abstractNumId", "")] = levels
+    ordered = set()
+    for num in root.iter(f"{_W}num"):
+        ref = num.find(f"{_W}abstractNumId")
+        if ref is not None:
+            for ilvl in abstract_ordered.get(ref.get(f"{_W}val", ""), ()):
+                ordered.add((num.get(f"{_W}numId", ""), ilvl))
+    return ordered
+
+
+def _on(el: Optional[ElementTree.Element]) -> bool:
+    """w:b 等开关属性是否开启（无 w:val 或非 0/false）"""
+    return el is not None and el.get(f"{_W}val", "true") not in ("0", "false", "none")
+
+
+def _docx_to_markdown(path: Path) -> str:
+    with zipfile.ZipFile(path) as zf:
+        links = _docx_relationships(zf)
+        headings = _docx_heading_styles(zf)
+        ordered = _docx_ordered_lists(zf)
+        blocks: list[tuple[str, str]] = []  # (类型, Markdown)：para / list / table
+        paragraphs: list[dict] = []  # 嵌套段落栈（文本框内的段落位于外层段落之中）
+        tables: list[list[list[str]]] = []  # 嵌套表格栈：行 -> 单元格
+        cells: list[list[str]] = []  # 当前单元格内的段落
+        run_text: list[str] = []
+        link_starts: list[tuple[int, str]] = []
+        skip = 0  # mc:Fallback 内为重复内容
+
+        with zf.open("word/document.xml") as f:
+            for event, el in ElementTree.iterparse(f, events=("start", "end")):
+                tag = el.tag
+                if tag == _MC_FALLBACK:
+                    skip += 1 if event == "start" else -1
+                    continue
+                if skip:
+                    if event == "end":
+                        el.clear()
+                    continue
+                if event == "start":
+                    if tag == f"{_W}p":
+                        paragraphs.append({"parts": [], "style": None, "num": None})
+                    elif tag == f"{_W}r":
+                        run_text = []
+                    elif tag == f"{_W}hyperlink" and paragraphs:
+                        link_starts.append((len(paragraphs[-1]["parts"]), links.get(el.get(f"{_R}id", ""), "")))
+                    elif tag == f"{_W}tbl":
+                        tables.append([])
+                    elif tag == f"{_W}tr" and tables:
+                        tables[-1].append([])
+                    elif tag == f"{_W}tc":
+                        cells.append([])
+                    continue
+
+                if tag == f"{_W}t":
+                    run_text.append(el.text or "")
+                elif tag == f"{_W}tab":
+                    run_text.append("\t")
+                elif tag in (f"{_W}br", f"{_W}cr"):
+                    run_text.append("\n")
+                elif tag == f"{_W}r" and paragraphs:
+                    text = "".join(run_text)
+                    if text.strip() and _on(el.find(f"{_W}rPr/{_W}b")):
+                        lead, core, trail = _split_space(text)
+                        text = f"{lead}**{core}**{trail}"
+                    paragraphs[-1]["parts"].append(text)
+                    run_text = []
+                elif tag == f"{_W}hyperlink" and paragraphs and link_starts:
+                    start, url = link_starts.pop()
+                    parts = paragraphs[-1]["parts"]
+                    text = "".join(parts[start:]).strip()
+                    if url and text:
+                        parts[start:] = [f"[{text}]({url})" if text != url else url]
+                elif tag == f"{_W}pPr" and paragraphs:
+                    style = el.find(f"{_W}pStyle")
+                    if style is not None:
+                        paragraphs[-1]["style"] = style.get(f"{_W}val")
+                    num = el.find(f"{_W}numPr")
+                    if num is not None:
+                        ilvl, num_id = num.find(f"{_W}ilvl"), num.find(f"{_W}numId")
+                        paragraphs[-1]["num"] = (
+                            num_id.get(f"{_W}val", "") if num_id is not None else "",
+                            ilvl.get(f"{_W}val", "0") if ilvl is not None else "0",
+                        )
+                elif tag == f"{_W}p" and paragraphs:
+                    para = paragraphs.pop()
+                    text = "".join(para["parts"]).strip()
+                    if cells:
+                        if text:
+                            cells[-1].append(text)
+                    elif text:
+                        blocks.append(_docx_block(text, para, headings, ordered))
+                    el.clear()
+                elif tag == f"{_W}tc" and cells:
+                    cell = " <br> ".join(cells.pop()).replace("|", "\\|").replace("\n", " <br> ")
+                    if tables and tables[-1]:
+                        tables[-1][-1].append(cell)
+                elif tag == f"{_W}tbl" and tables:
+                    rows = [r for r in tables.pop() if any(c.strip() for c in r)]
+                    if not rows:
+                        pass
+                    elif cells:
+                        # 嵌套表格：并入外层单元格
+                        cells[-1].append(" / ".join(" ".join(c for c in r if c) for r in rows))
+                    else:
+                        blocks.append(("table", _markdown_table(rows)))
+                    el.clear()
+
+    out: list[str] = []
+    prev = None
+    for kind, text in blocks:
+        if out:
+            out.append("\n" if kind == "list" and prev == "list" else "\n\n")
+        out.append(text)
+        prev = kind
+    return "".join(out)
+
+
+def _split_space(text: str) -> tuple[str, str, str]:
+    core = text.strip()
+    start = text.index(core)
+    return text[:start], core, text[start + len(core):]
+
+
+def _docx_block(text: str, para: dict, headings: dict[str, int], ordered: set[tuple[str, str]]) -> tuple[str, str]:
+    level = headings.get(para["style"] or "")
+    if level:
+        return "para", f"{'#' * min(level, 6)} {text.replace(chr(10), ' ')}"
+    if para["num"] is not None:
+        num_id, ilvl = para["num"]
+        indent = "  " * int(ilvl) if ilvl.isdigit() else ""
+        marker = "1." if (num_id, ilvl) in ordered else "-"
+        return "list", f"{indent}{marker} {text}"
+    return "para", text.replace("\n", "  \n")
+
+
+def _markdown_table(rows: list[list[str]]) -> str:
+    width = max(len(r) for r in rows)
+    rows = [r + [""] * (width - len(r)) for r in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+    lines.extend("| " + " | ".join(r) + " |" for r in rows[1:])
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------- PDF
+
+_PDF_WS = b" \t\r\n\f\x00"
+_PDF_DELIM = b"()<>[]{}/%"
+_OBJ_HEADER = re.compile(rb"(?<![0-9])(\d+)\s+(\d+)\s+obj\b")
+_TRAILER = re.compile(rb"trailer\s*<<")
+
+
+class _Name(str):
+    """PDF 名字对象（/Name）"""
+
+
+@dataclass(frozen=True)
+class _Ref:
+    num: int
+    gen: int
+
+
+@dataclass
+class _Stream:
+    attrs: dict
+    raw: bytes
+
+
+class _Lexer:
+    """PDF 词法/语法分析（对象与内容流共用）"""
+
+    def __init__(self, data, pos: int = 0, end: Optional[int] = None):
+        self.data = data
+        self.pos = pos
+        self.end = len(data) if end is None else end
+
+    def _skip_ws(self) -> None:
+        data, end = self.data, self.end
+        while self.pos < end:
+            c = data[self.pos:self.pos + 1]
+            if c in (b" ", b"\t", b"\r", b"\n", b"\f", b"\x00"):
+                self.pos += 1
+            elif c == b"%":
+                while self.pos < end and data[self.pos:self.pos + 1] not in (b"\r", b"\n"):
+                    self.pos += 1
+            else:
+                return
+
+    def token(self):
+        """下一个词法单元；关键字（含操作符）以 bytes 返回，结束时返回 None"""
+        self._skip_ws()
+        if self.pos >= self.end:
+            return None
+        data = self.data
+        c = data[self.pos:self.pos + 1]
+        if c == b"(":
+            return self._literal_string()
+        if c == b"<":
+            if data[self.pos + 1:self.pos + 2] == b"<":
+                self.pos += 2
+                return b"<<"
+            close = data.find(b">", self.pos)
+            if close < 0 or close > self.end:
+                close = self.end
+            hexstr = re.sub(rb"[^0-9A-Fa-f]", b"", bytes(data[self.pos + 1:close]))
+            self.pos = close + 1
+            if len(hexstr) % 2:
+                hexstr += b"0"
+            return bytearray(bytes.fromhex(hexstr.decode("ascii")))
+        if c == b">" and data[self.pos + 1:self.pos + 2] == b">":
+            self.pos += 2
+            return b">>"
+        if c in (b"[", b"]", b"{", b"}"):
+            self.pos += 1
+            return bytes(c)
+        start = self.pos
+        self.pos += 1
+        while self.pos < self.end:
+            c2 = data[self.pos:self.pos + 1]
+            if c2 in (b" ", b"\t", b"\r", b"\n", b"\f", b"\x00") or c2 in (b"(", b")", b"<", b">", b"[", b"]", b"{", b"}", b"/", b"%"):
+                break
+            self.pos += 1
+        word = bytes(data[start:self.pos])
+        if c == b"/":
+            return _Name(re.sub(rb"#([0-9A-Fa-f]{2})", lambda m: bytes([int(m.group(1), 16)]), word[1:]).decode("latin-1"))
+        try:
+            return int(word)
+        except ValueError:
+            pass
+        try:
+            return float(word)
+        except ValueError:
+            return word
+
+    def _literal_string(self) -> bytearray:
+        data, end = self.data, self.end
+        self.pos += 1
+        out = bytearray()
+        depth = 1
+        while self.pos < end:
+            c = data[self.pos]
+            self.pos += 1
+            if c == 0x5C:  # 反斜杠转义
+                if self.pos >= end:
+                    break
+                e = data[self.pos]
+                self.pos += 1
+                if e in b"nrtbf":
+                    out.append(b"\n\r\t\b\f"[b"nrtbf".index(e)])
+                elif 0x30 <= e <= 0x37:
+                    digits = bytes([e])
+                    while len(digits) < 3 and self.pos < end and 0x30 <= data[self.pos] <= 0x37:
+                        digits += bytes([data[self.pos]])
+                        self.pos += 1
+                    out.append(int(digits, 8) & 0xFF)
+                elif e == 0x0D:
+                    if self.pos < end and data[self.pos] == 0x0A:
+                        self.pos += 1
+                elif e != 0x0A:
+                    out.append(e)
+            elif c == 0x28:
+                depth += 1
+                out.append(c)
+            elif c == 0x29:
+                depth -= 1
+                if depth == 0:
+                    break
+                out.append(c)
+            else:
+                out.append(c)
+        return out
+
+    def value(self, tok=None):
+        """解析一个对象（字典、数组、间接引用等）"""
+        if tok is None:
+            tok = self.token()
+        if type(tok) is bytes and tok == b"<<":
+            result = {}
+            while True:
+                key = self.token()
+                if key is None or (type(key) is bytes and key == b">>"):
+                    return result
+                if isinstance(key, _Name):
+                    result[key] = self.value()
+        if type(tok) is bytes and tok == b"[":
+            items = []
+            while True:
+                t = self.token()
+                if t is None or (type(t) is bytes and t == b"]"):
+                    return items
+                items.append(self.value(t))
+        if isinstance(tok, int):
+            # 可能是间接引用 "n g R"
+            save = self.pos
+            gen = self.token()
+            if isinstance(gen, int):
+                if self.token() == b"R":
+                    return _Ref(tok, gen)
+            self.pos = save
+        return tok
+
+
+class _PdfDocument:
+    """按对象号索引的 PDF（mmap，流内容按需读取与解压，不整体读入）"""
+
+    def __init__(self, data):
+        self.data = data
+        self.offsets: dict[int, int] = {}
+        for m in _OBJ_HEADER.finditer(data):
+            self.offsets[int(m.group(1))] = m.end()  # 增量更新时以后出现的为准
+        self._cache: dict[int, object] = {}
+        self._objstm: dict[int, tuple[int, int]] = {}  # 对象号 -> (对象流号, 偏移)
+        self._objstm_data: dict[int, bytes] = {}
+        self.trailer: dict = {}
+        for m in _TRAILER.finditer(data):
+            trailer = _Lexer(data, m.end() - 2).value()
+            if isinstance(trailer, dict):
+                self.trailer.update(trailer)
+        for num, offset in list(self.offsets.items()):
+            head = data[offset:offset + 512]
+            if b"/XRef" not in head and b"/ObjStm" not in head:
+                continue
+            obj = self.get(num)
+            if not isinstance(obj, _Stream):
+                continue
+            if obj.attrs.get("Type") == "XRef":
+                for key in ("Root", "Encrypt"):
+                    if key in obj.attrs:
+                        self.trailer[_Name(key)] = obj.attrs[key]
+            elif obj.attrs.get("Type") == "ObjStm":
+                self._index_objstm(num, obj)
+
+    def _index_objstm(self, num: int, stream: _Stream) -> None:
+        data = self.decode(stream)
+        lexer = _Lexer(data)
+        first = int(stream.attrs.get("First", 0))
+        for _ in range(int(stream.attrs.get("N", 0))):
+            obj_num, offset = lexer.token(), lexer.token()
+            if not isinstance(obj_num, int) or not isinstance(offset, int):
+                break
+            if obj_num not in self.offsets:
+                self._objstm[obj_num] = (num, first + offset)
+        self._objstm_data[num] = data
+
+    def get(self, num: int):
+        if num in self._cache:
+            return self._cache[num]
+        obj = None
+        if num in self.offsets:
+            lexer = _Lexer(self.data, self.offsets[num])
+            obj = lexer.value()
+            if isinstance(obj, dict) and lexer.token() == b"stream":
+                start = lexer.pos
+                if self.data[start:start + 2] == b"\r\n":
+                    start += 2
+                elif self.data[start:start + 1] in (b"\n", b"\r"):
+                    start += 1
+                # 流对象不缓存（内容流、图片等可能很大）
+                return _Stream(obj, self._stream_bytes(obj, start))
+        elif num in self._objstm:
+            stm_num, offset = self._objstm[num]
+            obj = _Lexer(self._objstm_data.get(stm_num, b""), offset).value()
+        self._cache[num] = obj
+        return obj
+
+    def _stream_bytes(self, attrs: dict, start: int) -> bytes:
+        length = self.resolve(attrs.get("Length"))
+        if isinstance(length, int) and length >= 0 and \
+                self.data[start + length:start + length + 20].lstrip().startswith(b"endstream"):
+            return bytes(self.data[start:start + length])
+        end = self.data.find(b"endstream", start)
+        if end < 0:
+            end = len(self.data)
+        return bytes(self.data[start:end]).rstrip(b"\r\n")
+
+    def resolve(self, obj, depth: int = 0):
+        while isinstance(obj, _Ref) and depth < 32:
+            obj = self.get(obj.num)
+            depth += 1
+        return obj
+
+    def decode(self, stream: _Stream) -> bytes:
+        """按 /Filter 解码流（支持 FlateDecode、ASCII85Decode、ASCIIHexDecode）"""
+        filters = self.resolve(stream.attrs.get("Filter"))
+        filters = filters if isinstance(filters, list) else [filters] if filters else []
+        data = stream.raw
+        for name in filters:
+            name = self.resolve(name)
+            if name in ("FlateDecode", "Fl"):
+                data = _inflate(data)
+            elif name in ("ASCII85Decode", "A85"):
+                body = data.strip()
+                if body.startswith(b"<~"):
+                    body = body[2:]
+                data = base64.a85decode(body.split(b"~>")[0], ignorechars=b" \t\r\n\f\x00")
+            elif name in ("ASCIIHexDecode", "AHx"):
+                hexstr = re.sub(rb"[^0-9A-Fa-f]", b"", data.split(b">")[0])
+                data = bytes.fromhex((hexstr + b"0" * (len(hexstr) % 2)).decode("ascii"))
+            else:
+                raise ConversionError(f"不支持的 PDF 压缩方式: {name}")
+        return data
+
+    def pages(self) -> Iterator[dict]:
+        """按页面树顺序返回页面（继承的 /Resources 已合并）"""
+        root = self.resolve(self.trailer.get("Root"))
+        pages_root = self.resolve(root.get("Pages")) if isinstance(root, dict) else None
+        if not isinstance(pages_root, dict):
+            # 目录缺失：按对象号顺序查找页面
+            for num in sorted(self.offsets):
+                obj = self.get(num)
+                if isinstance(obj, dict) and obj.get("Type") == "Page":
+                    yield obj
+            return
+        seen: set[int] = set()
+
+        def walk(node: dict, resources):
+            resources = node.get("Resources", resources)
+            if node.get("Type") == "Page" or "Kids" not in node:
+                yield {**node, "Resources": resources}
+                return
+            for kid in self.resolve(node.get("Kids")) or []:
+                if isinstance(kid, _Ref):
+                    if kid.num in seen:
+                        continue
+                    seen.add(kid.num)
+                kid = self.resolve(kid)
+                if isinstance(kid, dict):
+                    yield from walk(kid, resources)
+
+        yield from walk(pages_root, None)
+
+
+def _inflate(data: bytes) -> bytes:
+    """分块解压 FlateDecode 流；损坏或截断时保留已解出的部分"""
+    decomp = zlib.decompressobj()
+    out = bytearray()
+    for i in range(0, len(data), 65536):
+        try:
+            out += decomp.decompress(data[i:i + 65536])
+        except zlib.error:
+            return bytes(out)
+    try:
+        out += decomp.flush()
+    except zlib.error:
+        pass
+    return bytes(out)
+
+
+class _Font:
+    """字体的字符编码：ToUnicode CMap、UCS-2 预定义 CMap 或单字节 WinAnsi"""
+
+    def __init__(self, doc: Optional[_PdfDocument] = None, font: Optional[dict] = None):
+        self.cmap: dict[bytes, str] = {}
+        self.code_lengths: list[int] = [1]
+        self.utf16 = False
+        if doc is None or font is None:
+            return
+        to_unicode = doc.resolve(font.get("ToUnicode"))
+        encoding = doc.resolve(font.get("Encoding"))
+        if isinstance(to_unicode, _Stream):
+            self._parse_cmap(doc.decode(to_unicode))
+        elif isinstance(encoding, str) and encoding.startswith("Uni") and ("UCS2" in encoding or "UTF16" in encoding):
+            self.utf16 = True
+        elif font.get("Subtype") == "Type0":
+            self.code_lengths = [2]
+
+    def _parse_cmap(self, data: bytes) -> None:
+        lengths = set()
+        for block in re.findall(rb"begincodespacerange(.*?)endcodespacerange", data, re.S):
+            for lo in re.findall(rb"<([0-9A-Fa-f]+)>\s*<[0-9A-Fa-f]+>", block):
+                lengths.add(len(lo) // 2)
+        for block in re.findall(rb"beginbfchar(.*?)endbfchar", data, re.S):
+            for src, dst in re.findall(rb"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]*)>", block):
+                self.cmap[bytes.fromhex(src.decode())] = _utf16(dst)
+                lengths.add(len(src) // 2)
+        for block in re.findall(rb"beginbfrange(.*?)endbfrange", data, re.S):
+            for lo, hi, dst in re.findall(rb"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f]*>|\[[^\]]*\])", block):
+                width = len(lo) // 2
+                lengths.add(width)
+                start, stop = int(lo, 16), int(hi, 16)
+                if stop < start or stop - start > 0xFFFF:
+                    continue
+                if dst.startswith(b"["):
+                    for i, target in enumerate(re.findall(rb"<([0-9A-Fa-f]*)>", dst)[: stop - start + 1]):
+                        self.cmap[(start + i).to_bytes(width, "big")] = _utf16(target)
+                else:
+                    base = bytes.fromhex(dst[1:-1].decode())
+                    if not base:
+                        continue
+                    for i in range(stop - start + 1):
+                        # 目标值的最后一个字节随源码递增
+                        target = base[:-1] + bytes([(base[-1] + i) & 0xFF])
+                        self.cmap[(start + i).to_bytes(width, "big")] = target.decode("utf-16-be", errors="replace")
+        if lengths:
+            self.code_lengths = sorted(lengths, reverse=True)
+
+    def decode(self, data: bytes) -> str:
+        if self.utf16:
+            return data.decode("utf-16-be", errors="replace")
+        if not self.cmap:
+            if self.code_lengths == [2]:
+                return "\ufffd" * (len(data) // 2)  # Identity 编码且无 ToUnicode：无法还原
+            return data.decode("cp1252", errors="replace")
+        out = []
+        i = 0
+        while i < len(data):
+            for width in self.code_lengths:
+                code = data[i:i + width]
+                if code in self.cmap:
+                    out.append(self.cmap[code])
+                    i += width
+                    break
+            else:
+                width = self.code_lengths[-1]
+                out.append(chr(data[i]) if width == 1 and 0x20 <= data[i] < 0x7F else "")
+                i += width
+        return "".join(out)
+
+
+def _utf16(hexstr: bytes) -> str:
+    return bytes.fromhex(hexstr.decode()).decode("utf-16-be", errors="replace")
+
+
+_LATIN_FONT = _Font()
+
+
+def _page_text(doc: _PdfDocument, page: dict) -> str:
+    resources = doc.resolve(page.get("Resources")) or {}
+    font_dict = doc.resolve(resources.get("Font")) if isinstance(resources, dict) else None
+    fonts: dict[str, _Font] = {}
+    for name, ref in (font_dict or {}).items():
+        font = doc.resolve(ref)
+        if isinstance(font, dict):
+            fonts[name] = _Font(doc, font)
+
+    contents = doc.resolve(page.get("Contents"))
+    streams = contents if isinstance(contents, list) else [contents]
+    data = b"\n".join(doc.decode(s) for s in (doc.resolve(c) for c in streams) if isinstance(s, _Stream))
+
+    lines: list[str] = []
+    line: list[str] = []
+    font = _LATIN_FONT
+    font_size, scale, leading = 10.0, 1.0, 0.0
+    y = 0.0  # 文本行矩阵的 y 坐标
+    shown_y: Optional[float] = None  # 上一次输出文本时的 y 坐标
+    moved = False  # 同一行内水平移动过（视为词间空格）
+    operands: list = []
+    lexer = _Lexer(data)
+
+    def number(value, default: float = 0.0) -> float:
+        return float(value) if isinstance(value, (int, float)) else default
+
+    def show(text: str) -> None:
+        nonlocal line, shown_y, moved
+        size = font_size * scale or 10.0
+        if shown_y is not None and abs(y - shown_y) > max(1.0, size * 0.3) and line:
+            lines.append("".join(line).rstrip())
+            line = []
+            if abs(y - shown_y) > size * 2:
+                lines.append("")  # 段落间距
+        elif moved and line and not line[-1].endswith(" ") and not text.startswith(" "):
+            line.append(" ")
+        shown_y, moved = y, False
+        line.append(text)
+
+    while True:
+        tok = lexer.token()
+        if tok is None:
+            break
+        if type(tok) is not bytes or tok in (b"true", b"false", b"null"):
+            operands.append(tok)
+            continue
+        if tok in (b"[", b"<<"):
+            operands.append(lexer.value(tok))
+            continue
+        op = tok
+        if op == b"BT":
+            y, scale = 0.0, 1.0
+        elif op == b"Tf" and len(operands) >= 2:
+            font = fonts.get(operands[-2], _LATIN_FONT) if isinstance(operands[-2], _Name) else _LATIN_FONT
+            font_size = abs(number(operands[-1], font_size))
+        elif op == b"TL" and operands:
+            leading = number(operands[-1])
+        elif op == b"Tm" and len(operands) >= 6:
+            scale = abs(number(operands[-3], 1.0)) or 1.0
+            y = number(operands[-1])
+            moved = True
+        elif op in (b"Td", b"TD") and len(operands) >= 2:
+            y += number(operands[-1]) * scale
+            moved = moved or number(operands[-2]) != 0
+            if op == b"TD":
+                leading = -number(operands[-1])
+        elif op == b"T*":
+            y -= (leading or font_size * 1.2) * scale
+        elif op in (b"Tj", b"'", b'"') and operands and isinstance(operands[-1], bytearray):
+            if op != b"Tj":
+                y -= (leading or font_size * 1.2) * scale
+            show(font.decode(bytes(operands[-1])))
+        elif op == b"TJ" and operands and isinstance(operands[-1], list):
+            parts = []
+            for item in operands[-1]:
+                if isinstance(item, bytearray):
+                    parts.append(font.decode(bytes(item)))
+                elif isinstance(item, (int, float)) and item < -150 and parts and not parts[-1].endswith(" "):
+                    parts.append(" ")  # 较大的字距调整视为词间空格
+            show("".join(parts))
+        elif op == b"ID":
+            # 内联图片：跳过二进制数据至 EI
+            end = data.find(b"EI", lexer.pos)
+            lexer.pos = len(data) if end < 0 else end + 2
+        operands = []
+    if line:
+        lines.append("".join(line).rstrip())
+    return "\n".join(lines).strip()
+
+
+def _pdf_to_markdown(path: Path) -> tuple[str, int]:
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ConversionError("空文件")
+        try:
+            if not data[:1024].lstrip().startswith(b"%PDF"):
+                raise ConversionError("不是 PDF 文件")
+            doc = _PdfDocument(data)
+            if doc.trailer.get("Encrypt") is not None:
+                raise ConversionError("PDF 已加密")
+            texts = [_page_text(doc, page) for page in doc.pages()]
+        finally:
+            data.close()
+    if not texts:
+        raise ConversionError("未找到页面")
+    if not any(texts):
+        raise ConversionError("未提取到文本（可能为扫描件或图片）")
+    # 页面之间以空行分隔，连续空行合并
+    body = re.sub(r"\n{3,}", "\n\n", "\n\n".join(t for t in texts if t))
+    return f"# {path.stem}\n\n{body}", len(texts)
@@ -0,0 +1,223 @@
+"""
+需求文件发现：os.scandir 遍历需求目录（recursive 时包含子目录，默认仅顶层），按包含/排除模式筛选；
+筛选规则（RequirementFilter）与 --watch 的监听共用
+
+清单 .codingplan/manifest.json 记录各需求的相对路径、大小、mtime 与内容摘要；再次运行时
+只对大小或 mtime 变化的文件计算摘要，即可得出新增、修改与删除的需求。
+处理顺序由 ORDERS 中的排序函数决定（--order），新增排序方式只需在其中注册
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from fnmatch import translate
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterable, Optional
+
+from .cache import file_digest
+from .config import REQUIREMENT_EXTENSIONS
+from .fsutil import write_json_atomic
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# 默认包含的需求文件
+DEFAULT_INCLUDES = tuple(f"*{ext}" for ext in sorted(REQUIREMENT_EXTENSIONS))
+
+# 始终排除：隐藏文件/目录、Office 锁文件与编辑器备份、需求对应的 Figma 说明、依赖目录
+DEFAULT_EXCLUDES = (".*", "~$*", "*~", "*.figma.md", "node_modules", "__pycache__")
+
+
+@dataclass
+class RequirementFile:
+    """发现的需求文件"""
+
+    path: Path
+    rel: str  # 相对需求目录的路径（/ 分隔）
+    size: int
+    mtime_ns: int
+
+
+@dataclass
+class ManifestDiff:
+    """与上次清单相比的变化（均为相对路径）"""
+
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: int = 0
+    first: bool = False  # 首次建立清单（或需求目录已变更）
+
+    def summary(self) -> str:
+        if self.first:
+            return f"首次建立需求清单（{len(self.added)} 个需求）"
+        return (
+            f"新增 {len(self.added)}、修改 {len(self.changed)}、删除 {len(self.removed)}、"
+            f"未变 {self.unchanged}"
+        )
+
+
+def _compile(patterns: Iterable[str]) -> re.Pattern:
+    """将一组 fnmatch 模式合并为一个正则（大小写规则同 fnmatch：随平台 normcase）"""
+    flags = re.IGNORECASE if os.path.normcase("A") == "a" else 0
+    return re.compile("|".join(f"(?:{translate(p)})" for p in patterns), flags)
+
+
+class RequirementFilter:
+    """
+    需求文件的筛选规则（discover 与 --watch 共用）
+
+    模式（fnmatch）与文件/目录名或相对路径匹配即生效：目录匹配排除模式时不再进入；
+    include 为空时使用 DEFAULT_INCLUDES，exclude 追加在 DEFAULT_EXCLUDES 之后。
+    recursive 为 False 时只取需求目录顶层的文件；skip_dirs 中的目录（如 outputs/、UI 设计目录）不遍历
+    """
+
+    def __init__(
+        self,
+        include: Optional[list[str]] = None,
+        exclude: Optional[list[str]] = None,
+        recursive: bool = False,
+        skip_dirs: Iterable[Optional[Path]] = (),
+    ):
+        self.includes = _compile(include or DEFAULT_INCLUDES)
+        self.excludes = _compile(DEFAULT_EXCLUDES + tuple(exclude or ()))
+        self.recursive = recursive
+        self.skip = {os.path.abspath(d) for d in skip_dirs if d is not None}
+
+    def excluded(self, name: str, rel: str) -> bool:
+        return bool(self.excludes.match(name) or self.excludes.match(rel))
+
+    def enters(self, path: str, name: str, rel: str) -> bool:
+        """是否进入子目录（path 为其路径，rel 为相对需求目录的路径）"""
+        return self.recursive and not self.excluded(name, rel) and os.path.abspath(path) not in self.skip
+
+    def matches(self, name: str, rel: str) -> bool:
+        """文件是否为需求（不检查所在目录，目录由 enters 筛选）"""
+        return not self.excluded(name, rel) and bool(self.includes.match(name) or self.includes.match(rel))
+
+
+def discover(req_dir: Path, rules: Optional[RequirementFilter] = None, prefix: str = "") -> list[RequirementFile]:
+    """
+    遍历需求目录，返回符合 rules（默认 RequirementFilter()）的需求文件（未排序）；不跟随目录符号链接，避免循环。
+
+    prefix 为 req_dir 相对需求目录的路径（以 / 结尾，仅遍历其中一个子目录时使用）
+    """
+    rules = rules or RequirementFilter()
+    found: list[RequirementFile] = []
+    stack = [(os.fspath(req_dir), prefix)]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                rel = prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if rules.enters(entry.path, entry.name, rel):
+                            stack.append((entry.path, rel + "/"))
+                        continue
+                    if not entry.is_file() or not rules.matches(entry.name, rel):
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                found.append(RequirementFile(Path(entry.path), rel, st.st_size, st.st_mtime_ns))
+    return found
+
+
+class Manifest:
+    """需求清单（.codingplan/manifest.json）：相对路径 -> 大小、mtime、sha256"""
+
+    def __init__(self, manifest_file: Path):
+        self.manifest_file = manifest_file
+        self.data: dict = {"version": MANIFEST_VERSION, "req_dir": None, "files": {}}
+        self._dirty = False
+
+    def load(self) -> None:
+        try:
+            data = json.loads(self.manifest_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == MANIFEST_VERSION and isinstance(data.get("files"), dict):
+            self.data = data
+
+    def update(self, req_dir: Path, files: list[RequirementFile]) -> ManifestDiff:
+        """以本次发现的文件更新清单并返回变化；大小与 mtime 未变的文件不读取内容"""
+        req_key = str(req_dir.resolve())
+        previous = self.data.get("files") or {}
+        diff = ManifestDiff()
+        if self.data.get("req_dir") != req_key:
+            previous = {}
+            diff.first = True
+        current: dict[str, dict] = {}
+        for f in files:
+            recorded = previous.get(f.rel)
+            if isinstance(recorded, dict) and recorded.get("size") == f.size and recorded.get("mtime_ns") == f.mtime_ns:
+                current[f.rel] = recorded
+                diff.unchanged += 1
+                continue
+            digest = file_digest(f.path)
+            current[f.rel] = {"size": f.size, "mtime_ns": f.mtime_ns, "sha256": digest}
+            if not isinstance(recorded, dict):
+                diff.added.append(f.rel)
+            elif recorded.get("sha256") != digest:
+                diff.changed.append(f.rel)
+            else:
+                diff.unchanged += 1  # 仅 mtime 变化（如 touch、重新检出）
+        diff.removed = sorted(set(previous) - set(current))
+        diff.added.sort()
+        diff.changed.sort()
+        self._dirty = (
+            diff.first or bool(diff.added or diff.changed or diff.removed)
+            or any(current[rel] is not previous.get(rel) for rel in current)
+        )
+        self.data = {"version": MANIFEST_VERSION, "req_dir": req_key, "files": current}
+        return diff
+
+    def save(self) -> None:
+        """写入清单（与上次相比无变化时跳过）"""
+        if self._dirty or not self.manifest_file.exists():
+            write_json_atomic(self.manifest_file, self.data)
+            self._dirty = False
+
+
+def duplicate_stems(rels: Iterable[str]) -> dict[str, list[str]]:
+    """
+    文件名（不含扩展名）相同的需求（rels 为相对路径）：产出文档 outputs/{名}-*.md、
+    隔离模式的 worktree 与分支、本地编译日志均按文件名命名，会互相覆盖
+    """
+    by_stem: dict[str, list[str]] = {}
+    for rel in rels:
+        by_stem.setdefault(PurePosixPath(rel).stem, []).append(rel)
+    return {stem: sorted(group) for stem, group in sorted(by_stem.items()) if len(group) > 1}
+
+
+def _changed_first(files: list[RequirementFile], diff: Optional[ManifestDiff]) -> list[RequirementFile]:
+    """新增与修改的需求优先，其余按路径"""
+    changed = set(diff.added + diff.changed) if diff and not diff.first else set()
+    return sorted(files, key=lambda f: (f.rel not in changed, f.rel))
+
+
+# 处理顺序：名称 -> 排序函数(需求文件, 清单变化)
+ORDERS: dict[str, Callable[[list[RequirementFile], Optional[ManifestDiff]], list[RequirementFile]]] = {
+    "path": lambda files, diff: sorted(files, key=lambda f: f.rel),
+    "name": lambda files, diff: sorted(files, key=lambda f: (f.path.name, f.rel)),
+    "mtime": lambda files, diff: sorted(files, key=lambda f: (-f.mtime_ns, f.rel)),
+    "size": lambda files, diff: sorted(files, key=lambda f: (f.size, f.rel)),
+    "changed": _changed_first,
+}
+
+DEFAULT_ORDER = "path"
+
+
+def order_files(
+    files: list[RequirementFile], order: str = DEFAULT_ORDER, diff: Optional[ManifestDiff] = None
+) -> list[RequirementFile]:
+    """按 order 排序（未知名称时抛出 ValueError）"""
+    if order not in ORDERS:
+        raise ValueError(f"未知的处理顺序: {order}（可选: {', '.join(ORDERS)}）")
+    return ORDERS[order](files, diff)
@@ -1,9 +1,18 @@
 """从需求文件中解析 Figma 设计链接与交互说明"""
 
+import json
+import os
 import re
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
+
+from .fsutil import write_json_atomic
+
+# 设计文件解析结果的持久化缓存（.codingplan/ 下）
+FIGMA_CACHE_NAME = "figma-cache.json"
+FIGMA_CACHE_VERSION = 1
 
 
 # Figma URL 匹配（支持 design、file、proto 等，含 query）
@@ -20,6 +29,11 @@ FIGMA_SECTION_HEADERS = [
     r"^#+\s*UI\s*设计\s*$",
     r"^#+\s*设计(?:稿|链接)?\s*$",
 ]
+_HEADER_PATTERN = re.compile("|".join(FIGMA_SECTION_HEADERS), re.IGNORECASE)
+
+# 「链接:」「交互说明:」键值对的前缀
+_LINK_KEY_PATTERN = re.compile(r"^\s*链接\s*[:：]\s*", re.IGNORECASE)
+_DESC_KEY_PATTERN = re.compile(r"^\s*交互说明\s*[:：]\s*", re.IGNORECASE)
 
 
 @dataclass
@@ -33,6 +47,86 @@ class FigmaInfo:
         return not self.links and not self.interaction_desc.strip()
 
 
+class FigmaExtractor:
+    """
+    逐行提取 Figma 链接和交互说明（流式读取大文件时使用，内存与文件大小无关）
+
+    URL、标题段落与键值对在同一次遍历中处理，正则在模块级预编译，并先以子串判断跳过
+    不可能匹配的行；链接与交互说明用集合去重。result() 的结果与对完整内容调用
+    extract_figma_info 一致（标题段落在前，「交互说明:」键值对在后）
+    """
+
+    def __init__(self):
+        self.links: list[str] = []
+        self._link_set: set[str] = set()
+        self._section_parts: list[str] = []
+        self._kv_parts: list[str] = []
+        self._in_section = False
+        self._section_content: list[str] = []
+
+    def _add_link(self, url: str) -> None:
+        url = url.rstrip(".,;:)")
+        if url not in self._link_set:
+            self._link_set.add(url)
+            self.links.append(url)
+
+    def _close_section(self) -> None:
+        if self._section_content and self._in_section:
+            self._section_parts.append("\n".join(self._section_content).strip())
+        self._section_content = []
+
+    def feed(self, line: str) -> None:
+        """处理一行内容（不含换行符）"""
+        if "\x00" in line:
+            line = line.replace("\x00", "")
+        # 1. 正文中的 Figma URL
+        if "://" in line:
+            for m in FIGMA_URL_PATTERN.finditer(line):
+                self._add_link(m.group(0))
+
+        # 2. 「交互说明」等标题下的内容
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            if _HEADER_PATTERN.match(stripped):
+                self._close_section()
+                self._in_section = True
+            elif self._in_section and not stripped.startswith("###"):
+                # 遇到同级或更高级标题则结束
+                self._close_section()
+                self._in_section = False
+            elif self._in_section:
+                self._section_content.append(line)
+        elif self._in_section:
+            self._section_content.append(line)
+
+        # 3. 「链接:」「交互说明:」这类键值对
+        if "链接" in line:
+            m = _LINK_KEY_PATTERN.match(line)
+            if m:
+                url_match = FIGMA_URL_PATTERN.search(line[m.end():].strip())
+                if url_match:
+                    self._add_link(url_match.group(0))
+        if "交互说明" in line:
+            m = _DESC_KEY_PATTERN.match(line)
+            if m:
+                rest = line[m.end():].strip()
+                if rest:
+                    self._kv_parts.append(rest)
+
+    def result(self) -> FigmaInfo:
+        """结束输入并返回提取结果"""
+        self._close_section()
+        self._in_section = False
+        interaction_parts = list(self._section_parts)
+        seen = set(interaction_parts)
+        for rest in self._kv_parts:
+            if rest not in seen:
+                seen.add(rest)
+                interaction_parts.append(rest)
+        interaction_desc = "\n\n".join(p for p in interaction_parts if p).strip()
+        return FigmaInfo(links=list(self.links), interaction_desc=interaction_desc or "")
+
+
 def extract_figma_info(content: str) -> FigmaInfo:
     """
     从需求文件内容中提取 Figma 链接和交互说明
@@ -43,59 +137,10 @@ def extract_figma_info(content: str) -> FigmaInfo:
     - 链接: https://figma.com/...
     - 交互说明: 点击卡片进入详情...
     """
-    content = content.replace("\x00", "")
-    links: list[str] = []
-    interaction_parts: list[str] = []
-
-    # 1. 提取所有 Figma URL
-    for m in FIGMA_URL_PATTERN.finditer(content):
-        url = m.group(0).rstrip(".,;:)")
-        if url not in links:
-            links.append(url)
-
-    # 2. 提取「交互说明」标题下的内容
-    lines = content.split("\n")
-    in_figma_section = False
-    section_content: list[str] = []
-    header_pattern = re.compile("|".join(FIGMA_SECTION_HEADERS), re.IGNORECASE)
-
-    for line in lines:
-        stripped = line.strip()
-        if header_pattern.match(stripped):
-            if section_content and in_figma_section:
-                interaction_parts.append("\n".join(section_content).strip())
-            in_figma_section = True
-            section_content = []
-            continue
-        if in_figma_section:
-            # 遇到同级或更高级标题则结束
-            if stripped.startswith("#") and not stripped.startswith("###"):
-                if section_content:
-                    interaction_parts.append("\n".join(section_content).strip())
-                in_figma_section = False
-                section_content = []
-            else:
-                section_content.append(line)
-
-    if section_content and in_figma_section:
-        interaction_parts.append("\n".join(section_content).strip())
-
-    # 3. 提取「链接:」「交互说明:」这类键值对
-    for line in lines:
-        if re.match(r"^\s*链接\s*[:：]\s*", line, re.IGNORECASE):
-            rest = re.sub(r"^\s*链接\s*[:：]\s*", "", line, flags=re.I).strip()
-            url_match = FIGMA_URL_PATTERN.search(rest)
-            if url_match:
-                u = url_match.group(0).rstrip(".,;:)")
-                if u not in links:
-                    links.append(u)
-        if re.match(r"^\s*交互说明\s*[:：]\s*", line, re.IGNORECASE):
-            rest = re.sub(r"^\s*交互说明\s*[:：]\s*", "", line, flags=re.I).strip()
-            if rest and rest not in interaction_parts:
-                interaction_parts.append(rest)
-
-    interaction_desc = "\n\n".join(p for p in interaction_parts if p).strip()
-    return FigmaInfo(links=links, interaction_desc=interaction_desc or "")
+    extractor = FigmaExtractor()
+    for line in content.split("\n"):
+        extractor.feed(line)
+    return extractor.result()
 
 
 def extract_from_file(file_path: Path) -> FigmaInfo:
@@ -109,39 +154,142 @@ def extract_from_file(file_path: Path) -> FigmaInfo:
         return FigmaInfo(links=[], interaction_desc="")
 
 
-def _merge_figma_info(info: FigmaInfo, extra: FigmaInfo) -> None:
+def merge_figma_info(info: FigmaInfo, extra: FigmaInfo) -> None:
     """合并 extra 到 info"""
+    seen = set(info.links)
     for link in extra.links:
-        if link not in info.links:
+        if link not in seen:
+            seen.add(link)
             info.links.append(link)
     if extra.interaction_desc:
         info.interaction_desc = (info.interaction_desc + "\n\n" + extra.interaction_desc).strip()
 
 
-def extract_from_req_dir(req_dir: Path, req_file: Path, ui_dir: Optional[Path] = None) -> FigmaInfo:
+def _copy(info: FigmaInfo) -> FigmaInfo:
+    return FigmaInfo(links=list(info.links), interaction_desc=info.interaction_desc)
+
+
+class DesignIndex:
     """
-    从需求目录及 UI 设计目录提取 Figma 信息。
+    需求目录（*.figma.md）与 UI 设计目录的索引，一次运行内各需求共享。
 
-    查找顺序：
-    1. 需求文件内容
-    2. 需求目录下的 {需求名}.figma.md
-    3. UI 设计目录下的 {需求名}.md 或 {需求名}.figma.md（若指定 ui_dir）
+    每个目录用 os.scandir 扫描一次得到 .md 文件名集合，查找设计文件不再逐个 exists()；
+    目录 mtime 变化（文件增删）时重新扫描。文件解析结果按 (路径, mtime, 大小) 缓存，
+    cache_file 非空时持久化，下次运行未修改的设计文件不再解析
     """
-    base = req_file.stem
 
-    info = extract_from_file(req_file)
+    def __init__(self, cache_file: Optional[Path] = None):
+        self.cache_file = cache_file
+        self._dirs: dict[str, tuple[int, frozenset]] = {}  # 目录 -> (mtime_ns, .md 文件名)
+        self._parsed: dict[str, dict] = {}  # 绝对路径 -> {mtime_ns, size, links, interaction_desc}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if cache_file is not None:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.cache_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == FIGMA_CACHE_VERSION and isinstance(data.get("files"), dict):
+            self._parsed = data["files"]
+
+    def _names(self, directory: Path) -> frozenset:
+        """目录下的 .md 文件名（目录不存在时为空）"""
+        key = os.path.abspath(directory)
+        try:
+            dir_mtime = os.stat(key).st_mtime_ns
+        except OSError:
+            return frozenset()
+        with self._lock:
+            cached = self._dirs.get(key)
+            if cached is not None and cached[0] == dir_mtime:
+                return cached[1]
+            names = set()
+            try:
+                with os.scandir(key) as it:
+                    for entry in it:
+                        if entry.name.endswith(".md") and entry.is_file():
+                            names.add(entry.name)
+            except OSError:
+                return frozenset()
+            self._dirs[key] = (dir_mtime, frozenset(names))
+            return self._dirs[key][1]
 
-    # 需求目录下的 .figma.md
-    figma_file = req_dir / f"{base}.figma.md"
-    if figma_file.exists():
-        _merge_figma_info(info, extract_from_file(figma_file))
+    def extract(self, path: Path) -> FigmaInfo:
+        """文件中的 Figma 信息（mtime 与大小未变时使用缓存；文件不存在时为空）"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return FigmaInfo(links=[], interaction_desc="")
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._parsed.get(key)
+        if isinstance(entry, dict) and entry.get("mtime_ns") == st.st_mtime_ns and entry.get("size") == st.st_size:
+            return FigmaInfo(links=list(entry.get("links") or []), interaction_desc=entry.get("interaction_desc") or "")
+        info = extract_from_file(path)
+        with self._lock:
+            self._parsed[key] = {
+                "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+                "links": list(info.links), "interaction_desc": info.interaction_desc,
+            }
+            self._dirty = True
+        return info
 
-    # UI 设计目录（默认 uidesign）
-    if ui_dir and ui_dir.exists():
-        for name in [f"{base}.md", f"{base}.figma.md"]:
-            ui_file = ui_dir / name
-            if ui_file.exists():
-                _merge_figma_info(info, extract_from_file(ui_file))
-                break
+    def lookup(
+        self,
+        req_file: Path,
+        ui_dir: Optional[Path] = None,
+        req_info: Optional[FigmaInfo] = None,
+        req_dir: Optional[Path] = None,
+        documents: Iterable[Path] = (),
+    ) -> FigmaInfo:
+        """
+        需求的 Figma 信息，按顺序合并：
+        1. 需求文件内容（req_info 非空时直接使用，不再读取需求文件）
+        2. 需求目录下的 {需求名}.figma.md
+        3. UI 设计目录下的 {需求名}.md 或 {需求名}.figma.md（若指定 ui_dir）
+        4. documents 中的文档（如 Step 2 补全后的需求文档）
+        """
+        base = req_file.stem
+        req_dir = req_dir or req_file.parent
+        info = _copy(req_info) if req_info is not None else self.extract(req_file)
 
-    return info
+        figma_name = f"{base}.figma.md"
+        if figma_name in self._names(req_dir):
+            merge_figma_info(info, self.extract(req_dir / figma_name))
+
+        if ui_dir:
+            names = self._names(ui_dir)
+            for name in [f"{base}.md", f"{base}.figma.md"]:
+                if name in names:
+                    merge_figma_info(info, self.extract(ui_dir / name))
+                    break
+
+        for document in documents:
+            merge_figma_info(info, self.extract(document))
+        return info
+
+    def save(self) -> None:
+        """持久化解析缓存（去掉已不存在的文件）"""
+        if self.cache_file is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            files = {path: entry for path, entry in self._parsed.items() if os.path.exists(path)}
+            self._dirty = False
+        try:
+            write_json_atomic(self.cache_file, {"version": FIGMA_CACHE_VERSION, "files": files})
+        except OSError:
+            pass  # 仅为缓存，写入失败不影响工作流
+
+
+def extract_from_req_dir(
+    req_dir: Path, req_file: Path, ui_dir: Optional[Path] = None, req_info: Optional[FigmaInfo] = None
+) -> FigmaInfo:
+    """
+    从需求目录及 UI 设计目录提取 Figma 信息（不缓存的单次查找，顺序见 DesignIndex.lookup）
+    """
+    return DesignIndex().lookup(req_file, ui_dir, req_info=req_info, req_dir=req_dir)
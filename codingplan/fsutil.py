@@ -0,0 +1,41 @@
+"""文件系统工具：原子写入 JSON（状态、清单、缓存与共享队列共用）"""
+
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+
+def write_json_atomic(path: Path, data: dict, indent: Optional[int] = 2) -> None:
+    """
+    先写同目录临时文件并 fsync 再重命名（并发读者与崩溃后都不会读到半成品）
+
+    indent 为 None 时写入紧凑 JSON（体积大、写入频繁的文件）
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent, separators=None if indent else (",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    fsync_dir(path.parent)
+
+
+def fsync_dir(directory: Path) -> None:
+    """持久化目录项（rename 结果）；Windows 等不支持打开目录的平台忽略"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
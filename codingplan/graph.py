@@ -0,0 +1,175 @@
+"""产物依赖图：记录各步骤的输入指纹，供 --incremental 增量重跑"""
+
+import hashlib
+import json
+import threading
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from .cache import file_digest
+from .fsutil import write_json_atomic
+
+# 各步骤的输入产物（params 为 scope/hint 等运行参数）
+STEP_INPUTS: dict[int, tuple[str, ...]] = {
+    1: ("source", "params"),
+    2: ("source", "normalized", "params"),
+    3: ("requirements", "figma", "params"),
+    4: ("outline", "requirements", "figma", "params"),
+    5: ("detail", "requirements", "figma", "params"),
+    6: ("requirements", "detail", "code", "params"),
+    7: ("test_design", "code", "params"),
+    8: ("code", "tests", "params"),
+    9: ("requirements", "build", "params"),
+}
+
+# 各步骤的输出产物
+STEP_OUTPUTS: dict[int, str] = {
+    1: "normalized",
+    2: "requirements",
+    3: "outline",
+    4: "detail",
+    5: "code",
+    6: "test_design",
+    7: "tests",
+    8: "build",
+    9: "validation",
+}
+
+# 产物 -> 生成它的步骤
+PRODUCERS: dict[str, int] = {artifact: step for step, artifact in STEP_OUTPUTS.items()}
+
+# 对应 outputs/ 文档的产物及文件后缀；其余产物（代码、测试等）无单一文件，
+# 以生成步骤完成时分配的随机令牌作为指纹，该步骤重跑即视为变化
+FILE_ARTIFACT_SUFFIXES: dict[str, str] = {
+    "normalized": "-normalized.md",
+    "requirements": "-requirements.md",
+    "outline": "-outline-design.md",
+    "detail": "-detail-design.md",
+    "test_design": "-test-design.md",
+}
+
+
+def artifact_paths(req_file: Path, dirs: dict, ui_dir: Optional[Path] = None) -> dict[str, list[Path]]:
+    """需求文件各文件型产物对应的路径"""
+    base = req_file.stem
+    paths: dict[str, list[Path]] = {
+        "source": [req_file],
+        "figma": [req_file.parent / f"{base}.figma.md"],
+    }
+    if ui_dir:
+        paths["figma"].extend([ui_dir / f"{base}.md", ui_dir / f"{base}.figma.md"])
+    for artifact, suffix in FILE_ARTIFACT_SUFFIXES.items():
+        paths[artifact] = [dirs["outputs"] / f"{base}{suffix}"]
+    return paths
+
+
+def _fingerprint_files(paths: list[Path]) -> str:
+    """一组文件的组合指纹（不存在的文件也计入，以便新增文件被感知）"""
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.name.encode("utf-8", errors="replace"))
+        h.update(b"\0")
+        h.update((file_digest(path) or "<missing>").encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def params_fingerprint(scope: Optional[str], hint: Optional[str]) -> str:
+    """运行参数指纹"""
+    return hashlib.sha256(f"scope\0{scope or ''}\0hint\0{hint or ''}".encode("utf-8", errors="replace")).hexdigest()
+
+
+class ArtifactGraph:
+    """
+    需求文件的步骤依赖图及已记录的输入指纹（.codingplan/graph.json）。
+
+    每个步骤成功后在内存中记录其输入产物的指纹与输出产物的指纹，每个需求处理结束后由调用方 save()
+    落盘一次（紧凑 JSON，无变化时跳过）；增量运行时，输入指纹变化、输出文档缺失或上游步骤需重跑的
+    步骤被视为需重跑（make 式传递）。
+    """
+
+    def __init__(self, graph_file: Path):
+        self.graph_file = graph_file
+        self.data: dict = {"version": 1, "files": {}}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def load(self) -> None:
+        if not self.graph_file.exists():
+            return
+        try:
+            with open(self.graph_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return
+        if isinstance(data, dict) and isinstance(data.get("files"), dict):
+            self.data = data
+
+    def save(self) -> None:
+        """写入依赖图（自上次保存后没有新记录时跳过）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            write_json_atomic(self.graph_file, self.data, indent=None)
+            self._dirty = False
+
+    def _steps(self, req_file: Path) -> dict:
+        return self.data["files"].get(str(req_file.resolve()), {}).get("steps", {})
+
+    def _current_fingerprint(
+        self,
+        artifact: str,
+        steps: dict,
+        paths: dict[str, list[Path]],
+        params: str,
+    ) -> Optional[str]:
+        """产物的当前指纹"""
+        if artifact == "params":
+            return params
+        if artifact in paths:
+            return _fingerprint_files(paths[artifact])
+        producer = steps.get(str(PRODUCERS[artifact]))
+        return producer.get("output") if producer else None
+
+    def record_step(self, req_file: Path, step: int, paths: dict[str, list[Path]], params: str) -> None:
+        """记录步骤完成时的输入/输出指纹（仅更新内存，由 save() 落盘）"""
+        with self._lock:
+            entry = self.data["files"].setdefault(str(req_file.resolve()), {"steps": {}})
+            steps = entry["steps"]
+            inputs = {name: self._current_fingerprint(name, steps, paths, params) for name in STEP_INPUTS[step]}
+            output = STEP_OUTPUTS[step]
+            if output in paths:
+                output_fp = _fingerprint_files(paths[output])
+            else:
+                output_fp = uuid.uuid4().hex
+            steps[str(step)] = {"inputs": inputs, "output": output_fp}
+            self._dirty = True
+
+    def dirty_steps(self, req_file: Path, paths: dict[str, list[Path]], params: str) -> list[int]:
+        """需重跑的步骤（按步骤顺序）"""
+        steps = self._steps(req_file)
+        dirty: set[int] = set()
+        for step in sorted(STEP_INPUTS):
+            record = steps.get(str(step))
+            if record is None:
+                dirty.add(step)
+                continue
+            if any(PRODUCERS.get(name) in dirty for name in STEP_INPUTS[step]):
+                dirty.add(step)
+                continue
+            output = STEP_OUTPUTS[step]
+            if output in paths and not all(p.exists() for p in paths[output]):
+                dirty.add(step)
+                continue
+            recorded = record.get("inputs", {})
+            for name in STEP_INPUTS[step]:
+                if self._current_fingerprint(name, steps, paths, params) != recorded.get(name):
+                    dirty.add(step)
+                    break
+        return sorted(dirty)
+
+    def first_dirty_step(self, req_file: Path, paths: dict[str, list[Path]], params: str) -> Optional[int]:
+        """第一个需重跑的步骤（全部最新时返回 None）"""
+        dirty = self.dirty_steps(req_file, paths, params)
+        return dirty[0] if dirty else None
@@ -0,0 +1,212 @@
+"""运行历史：每次工作流运行、需求文件、步骤的记录（.codingplan/history.db，SQLite）"""
+
+import sqlite3
+import subprocess
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from .stall import STALL_EXIT_CODE
+
+HISTORY_DB = "history.db"
+
+# Agent 超时返回码
+TIMEOUT_EXIT_CODE = 124
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    req_dir TEXT,
+    started_at TEXT NOT NULL,
+    ended_at TEXT,
+    duration_sec REAL,
+    file_count INTEGER,
+    jobs INTEGER,
+    files_done INTEGER,
+    success INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    file TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    ended_at TEXT NOT NULL,
+    duration_sec REAL NOT NULL,
+    success INTEGER NOT NULL,
+    failed_step INTEGER
+);
+CREATE TABLE IF NOT EXISTS steps (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    file TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    step_name TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    ended_at TEXT NOT NULL,
+    duration_sec REAL NOT NULL,
+    success INTEGER NOT NULL,
+    exit_code INTEGER,
+    agent_calls INTEGER NOT NULL DEFAULT 0,
+    timeouts INTEGER NOT NULL DEFAULT 0,
+    stalls INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_files_run ON files(run_id);
+CREATE INDEX IF NOT EXISTS idx_steps_run ON steps(run_id);
+CREATE INDEX IF NOT EXISTS idx_steps_step ON steps(step, success);
+"""
+
+
+def history_db_path(project_root: Path) -> Path:
+    return project_root / ".codingplan" / HISTORY_DB
+
+
+def connect(db_path: Path, wal: bool = True) -> sqlite3.Connection:
+    """
+    打开历史库（不存在时创建表）
+
+    wal 为 False 时使用回滚日志（DELETE）：WAL 依赖共享内存映射，不能用于 NFS 等网络文件系统
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+    conn.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _now() -> str:
+    return datetime.now().isoformat(sep=" ", timespec="seconds")
+
+
+@dataclass
+class StepCalls:
+    """一个步骤内 Agent 调用的汇总（通过 run_agent 的 on_result 回调累加）"""
+
+    attempts: int = 0
+    exit_code: Optional[int] = None  # 最后一次调用的返回码
+    timeouts: int = 0
+    stalls: int = 0
+
+    def add(self, result: subprocess.CompletedProcess) -> None:
+        self.attempts += 1
+        self.exit_code = result.returncode
+        if result.returncode == TIMEOUT_EXIT_CODE:
+            self.timeouts += 1
+        elif result.returncode == STALL_EXIT_CODE:
+            self.stalls += 1
+
+
+class RunHistory:
+    """
+    一次工作流运行的历史记录器（线程安全）
+
+    写入失败（如磁盘只读、库被锁）时输出一次警告后停止记录，不影响工作流本身
+    """
+
+    def __init__(self, db_path: Path, wal: bool = True):
+        self.db_path = db_path
+        self.run_id: Optional[int] = None
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        try:
+            self._conn = connect(db_path, wal)
+        except sqlite3.Error as e:
+            print(f"警告: 无法打开运行历史 {db_path}: {e}")
+
+    def _execute(self, sql: str, params: tuple) -> Optional[int]:
+        with self._lock:
+            if self._conn is None:
+                return None
+            try:
+                with self._conn:
+                    return self._conn.execute(sql, params).lastrowid
+            except sqlite3.Error as e:
+                print(f"警告: 写入运行历史失败，本次运行不再记录: {e}")
+                self._conn.close()
+                self._conn = None
+                return None
+
+    def start_run(self, project: Path, req_dir: Path, file_count: int, jobs: int) -> None:
+        self.run_id = self._execute(
+            "INSERT INTO runs (project, req_dir, started_at, file_count, jobs) VALUES (?, ?, ?, ?, ?)",
+            (str(project.resolve()), str(req_dir.resolve()), _now(), file_count, jobs),
+        )
+
+    def end_run(self, success: bool, duration_sec: float, files_done: int, error: Optional[str] = None) -> None:
+        if self.run_id is None:
+            return
+        self._execute(
+            "UPDATE runs SET ended_at = ?, duration_sec = ?, files_done = ?, success = ?, error = ? WHERE id = ?",
+            (_now(), duration_sec, files_done, int(success), error, self.run_id),
+        )
+
+    def record_file(self, file_name: str, started_at: datetime, success: bool, failed_step: Optional[int]) -> None:
+        if self.run_id is None:
+            return
+        ended_at = datetime.now()
+        self._execute(
+            "INSERT INTO files (run_id, file, started_at, ended_at, duration_sec, success, failed_step)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.run_id, file_name,
+                started_at.isoformat(sep=" ", timespec="seconds"), ended_at.isoformat(sep=" ", timespec="seconds"),
+                (ended_at - started_at).total_seconds(), int(success), failed_step,
+            ),
+        )
+
+    def record_step(
+        self,
+        file_name: str,
+        step: int,
+        step_name: str,
+        started_at: datetime,
+        success: bool,
+        calls: Optional[StepCalls] = None,
+    ) -> None:
+        if self.run_id is None:
+            return
+        calls = calls or StepCalls()
+        ended_at = datetime.now()
+        self._execute(
+            "INSERT INTO steps (run_id, file, step, step_name, started_at, ended_at, duration_sec, success,"
+            " exit_code, agent_calls, timeouts, stalls) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.run_id, file_name, step, step_name,
+                started_at.isoformat(sep=" ", timespec="seconds"), ended_at.isoformat(sep=" ", timespec="seconds"),
+                (ended_at - started_at).total_seconds(), int(success),
+                calls.exit_code, calls.attempts, calls.timeouts, calls.stalls,
+            ),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def load_step_durations(db_path: Path, limit: int = 200) -> dict[int, list[float]]:
+    """各步骤最近 limit 次成功且实际调用了 Agent（排除缓存命中）的耗时"""
+    durations: dict[int, list[float]] = {}
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30)
+    except sqlite3.Error:
+        return durations
+    try:
+        rows = conn.execute(
+            "SELECT step, duration_sec FROM ("
+            "  SELECT step, duration_sec, ROW_NUMBER() OVER (PARTITION BY step ORDER BY id DESC) AS rn"
+            "  FROM steps WHERE success = 1 AND agent_calls > 0"
+            ") WHERE rn <= ?",
+            (limit,),
+        ).fetchall()
+    except sqlite3.Error:
+        return durations
+    finally:
+        conn.close()
+    for step, duration in rows:
+        durations.setdefault(step, []).append(duration)
+    return durations
@@ -0,0 +1,103 @@
+"""
+需求文件摄取：一次流式读取同时得到内容摘要、Step 1 预览与 Figma 信息
+
+    sha256      内容摘要（登记到 cache.file_digest 的摘要缓存，缓存键、依赖图与检查点不再重复读取）
+    preview     Step 1 Agent 提示中的前 PREVIEW_CHARS 个字符
+    figma       文件内的 Figma 链接与交互说明（figma.FigmaExtractor 逐行提取）
+
+按 1MB 分块读取并增量解码，峰值内存与文件大小无关（超过 MAX_LINE_CHARS 的超长行分段处理）。
+.docx / .pdf 只计算摘要：其文本由 Step 1 本地转换提取，预览为占位说明
+"""
+
+import codecs
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from .cache import file_digest, remember_digest
+from .figma import FigmaExtractor, FigmaInfo
+
+# Step 1 提示中的需求内容预览长度（字符）
+PREVIEW_CHARS = 1000
+
+# 无法按文本读取的格式（仅计算摘要）
+BINARY_EXTENSIONS = {".docx", ".pdf"}
+
+# 单行超过该字符数时先按已读部分处理，限制行缓冲
+MAX_LINE_CHARS = 1024 * 1024
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class Ingestion:
+    """需求文件的摄取结果"""
+
+    sha256: Optional[str]  # 文件不存在或读取失败时为 None
+    size: int
+    mtime_ns: int
+    preview: str
+    figma: FigmaInfo
+
+    def fingerprint(self) -> Optional[dict]:
+        """检查点使用的内容指纹（与 state.file_fingerprint 格式一致）"""
+        if self.sha256 is None:
+            return None
+        return {"sha256": self.sha256, "size": self.size, "mtime_ns": self.mtime_ns}
+
+
+def _empty(preview: str = "") -> Ingestion:
+    return Ingestion(sha256=None, size=0, mtime_ns=0, preview=preview, figma=FigmaInfo(links=[], interaction_desc=""))
+
+
+def ingest_file(path: Path) -> Ingestion:
+    """流式读取需求文件一次，返回摘要、预览与 Figma 信息"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return _empty()
+    if path.suffix.lower() in BINARY_EXTENSIONS:
+        return Ingestion(
+            sha256=file_digest(path), size=st.st_size, mtime_ns=st.st_mtime_ns,
+            preview=f"（{path.suffix} 二进制文件，无法预览，请自行读取）",
+            figma=FigmaInfo(links=[], interaction_desc=""),
+        )
+
+    h = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    extractor = FigmaExtractor()
+    preview: list[str] = []
+    preview_len = 0
+    pending = ""  # 尚未遇到换行的行尾
+
+    def feed_text(text: str) -> None:
+        nonlocal pending, preview_len
+        if preview_len < PREVIEW_CHARS:
+            part = text.replace("\x00", "")[:PREVIEW_CHARS - preview_len]
+            preview.append(part)
+            preview_len += len(part)
+        lines = (pending + text).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            extractor.feed(line)
+        if len(pending) > MAX_LINE_CHARS:
+            extractor.feed(pending)
+            pending = ""
+
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                h.update(chunk)
+                feed_text(decoder.decode(chunk))
+    except OSError:
+        return _empty()
+    feed_text(decoder.decode(b"", final=True))
+    extractor.feed(pending)
+    digest = h.hexdigest()
+    remember_digest(path, st, digest)
+    return Ingestion(
+        sha256=digest, size=st.st_size, mtime_ns=st.st_mtime_ns,
+        preview="".join(preview), figma=extractor.result(),
+    )
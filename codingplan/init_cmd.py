@@ -20,6 +20,55 @@ password = 请填写授权码
 emails = 请填写收件人@example.com
 """
 
+PROJECT_CONF_TEMPLATE = """# CodingPlan 项目配置
+# 取消注释并填写实际值后生效
+
+[build]
+# Step 8 本地编译/运行/测试命令：配置后由 CodingPlan 直接执行并捕获输出，
+# 仅在失败时调用 Agent 修复（失败日志会写入修复 prompt）；全部留空则由 Agent 执行
+# build = ./gradlew assemble
+# run =
+# test = ./gradlew test
+# 执行目录（相对项目根目录，默认项目根目录）
+# workdir =
+# 单条命令超时（秒）
+# timeout = 1800
+# 最多尝试次数（含首次）
+# max_attempts = 5
+
+[timeouts]
+# 各步骤 Agent 调用超时（秒）；命令行 --timeout / CODINGPLAN_STEP_TIMEOUT 优先于 default
+# default = 3600
+# 按步骤覆盖：step1 ~ step9，step10/step11 为项目级检查与补充
+# step1 = 600
+# step5 = 7200
+# 自适应：未单独配置的步骤按历史成功耗时的 p95 × factor 推算（不超过 default）；
+# 耗时取自 .codingplan/history.db（排除缓存命中），该库不存在时才解析 codingplan.log
+# adaptive = true
+# factor = 2.0
+# 样本数不足时仍使用 default
+# min_samples = 5
+
+[watchdog]
+# 卡死检测：Agent 连续 stall_timeout 秒既无输出也未修改项目文件时终止（0 或不配置为关闭，最小 30）
+# 命令行 --stall-timeout / CODINGPLAN_STALL_TIMEOUT 优先
+# stall_timeout = 600
+# 终止后附加提醒重试的次数
+# retries = 1
+"""
+
+# 仓库内的 .codingplan/codingplan.conf.example 由 PROJECT_CONF_TEMPLATE 生成，不单独维护：
+# 修改模板后执行 python -m codingplan.init_cmd 重新生成
+PROJECT_CONF_EXAMPLE = ".codingplan/codingplan.conf.example"
+
+
+def project_conf_example() -> str:
+    """codingplan.conf.example 的内容：PROJECT_CONF_TEMPLATE 附加复制说明"""
+    return PROJECT_CONF_TEMPLATE.replace(
+        "# 取消注释并填写实际值后生效", "# 复制为 .codingplan/codingplan.conf，取消注释并填写实际值后生效", 1
+    )
+
+
 AGENTS_MD_TEMPLATE = """# CodingPlan 工作流规则
 
 当执行 CodingPlan 自动化需求处理时，Agent 必须遵守以下规则。
@@ -265,7 +314,9 @@ CLAUDE_MD_TEMPLATE = """# 项目上下文
 GITIGNORE_ENTRIES = """
 # CodingPlan（由 codingplan init 添加）
 .codingplan/email.conf
-.codingplan/state.json
+.codingplan/state.*
+.codingplan/history.db*
+.codingplan/queue/
 """
 
 
@@ -289,6 +340,7 @@ def run_init(project_root: Optional[Path] = None) -> int:
     在项目根目录创建 CodingPlan 相关配置
 
     - .codingplan/email.conf - 邮件配置模板
+    - .codingplan/codingplan.conf - 项目配置模板（Step 8 本地编译测试命令等）
     - AGENTS.md - 工作流规则（若不存在）
     - .cursor/rules/codingplan-workflow.mdc - Cursor 工作流规则（若不存在）
     - .cursor/rules/multi-platform.mdc - 多端/多平台规则（若不存在）
@@ -318,6 +370,15 @@ def run_init(project_root: Optional[Path] = None) -> int:
         conf_file.write_text(EMAIL_CONF_TEMPLATE, encoding="utf-8")
         created.append(str(conf_file))
 
+    # 1b. 项目配置（Step 8 本地编译测试命令等）
+    project_conf = conf_dir / "codingplan.conf"
+    if project_conf.exists():
+        print(f"已存在: {project_conf}")
+    else:
+        conf_dir.mkdir(parents=True, exist_ok=True)
+        project_conf.write_text(PROJECT_CONF_TEMPLATE, encoding="utf-8")
+        created.append(str(project_conf))
+
     # 2. AGENTS.md
     agents_md = root / "AGENTS.md"
     if agents_md.exists():
@@ -420,6 +481,15 @@ def run_init(project_root: Optional[Path] = None) -> int:
         print("")
         if str(conf_file) in created:
             print("请编辑 .codingplan/email.conf，将占位符替换为实际值（发件邮箱、授权码、收件人）")
+        if str(project_conf) in created:
+            print("可编辑 .codingplan/codingplan.conf 配置 Step 8 的本地编译/测试命令，减少 Agent 调用")
         if str(claude_md) in created:
             print("请编辑 CLAUDE.md，填写项目背景、技术栈、编码规范等，以提升 Agent 对项目的理解")
     return 0
+
+
+if __name__ == "__main__":
+    # 由项目配置模板重新生成仓库内的示例文件
+    example = Path(__file__).resolve().parent.parent / PROJECT_CONF_EXAMPLE
+    example.write_text(project_conf_example(), encoding="utf-8")
+    print(f"已生成 {example}")
@@ -7,16 +7,18 @@ from pathlib import Path
 from typing import Optional
 
 _logger: Optional[logging.Logger] = None
+_log_dir: Optional[Path] = None
 
 
 def setup_logger(project_root: Path) -> logging.Logger:
     """初始化日志，写入 .codingplan/logs/codingplan.log"""
-    global _logger
+    global _logger, _log_dir
     if _logger is not None:
         return _logger
 
     log_dir = project_root / ".codingplan" / "logs"
     log_dir.mkdir(parents=True, exist_ok=True)
+    _log_dir = log_dir
     log_file = log_dir / "codingplan.log"
 
     logger = logging.getLogger("codingplan")
@@ -43,6 +45,11 @@ def get_logger(project_root: Optional[Path] = None) -> Optional[logging.Logger]:
     return None
 
 
+def get_log_dir() -> Optional[Path]:
+    """已初始化 logger 的日志目录（.codingplan/logs），未初始化时返回 None"""
+    return _log_dir
+
+
 def log_step_start(logger: logging.Logger, file_name: str, step: int, step_name: str) -> None:
     """记录步骤开始"""
     logger.info(f"[{file_name}] Step {step}: {step_name} 开始")
@@ -55,10 +62,12 @@ def log_step_end(
     step_name: str,
     success: bool,
     duration_sec: float,
+    agent_calls: Optional[int] = None,
 ) -> None:
-    """记录步骤结束"""
+    """记录步骤结束（agent_calls 为本步骤的 Agent 调用次数，缓存命中、本地转换等为 0）"""
     status = "成功" if success else "失败"
-    logger.info(f"[{file_name}] Step {step}: {step_name} 结束 | {status} | 耗时 {duration_sec:.1f}s")
+    calls = f" | Agent 调用 {agent_calls} 次" if agent_calls is not None else ""
+    logger.info(f"[{file_name}] Step {step}: {step_name} 结束 | {status} | 耗时 {duration_sec:.1f}s{calls}")
 
 
 def log_workflow_start(logger: logging.Logger, req_dir: str, file_count: int) -> None:
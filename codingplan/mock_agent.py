@@ -0,0 +1,143 @@
+"""
+模拟 Cursor Agent CLI（用于测量 CodingPlan 自身开销与并发扩展性，无需安装 Cursor CLI 或登录账号）
+
+用法:
+    CODINGPLAN_AGENT_CMD="python -m codingplan.mock_agent" codingplan ./requirements
+
+接受与 agent 相同的参数（-p、--mode、--output-format、--force、--version），
+prompt 可来自命令行参数、标准输入或 CodingPlan 的临时 prompt 文件。行为由环境变量控制：
+
+    CODINGPLAN_MOCK_LATENCY     每次调用耗时（秒），如 0.5 或区间 0.2-1.5（均匀分布），默认 0
+    CODINGPLAN_MOCK_FAIL_RATE   失败概率 0~1（失败时返回码 1），默认 0
+    CODINGPLAN_MOCK_FAIL_ON     prompt 包含该子串时失败（如 "任务：编译、运行、测试"）
+    CODINGPLAN_MOCK_WRITE       写入哪些文件：outputs（默认，prompt 中出现的 outputs/*.md）、none，
+                                或逗号分隔的额外路径（相对工作目录，每次调用追加一行）
+    CODINGPLAN_MOCK_SEED        随机种子（与 prompt 组合，同一 prompt 的耗时与成败可复现；未设置时每次随机）
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+MOCK_VERSION = "mock-agent 1.0"
+
+# prompt 中引用的产出文档
+_OUTPUT_PATTERN = re.compile(r"outputs/[\w.\-]+\.md")
+_NAMED_OUTPUT_PATTERN = re.compile(r"命名为：([\w.\-]+\.md)")
+# file 传递方式下的指令（见 agent._file_prompt_pointer）
+_POINTER_PATTERN = re.compile(r"保存在文件 (.+?) 中")
+
+
+def _parse_args(argv: list[str]) -> tuple[str, str, str]:
+    """返回 (prompt；mode；output_format)"""
+    prompt = ""
+    mode, output_format = "plan", "text"
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "-p":
+            if i + 1 < len(argv) and not argv[i + 1].startswith("--"):
+                prompt = argv[i + 1]
+                i += 1
+        elif arg == "--mode" and i + 1 < len(argv):
+            mode = argv[i + 1]
+            i += 1
+        elif arg == "--output-format" and i + 1 < len(argv):
+            output_format = argv[i + 1]
+            i += 1
+        i += 1
+    return prompt, mode, output_format
+
+
+def _latency(spec: str, rng: random.Random) -> float:
+    try:
+        if "-" in spec:
+            low, high = (float(x) for x in spec.split("-", 1))
+            return rng.uniform(low, high)
+        return float(spec)
+    except ValueError:
+        return 0.0
+
+
+def _write_outputs(prompt: str, mode: str) -> list[str]:
+    """按 CODINGPLAN_MOCK_WRITE 写入文件，返回写入的路径"""
+    spec = os.environ.get("CODINGPLAN_MOCK_WRITE", "outputs").strip()
+    if spec == "none" or mode == "ask":
+        return []
+    written = []
+    if spec == "outputs" or spec.startswith("outputs,"):
+        names = set(_OUTPUT_PATTERN.findall(prompt))
+        names |= {f"outputs/{m}" for m in _NAMED_OUTPUT_PATTERN.findall(prompt)}
+        for name in sorted(names):
+            path = Path(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(f"# {path.stem}\n\n由 mock agent 生成\n", encoding="utf-8")
+            written.append(name)
+        spec = spec[len("outputs"):].lstrip(",")
+    for name in filter(None, (x.strip() for x in spec.split(","))):
+        path = Path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(f"{time.time():.3f}\n")
+        written.append(name)
+    return written
+
+
+def _emit_stream_json(written: list[str], success: bool, duration_sec: float) -> None:
+    def emit(event: dict) -> None:
+        print(json.dumps(event, ensure_ascii=False), flush=True)
+
+    emit({"type": "system", "subtype": "init", "model": "mock"})
+    emit({"type": "assistant", "message": {"role": "assistant", "content": [{"type": "text", "text": "mock agent 执行中"}]}})
+    for i, path in enumerate(written):
+        call = {"writeToolCall": {"args": {"path": path}}}
+        emit({"type": "tool_call", "subtype": "started", "call_id": f"call-{i}", "tool_call": call})
+        emit({"type": "tool_call", "subtype": "completed", "call_id": f"call-{i}", "tool_call": call})
+    emit({
+        "type": "result",
+        "subtype": "success" if success else "error",
+        "is_error": not success,
+        "duration_ms": round(duration_sec * 1000),
+        "result": "mock done" if success else "mock failure",
+    })
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if "--version" in argv:
+        print(MOCK_VERSION)
+        return 0
+    prompt, mode, output_format = _parse_args(argv)
+    pointer = _POINTER_PATTERN.search(prompt)
+    if pointer and Path(pointer.group(1)).is_file():
+        prompt = Path(pointer.group(1)).read_text(encoding="utf-8", errors="replace")
+
+    seed = os.environ.get("CODINGPLAN_MOCK_SEED")
+    rng = random.Random(f"{seed}\0{prompt}") if seed is not None else random.Random()
+    start = time.monotonic()
+    delay = _latency(os.environ.get("CODINGPLAN_MOCK_LATENCY", "0"), rng)
+    if delay > 0:
+        time.sleep(delay)
+
+    fail_on = os.environ.get("CODINGPLAN_MOCK_FAIL_ON")
+    try:
+        fail_rate = float(os.environ.get("CODINGPLAN_MOCK_FAIL_RATE", "0"))
+    except ValueError:
+        fail_rate = 0.0
+    success = not (fail_on and fail_on in prompt) and rng.random() >= fail_rate
+    written = _write_outputs(prompt, mode) if success else []
+
+    if output_format == "stream-json":
+        _emit_stream_json(written, success, time.monotonic() - start)
+    else:
+        print(f"mock agent（{mode}）: {'完成' if success else '失败'}，写入 {len(written)} 个文件")
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
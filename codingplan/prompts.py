@@ -2,6 +2,7 @@
 
 from typing import Optional
 
+from .buildtest import REPORT_BEGIN, REPORT_END, REPORT_PLACEHOLDER
 from .figma import FigmaInfo
 
 
@@ -209,12 +210,30 @@ def step7_test_impl(test_design_path: str, scope: Optional[str] = None, hint: Op
 """
 
 
-def step8_build_test(scope: Optional[str] = None, hint: Optional[str] = None) -> str:
+def _previous_failure_block(previous_failure: Optional[str], analysis: Optional[str]) -> str:
+    """上一轮失败输出与 Ask 分析"""
+    if not previous_failure and not analysis:
+        return ""
+    parts = ["\n## 上一轮失败信息（请优先据此修复，避免重复排查）\n"]
+    if previous_failure:
+        parts.append(f"上一轮编译/运行/测试输出（尾部）：\n```\n{previous_failure.strip()}\n```\n")
+    if analysis:
+        parts.append(f"Ask 模式失败分析：\n{analysis.strip()}\n")
+    return "\n".join(parts)
+
+
+def step8_build_test(
+    scope: Optional[str] = None,
+    hint: Optional[str] = None,
+    previous_failure: Optional[str] = None,
+    analysis: Optional[str] = None,
+) -> str:
     """Step 8: 编译、运行、测试"""
     return f"""
 {WORKFLOW_CONTEXT}
 {_scope_constraint(scope)}
 {_hint_block(hint)}
+{_previous_failure_block(previous_failure, analysis)}
 
 ## 任务：编译、运行、测试
 
@@ -223,10 +242,72 @@ def step8_build_test(scope: Optional[str] = None, hint: Optional[str] = None) ->
 3. 执行测试（强制）
 
 若出现编译失败、运行失败或测试失败：
-- 工具会启动 Ask 分析；请根据终端输出或自身分析，在下一轮重试时修复问题
+- 工具会启动 Ask 分析，分析结果与失败输出会附在下一轮重试的任务说明中
 - 修改代码或测试后，本步骤将被重新执行
 
 循环直至编译成功、运行成功、测试全部通过，或确认无法继续解决。
+
+若最终仍未全部通过，请在回复末尾将最后一次失败的命令输出（编译错误、失败的测试及其报错，原样复制，不要概括）
+放在以下两行标记之间：
+{REPORT_BEGIN}
+{REPORT_PLACEHOLDER}
+{REPORT_END}
+"""
+
+
+def step8_analyze_failure(attempt: int, failure_output: Optional[str], scope: Optional[str] = None) -> str:
+    """Step 8: 失败后的 Ask 分析"""
+    output_block = f"\n失败输出（尾部）：\n```\n{failure_output.strip()}\n```\n" if failure_output and failure_output.strip() else ""
+    return f"""
+{_scope_constraint(scope)}
+编译/运行/测试失败。请分析失败原因并给出修复建议。
+当前是第 {attempt} 次重试。
+{output_block}
+请给出：根本原因、需修改的文件与具体修改建议。
+"""
+
+
+def step8_fix_build_failure(
+    stage: str,
+    command: str,
+    exit_desc: str,
+    failure_lines: list[str],
+    output_tail: str,
+    log_path: str,
+    attempt: int,
+    max_attempts: int,
+    scope: Optional[str] = None,
+    hint: Optional[str] = None,
+) -> str:
+    """Step 8: 本地编译/运行/测试失败后的修复"""
+    key_lines = "\n".join(failure_lines) if failure_lines else "（未识别到关键行，请查看下方输出尾部）"
+    return f"""
+{WORKFLOW_CONTEXT}
+{_scope_constraint(scope)}
+{_hint_block(hint)}
+
+## 任务：修复编译/运行/测试失败
+
+CodingPlan 已在本地直接执行配置的命令，{stage}阶段失败（第 {attempt}/{max_attempts} 次尝试）：
+- 命令：`{command}`
+- 结果：{exit_desc}
+- 完整日志：{log_path}
+
+关键行：
+```
+{key_lines}
+```
+
+输出尾部：
+```
+{output_tail}
+```
+
+请：
+1. 根据上述失败输出分析根本原因
+2. 修改代码或测试以修复问题（不得通过删除、跳过测试或降低断言来规避失败）
+3. 无需自行重新执行上述命令，修复后 CodingPlan 会重新执行
+4. 若确认无法修复，将原因记录到 uncertain/
 """
 
 
@@ -0,0 +1,683 @@
+"""
+codingplan serve：本机任务队列守护进程（HTTP API，队列持久化于 SQLite，多个项目共享 Agent 并发额度）
+
+默认监听数据目录下的 Unix socket（权限 0600，仅本用户可连接）；--port 改为监听 127.0.0.1 时，
+所有请求须携带数据目录下 serve.token 中的 Bearer 令牌，且 Host 须为本机地址（防止网页通过
+DNS 重绑定或跨站请求提交任务）。POST 请求体须为 application/json
+"""
+
+import argparse
+import hmac
+import json
+import os
+import secrets
+import signal
+import socketserver
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from .agent import check_agent_installed, get_agent_cmd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_PORT = 8765
+DEFAULT_SLOTS = 2
+QUEUE_DB = "queue.db"
+LOCK_FILE = "serve.lock"
+SOCKET_FILE = "serve.sock"
+TOKEN_FILE = "serve.token"
+
+# TCP 模式下允许的 Host（不含端口）
+ALLOWED_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+# 平台是否支持 Unix socket（不支持时默认监听 TCP）
+UNIX_SOCKETS = hasattr(socketserver, "UnixStreamServer")
+
+# 取消运行中的任务：先 SIGINT（与 Ctrl+C 相同，工作流记录断点），超时后 SIGTERM、SIGKILL
+CANCEL_TERM_AFTER = 30
+CANCEL_KILL_AFTER = 60
+
+# 任务详情中附带的日志末尾行数
+LOG_TAIL_LINES = 50
+
+STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    project TEXT NOT NULL,
+    req_dir TEXT NOT NULL,
+    file TEXT,
+    scope TEXT,
+    hint TEXT,
+    jobs INTEGER NOT NULL DEFAULT 1,
+    fresh INTEGER NOT NULL DEFAULT 0,
+    incremental INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    ended_at TEXT,
+    returncode INTEGER,
+    pid INTEGER,
+    restarts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id);
+"""
+
+
+def serve_home() -> Path:
+    """守护进程数据目录（队列库与任务日志），可用环境变量 CODINGPLAN_SERVE_HOME 指定"""
+    home = os.environ.get("CODINGPLAN_SERVE_HOME")
+    return Path(home).expanduser() if home else Path.home() / ".codingplan" / "serve"
+
+
+def load_token(home: Path) -> str:
+    """TCP 模式的访问令牌：首次使用时生成并以 0600 权限保存到 home/serve.token"""
+    path = home / TOKEN_FILE
+    try:
+        token = path.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        token = ""
+    if not token:
+        token = secrets.token_urlsafe(32)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(token + "\n")
+    os.chmod(path, 0o600)
+    return token
+
+
+def process_alive(pid: Optional[int]) -> bool:
+    """
+    任务进程是否仍在运行：任务以独立进程组启动（pgid 即 pid），探测整个进程组，
+    遗留的 Agent 子进程仍在运行时同样视为运行中。不支持 killpg 的平台视为已退出
+    """
+    if not pid or not hasattr(os, "killpg"):
+        return False
+    try:
+        os.killpg(pid, 0)
+    except (ProcessLookupError, PermissionError):
+        return False  # 已退出，或 pid 已被其他用户的进程复用
+    return True
+
+
+def _now() -> str:
+    return datetime.now().isoformat(sep=" ", timespec="seconds")
+
+
+@dataclass
+class JobSpec:
+    """一个任务：在 project 下对 req_dir（或其中的 file）运行工作流"""
+
+    project: str
+    req_dir: str
+    file: Optional[str] = None
+    scope: Optional[str] = None
+    hint: Optional[str] = None
+    jobs: int = 1
+    fresh: bool = False
+    incremental: bool = False
+
+    @classmethod
+    def from_request(cls, data: object) -> "JobSpec":
+        """校验 POST /jobs 的 JSON，不合法时抛出 ValueError"""
+        if not isinstance(data, dict):
+            raise ValueError("请求体应为 JSON 对象")
+        unknown = set(data) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(sorted(unknown))}")
+        for key in ("project", "req_dir"):
+            if not isinstance(data.get(key), str) or not data[key].strip():
+                raise ValueError(f"缺少 {key}")
+        for key in ("file", "scope", "hint"):
+            if data.get(key) is not None and not isinstance(data[key], str):
+                raise ValueError(f"{key} 应为字符串")
+        jobs = data.get("jobs", 1)
+        if not isinstance(jobs, int) or isinstance(jobs, bool) or jobs < 1:
+            raise ValueError("jobs 应为 >= 1 的整数")
+        project = Path(data["project"]).expanduser()
+        if not project.is_absolute():
+            raise ValueError("project 应为绝对路径")
+        if not project.is_dir():
+            raise ValueError(f"项目目录不存在: {project}")
+        if not (project / data["req_dir"]).is_dir():
+            raise ValueError(f"需求目录不存在: {project / data['req_dir']}")
+        if data.get("incremental") and data.get("fresh"):
+            raise ValueError("incremental 不能与 fresh 同时使用")
+        return cls(
+            project=str(project.resolve()),
+            req_dir=data["req_dir"],
+            file=data.get("file") or None,
+            scope=data.get("scope") or None,
+            hint=data.get("hint") or None,
+            jobs=jobs,
+            fresh=bool(data.get("fresh")),
+            incremental=bool(data.get("incremental")),
+        )
+
+    def command(self) -> list[str]:
+        """对应的 codingplan 命令行（以项目目录为工作目录执行）"""
+        cmd = [sys.executable, "-m", "codingplan.cli", self.req_dir, "-j", str(self.jobs)]
+        if self.file:
+            cmd += ["-f", self.file]
+        if self.scope:
+            cmd += ["-s", self.scope]
+        if self.hint:
+            cmd += ["-H", self.hint]
+        if self.fresh:
+            cmd.append("--fresh")
+        if self.incremental:
+            cmd.append("--incremental")
+        return cmd
+
+
+class JobQueue:
+    """持久化任务队列（线程安全）"""
+
+    def __init__(self, db_path: Path):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params)
+
+    def add(self, spec: JobSpec) -> dict:
+        data = asdict(spec)
+        cur = self._execute(
+            f"INSERT INTO jobs ({', '.join(data)}, created_at) VALUES ({', '.join('?' * len(data))}, ?)",
+            (*data.values(), _now()),
+        )
+        return self.get(cur.lastrowid)
+
+    def get(self, job_id: int) -> Optional[dict]:
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> list[dict]:
+        if status:
+            rows = self._execute("SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit))
+        else:
+            rows = self._execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        return [dict(row) for row in rows.fetchall()]
+
+    def queued(self) -> list[dict]:
+        return [dict(row) for row in self._execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id").fetchall()]
+
+    def update(self, job_id: int, **values) -> None:
+        self._execute(
+            f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in values)} WHERE id = ?",
+            (*values.values(), job_id),
+        )
+
+    def requeue_interrupted(self) -> tuple[int, list[dict]]:
+        """
+        守护进程上次退出时仍为 running 的任务：进程已退出的重新排队（工作流自动续传），返回其数量；
+        进程仍在运行的（守护进程异常退出时遗留）保持 running 一并返回，由调度器等待其退出后再排队
+        """
+        requeued = 0
+        alive: list[dict] = []
+        for job in [dict(row) for row in self._execute("SELECT * FROM jobs WHERE status = 'running'").fetchall()]:
+            if process_alive(job["pid"]):
+                alive.append(job)
+                continue
+            self.update(job["id"], status="queued", pid=None, restarts=job["restarts"] + 1)
+            requeued += 1
+        return requeued, alive
+
+    def counts(self) -> dict[str, int]:
+        rows = self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass
+class _Running:
+    proc: subprocess.Popen
+    project: str
+    slots: int
+    log: object
+    restarts: int
+    cancel_at: Optional[float] = None  # 请求取消的 monotonic 时间
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+
+@dataclass
+class _Orphan:
+    """上次守护进程遗留、仍在运行的任务进程（不是本进程的子进程，只能探测是否存在）"""
+
+    pid: int
+    project: str
+    slots: int
+    restarts: int
+    cancel_at: Optional[float] = None
+
+
+class Scheduler:
+    """
+    按提交顺序调度任务：每个任务占用 min(jobs, slots) 个并发额度，同一项目同时只运行一个任务
+
+    任务以子进程（python -m codingplan.cli，独立进程组）运行，输出写入 logs/<id>.log
+    """
+
+    def __init__(self, queue: JobQueue, home: Path, slots: int):
+        self.queue = queue
+        self.slots = slots
+        self.log_dir = home / "logs"
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self._running: dict[int, _Running] = {}
+        self._orphans: dict[int, _Orphan] = {}
+        self._cond = threading.Condition()
+        self._stopping = False
+
+    def log_path(self, job_id: int) -> Path:
+        return self.log_dir / f"{job_id}.log"
+
+    def wake(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def adopt(self, jobs: list[dict]) -> None:
+        """接管上次遗留仍在运行的任务：占用额度与项目，进程退出后重新排队"""
+        with self._cond:
+            for job in jobs:
+                self._orphans[job["id"]] = _Orphan(job["pid"], job["project"], min(job["jobs"], self.slots), job["restarts"])
+
+    def _active(self) -> list:
+        return [*self._running.values(), *self._orphans.values()]
+
+    def used_slots(self) -> int:
+        with self._cond:
+            return sum(r.slots for r in self._active())
+
+    def run(self) -> None:
+        with self._cond:
+            while not self._stopping:
+                self._reap()
+                self._schedule()
+                self._cond.wait(timeout=1)
+
+    def _schedule(self) -> None:
+        free = self.slots - sum(r.slots for r in self._active())
+        busy = {r.project for r in self._active()}
+        for job in self.queue.queued():
+            if job["project"] in busy:
+                continue
+            need = min(job["jobs"], self.slots)
+            if need > free:
+                break  # 严格按提交顺序，避免大任务饿死
+            self._start(job, need)
+            free -= need
+            busy.add(job["project"])
+
+    def _start(self, job: dict, slots: int) -> None:
+        spec = JobSpec(**{f.name: job[f.name] for f in fields(JobSpec)})
+        if job["restarts"]:
+            spec.fresh = False  # 中断后重新排队的任务从断点续传
+        log = open(self.log_path(job["id"]), "a", encoding="utf-8")
+        log.write(f"===== {_now()} 开始: {' '.join(spec.command()[3:])}（项目 {spec.project}）=====\n")
+        log.flush()
+        env = {**os.environ, "CODINGPLAN_AGENT_VERIFIED": "1", "PYTHONUNBUFFERED": "1"}
+        try:
+            proc = subprocess.Popen(
+                spec.command(), cwd=spec.project, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                env=env, start_new_session=True,
+            )
+        except OSError as e:
+            log.close()
+            self.queue.update(job["id"], status="failed", ended_at=_now(), error=f"启动失败: {e}")
+            print(f"[{_now()}] 任务 {job['id']} 启动失败: {e}", flush=True)
+            return
+        self._running[job["id"]] = _Running(proc, spec.project, slots, log, job["restarts"])
+        self.queue.update(job["id"], status="running", started_at=_now(), pid=proc.pid, ended_at=None, returncode=None)
+        print(f"[{_now()}] 任务 {job['id']} 开始（{spec.project} {spec.req_dir}，占用 {slots} 个额度）", flush=True)
+
+    def _reap(self) -> None:
+        for job_id, running in list(self._running.items()):
+            rc = running.proc.poll()
+            if rc is None:
+                if running.cancel_at is not None:
+                    self._escalate(running)
+                continue
+            del self._running[job_id]
+            running.log.close()
+            if self._stopping and running.cancel_at is None:
+                self.queue.update(job_id, status="queued", pid=None, restarts=running.restarts + 1)
+                print(f"[{_now()}] 任务 {job_id} 已中断，重新排队（返回码 {rc}）", flush=True)
+                continue
+            if running.cancel_at is not None:
+                status = "cancelled"
+            else:
+                status = "succeeded" if rc == 0 else "failed"
+            self.queue.update(job_id, status=status, ended_at=_now(), returncode=rc, pid=None)
+            print(f"[{_now()}] 任务 {job_id} 结束: {status}（返回码 {rc}）", flush=True)
+        for job_id, orphan in list(self._orphans.items()):
+            if process_alive(orphan.pid):
+                if orphan.cancel_at is not None:
+                    self._escalate(orphan)
+                continue
+            del self._orphans[job_id]
+            if orphan.cancel_at is not None:
+                self.queue.update(job_id, status="cancelled", ended_at=_now(), pid=None)
+                print(f"[{_now()}] 遗留任务 {job_id} 已取消", flush=True)
+            else:
+                # 返回码无从得知：重新排队，由工作流从断点续传（已完成的需求会跳过）
+                self.queue.update(job_id, status="queued", pid=None, restarts=orphan.restarts + 1)
+                print(f"[{_now()}] 遗留任务 {job_id} 的进程已退出，重新排队", flush=True)
+
+    @staticmethod
+    def _signal(running, sig: int) -> None:
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(running.pid, sig)
+            elif isinstance(running, _Running):
+                running.proc.terminate()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _escalate(self, running) -> None:
+        elapsed = time.monotonic() - running.cancel_at
+        if elapsed >= CANCEL_KILL_AFTER:
+            self._signal(running, signal.SIGKILL)
+        elif elapsed >= CANCEL_TERM_AFTER:
+            self._signal(running, signal.SIGTERM)
+
+    def cancel(self, job_id: int) -> Optional[str]:
+        """取消任务，返回错误说明（成功时为 None）"""
+        with self._cond:
+            job = self.queue.get(job_id)
+            if job is None:
+                return "任务不存在"
+            if job["status"] == "queued":
+                self.queue.update(job_id, status="cancelled", ended_at=_now())
+                return None
+            running = self._running.get(job_id) or self._orphans.get(job_id)
+            if running is None:
+                return f"任务已结束（{job['status']}）"
+            if running.cancel_at is None:
+                running.cancel_at = time.monotonic()
+                self._signal(running, signal.SIGINT)
+            self._cond.notify_all()
+            return None
+
+    def stop(self) -> None:
+        """停止调度：运行中的任务收到 SIGINT 后重新排队，下次启动时续传"""
+        with self._cond:
+            self._stopping = True
+            for running in self._running.values():
+                self._signal(running, signal.SIGINT)
+            deadline = time.monotonic() + CANCEL_TERM_AFTER
+            while self._running and time.monotonic() < deadline:
+                self._reap()
+                self._cond.wait(timeout=0.5)
+            for running in self._running.values():
+                self._signal(running, signal.SIGKILL)
+                running.proc.wait()
+            self._reap()
+            self._cond.notify_all()
+
+
+def _tail(path: Path, lines: int) -> str:
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - lines * 400))
+            data = f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return ""
+    return "\n".join(data.splitlines()[-lines:])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "codingplan-serve"
+    # 由 run_serve 注入（token 仅 TCP 模式设置；Unix socket 依靠文件权限）
+    queue: JobQueue
+    scheduler: Scheduler
+    token: Optional[str] = None
+
+    def address_string(self) -> str:
+        # Unix socket 的 client_address 为空串
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        print(f"[{_now()}] {self.address_string()} {format % args}", flush=True)
+
+    def _send(self, status: int, body: object, content_type: str = "application/json") -> None:
+        if content_type == "application/json":
+            data = json.dumps(body, ensure_ascii=False, indent=2).encode("utf-8")
+        else:
+            data = str(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, {"error": message})
+
+    def _authorized(self) -> bool:
+        """TCP 模式校验 Host 与 Bearer 令牌；不通过时已发送错误响应"""
+        if self.token is None:
+            return True
+        host = urlparse(f"//{self.headers.get('Host') or ''}").hostname
+        if host not in ALLOWED_HOSTS:
+            self._error(403, "Host 须为本机地址")
+            return False
+        scheme, _, value = (self.headers.get("Authorization") or "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(value.strip().encode(), self.token.encode()):
+            self._error(401, f"缺少或错误的令牌（Authorization: Bearer <{TOKEN_FILE} 内容>）")
+            return False
+        return True
+
+    def _job_id(self, part: str) -> Optional[int]:
+        try:
+            return int(part)
+        except ValueError:
+            self._error(404, "任务不存在")
+            return None
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["health"]:
+            self._send(200, {
+                "status": "ok", "slots": self.scheduler.slots, "used_slots": self.scheduler.used_slots(),
+                "jobs": self.queue.counts(),
+            })
+        elif parts == ["jobs"]:
+            query = parse_qs(url.query)
+            status = query.get("status", [None])[0]
+            if status is not None and status not in STATUSES:
+                self._error(400, f"status 应为 {'/'.join(STATUSES)}")
+                return
+            try:
+                limit = max(1, int(query.get("limit", ["100"])[0]))
+            except ValueError:
+                self._error(400, "limit 应为整数")
+                return
+            self._send(200, {"jobs": self.queue.list_jobs(status, limit)})
+        elif len(parts) in (2, 3) and parts[0] == "jobs" and parts[2:] in ([], ["log"]):
+            job_id = self._job_id(parts[1])
+            if job_id is None:
+                return
+            job = self.queue.get(job_id)
+            if job is None:
+                self._error(404, "任务不存在")
+            elif parts[2:] == ["log"]:
+                log = self.scheduler.log_path(job_id)
+                self._send(200, log.read_text(encoding="utf-8", errors="replace") if log.exists() else "", "text/plain")
+            else:
+                job["log_tail"] = _tail(self.scheduler.log_path(job_id), LOG_TAIL_LINES)
+                self._send(200, job)
+        else:
+            self._error(404, "未知路径")
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            self._error(404, "未知路径")
+            return
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._error(415, "请求体须为 application/json（Content-Type: application/json）")
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            spec = JobSpec.from_request(json.loads(self.rfile.read(length) or b"{}"))
+        except json.JSONDecodeError as e:
+            self._error(400, f"JSON 解析失败: {e}")
+            return
+        except ValueError as e:
+            self._error(400, str(e))
+            return
+        job = self.queue.add(spec)
+        print(f"[{_now()}] 任务 {job['id']} 已排队: {spec.project} {spec.req_dir}", flush=True)
+        self.scheduler.wake()
+        self._send(201, job)
+
+    def do_DELETE(self) -> None:
+        if not self._authorized():
+            return
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if len(parts) != 2 or parts[0] != "jobs":
+            self._error(404, "未知路径")
+            return
+        job_id = self._job_id(parts[1])
+        if job_id is None:
+            return
+        error = self.scheduler.cancel(job_id)
+        if error == "任务不存在":
+            self._error(404, error)
+        elif error:
+            self._error(409, error)
+        else:
+            self._send(200, self.queue.get(job_id))
+
+
+if UNIX_SOCKETS:
+    class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def run_serve(argv: list[str]) -> int:
+    """启动守护进程，Ctrl+C / SIGTERM 停止（运行中的任务重新排队）"""
+    parser = argparse.ArgumentParser(prog="codingplan serve", description="本机任务队列守护进程（HTTP API）")
+    parser.add_argument(
+        "--socket", type=str, default=None, metavar="PATH",
+        help=f"监听的 Unix socket（默认 <数据目录>/{SOCKET_FILE}，权限 0600）",
+    )
+    parser.add_argument(
+        "--port", type=int, default=None,
+        help=f"改为监听 127.0.0.1 的该端口（如 {DEFAULT_PORT}）；请求须携带 <数据目录>/{TOKEN_FILE} 中的 Bearer 令牌",
+    )
+    parser.add_argument(
+        "--slots", type=int, default=DEFAULT_SLOTS,
+        help=f"全局并发额度（默认 {DEFAULT_SLOTS}）：任务占用 min(jobs, slots) 个，同一项目同时只运行一个任务",
+    )
+    parser.add_argument("--home", type=str, default=None, help="队列库与任务日志目录（默认 ~/.codingplan/serve）")
+    args = parser.parse_args(argv)
+    if args.slots < 1:
+        parser.error("--slots 必须 >= 1")
+    if args.socket and args.port is not None:
+        parser.error("--socket 与 --port 不能同时使用")
+    if args.port is None and not UNIX_SOCKETS:
+        args.port = DEFAULT_PORT  # 不支持 Unix socket 的平台
+
+    if not check_agent_installed():
+        print(f"错误: 未检测到 Cursor Agent（{' '.join(get_agent_cmd())}）。请先安装: curl https://cursor.com/install -fsS | bash")
+        return 1
+    home = Path(args.home).expanduser() if args.home else serve_home()
+    home.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # 同一数据目录只允许一个守护进程（否则会重复调度同一队列）
+    lock = open(home / LOCK_FILE, "a+")
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            print(f"错误: 已有 codingplan serve 使用数据目录 {home}")
+            lock.close()
+            return 1
+    queue = JobQueue(home / QUEUE_DB)
+    requeued, orphans = queue.requeue_interrupted()
+    scheduler = Scheduler(queue, home, args.slots)
+    scheduler.adopt(orphans)
+    token = load_token(home) if args.port is not None else None
+    handler = type("Handler", (_Handler,), {"queue": queue, "scheduler": scheduler, "token": token})
+
+    sock: Optional[Path] = None
+    if args.port is None:
+        sock = Path(args.socket).expanduser() if args.socket else home / SOCKET_FILE
+        if sock.exists():
+            sock.unlink()
+        # 绑定时即为 0600，其他用户无法连接
+        umask = os.umask(0o177)
+        try:
+            server: socketserver.BaseServer = _UnixHTTPServer(str(sock), handler)
+        finally:
+            os.umask(umask)
+        address = f"unix:{sock}"
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+        address = f"http://127.0.0.1:{args.port}"
+
+    print(f"codingplan serve 已启动: {address}（并发额度 {args.slots}，数据目录 {home}）", flush=True)
+    if token is not None:
+        print(f"请求须携带令牌: Authorization: Bearer $(cat {home / TOKEN_FILE})", flush=True)
+    if requeued:
+        print(f"上次退出时有 {requeued} 个任务在运行，已重新排队（将自动续传）", flush=True)
+    if orphans:
+        print(
+            f"上次遗留的 {len(orphans)} 个任务进程仍在运行（{', '.join(str(j['id']) for j in orphans)}），"
+            "其进程退出后重新排队", flush=True,
+        )
+    scheduler_thread = threading.Thread(target=scheduler.run, name="codingplan-scheduler", daemon=True)
+    scheduler_thread.start()
+    server_thread = threading.Thread(target=server.serve_forever, name="codingplan-http", daemon=True)
+    server_thread.start()
+
+    stop = threading.Event()
+    previous = signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        print("\n正在停止：运行中的任务将中断并在下次启动时续传...", flush=True)
+        server.shutdown()
+        server.server_close()
+        scheduler.stop()
+        scheduler_thread.join(timeout=5)
+        queue.close()
+        lock.close()
+        if sock is not None:
+            sock.unlink(missing_ok=True)
+    return 0
@@ -0,0 +1,127 @@
+"""卡死检测：Agent 长时间既无输出也未修改项目文件时终止（可选提醒后重试）"""
+
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from .config import load_project_config
+
+# 配置节名（.codingplan/codingplan.conf）
+WATCHDOG_SECTION = "watchdog"
+
+# 因卡死被终止时的返回码（超时为 124）
+STALL_EXIT_CODE = 125
+
+# 卡死窗口下限（秒）
+MIN_STALL_TIMEOUT = 30
+
+DEFAULT_STALL_RETRIES = 1
+
+# 检测项目文件变化时跳过的目录（依赖、构建产物及 CodingPlan 自身的状态目录）
+_SKIP_DIRS = {
+    ".git", ".codingplan", ".cursor", ".idea", ".gradle", ".venv", "venv",
+    "node_modules", "__pycache__", "build", "dist", "target", "Pods", "DerivedData",
+}
+
+# 重试时附加在 prompt 末尾的提醒
+STALL_NUDGE = """
+
+## 提醒（上一次执行因长时间无响应被终止）
+
+上一次执行在较长时间内既没有输出也没有修改任何文件，已被终止，可能卡在网络操作（如 git push、依赖下载）或交互式命令上。
+请继续完成任务：检查已完成的部分，避免重复；不要执行需要交互输入或可能长时间挂起的命令。
+"""
+
+
+@dataclass
+class WatchdogConfig:
+    """卡死检测配置"""
+
+    stall_timeout: int = 0  # 无活动窗口（秒），0 表示关闭
+    retries: int = DEFAULT_STALL_RETRIES  # 卡死后附加提醒重试的次数
+
+
+def _clamp(seconds: int) -> int:
+    return 0 if seconds <= 0 else max(MIN_STALL_TIMEOUT, seconds)
+
+
+def get_stall_timeout_seconds() -> int:
+    """从环境变量 CODINGPLAN_STALL_TIMEOUT 读取卡死窗口（秒），未设置或为 0 时关闭"""
+    try:
+        return _clamp(int(os.environ.get("CODINGPLAN_STALL_TIMEOUT", "0")))
+    except (ValueError, TypeError):
+        return 0
+
+
+def load_watchdog_config(project_root: Path) -> WatchdogConfig:
+    """
+    读取 [watchdog] 配置
+
+    示例:
+        [watchdog]
+        stall_timeout = 600
+        retries = 1
+
+    命令行 --stall-timeout / 环境变量 CODINGPLAN_STALL_TIMEOUT 优先于 stall_timeout
+    """
+    config = WatchdogConfig(stall_timeout=get_stall_timeout_seconds())
+    cp = load_project_config(project_root)
+    if not cp.has_section(WATCHDOG_SECTION):
+        return config
+    section = cp[WATCHDOG_SECTION]
+    try:
+        if "CODINGPLAN_STALL_TIMEOUT" not in os.environ:
+            config.stall_timeout = _clamp(section.getint("stall_timeout", 0))
+        config.retries = max(0, section.getint("retries", DEFAULT_STALL_RETRIES))
+    except ValueError:
+        pass
+    return config
+
+
+def changed_since(root: Path, since: float) -> bool:
+    """项目目录下是否有文件在 since（time.time() 时间戳）之后被修改，发现一个即返回"""
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in _SKIP_DIRS:
+                                stack.append(entry.path)
+                        elif entry.stat(follow_symlinks=False).st_mtime > since:
+                            return True
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return False
+
+
+class Activity:
+    """子进程最近一次活动（输出或修改文件）的时间"""
+
+    def __init__(self):
+        self.last_monotonic = time.monotonic()
+        self.last_wall = time.time()
+
+    def touch(self) -> None:
+        self.last_monotonic = time.monotonic()
+        self.last_wall = time.time()
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_monotonic
+
+
+def check_interval(stall_timeout: int) -> float:
+    """检测间隔：窗口的 1/4，限制在 [5, 30] 秒"""
+    return max(5.0, min(30.0, stall_timeout / 4))
+
+
+def describe(config: Optional[WatchdogConfig]) -> str:
+    """配置说明（用于启动时输出）"""
+    if config is None or not config.stall_timeout:
+        return "关闭"
+    return f"{config.stall_timeout} 秒无输出且无文件修改即终止，提醒后重试 {config.retries} 次"
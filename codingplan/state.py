@@ -0,0 +1,197 @@
+"""
+工作流状态（断点续传）：原子写入的快照 + 追加写的事件日志
+
+    .codingplan/state.json      快照（临时文件 + fsync + rename，崩溃时只会保留旧版或新版之一）
+    .codingplan/state.journal   快照之后的步骤事件，每行一个 JSON，追加写并 fsync
+
+每个步骤完成只追加一行日志（与已处理文件数无关）；运行结束、失败或日志达到
+COMPACT_EVERY 条时将日志合并进快照并清空。加载时先读快照再按序号重放日志，
+崩溃时写了一半的最后一行会被丢弃
+
+已完成的需求以 files_done 字典记录：绝对路径 -> 开始处理时的内容指纹（sha256、大小、mtime），
+查询为 O(1)（大小与 mtime 未变时不读文件），需求内容修改后视为未完成；旧版的路径列表在加载时转换
+"""
+
+import functools
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from .cache import file_digest
+from .fsutil import write_json_atomic
+
+JOURNAL_NAME = "state.journal"
+
+# 日志累计该条数后自动合并进快照，限制加载时的重放量
+COMPACT_EVERY = 1000
+
+
+@functools.lru_cache(maxsize=256)
+def _resolved_dir(directory: str) -> str:
+    return str(Path(directory).resolve())
+
+
+def file_key(req_file: Path) -> str:
+    """检查点中需求文件的键（绝对路径；所在目录的解析结果按目录缓存，避免逐个文件 resolve）"""
+    return os.path.join(_resolved_dir(str(req_file.parent)), req_file.name)
+
+
+def file_fingerprint(req_file: Path) -> Optional[dict]:
+    """需求文件的内容指纹（文件不存在时为 None）；先取 stat 再计算摘要，期间被修改时下次会重新校验"""
+    try:
+        st = os.stat(req_file)
+    except OSError:
+        return None
+    return {"sha256": file_digest(req_file), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _default_data() -> dict:
+    return {"current_file": None, "current_step": 0, "files_done": {}}
+
+
+class WorkflowState:
+    """工作流状态（用于断点续传）"""
+    def __init__(self, state_file: Path):
+        self.state_file = state_file
+        self.journal_file = state_file.with_name(JOURNAL_NAME)
+        self.data: dict = {}
+        # 加载时的恢复说明（快照损坏时非空）
+        self.recovered: Optional[str] = None
+        # 并发处理多个需求文件时，data 的修改与落盘需串行
+        self._lock = threading.RLock()
+        self._seq = 0  # 最后一条已应用事件的序号（快照中记为 journal_seq）
+        self._pending = 0  # 尚未合并进快照的日志条数
+        self._journal = None
+        self._synced = False  # 本实例是否已加载或写过快照（此后追加的日志才能与快照衔接）
+
+    def load(self):
+        with self._lock:
+            self._close_journal()
+            self.recovered = None
+            data = None
+            if self.state_file.exists():
+                try:
+                    with open(self.state_file, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    if not isinstance(data, dict):
+                        raise ValueError("not an object")
+                except (ValueError, UnicodeDecodeError):
+                    # 旧版本非原子写入留下的半截文件：移到一旁保留，再从日志恢复
+                    backup = self.state_file.with_name(self.state_file.name + ".corrupt")
+                    os.replace(self.state_file, backup)
+                    self.recovered = f"状态快照损坏，已备份为 {backup.name}，从步骤日志恢复"
+                    data = None
+            self.data = data if data is not None else _default_data()
+            files_done = self.data.get("files_done")
+            if isinstance(files_done, list):
+                # 旧版：仅记录路径，无内容摘要（视为与当前内容一致）
+                self.data["files_done"] = {file_key(Path(p)): None for p in files_done}
+            elif not isinstance(files_done, dict):
+                self.data["files_done"] = {}
+            self._seq = int(self.data.get("journal_seq", 0))
+            self._pending = self._replay()
+            self._synced = True
+
+    def _replay(self) -> int:
+        """按序号重放快照之后的日志事件，返回应用的条数"""
+        try:
+            with open(self.journal_file, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return 0
+        end = raw.rfind(b"\n") + 1
+        if end < len(raw):
+            # 崩溃时写了一半的最后一行：截掉，避免后续追加的事件与其粘连
+            os.truncate(self.journal_file, end)
+        applied = 0
+        for line in raw[:end].splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(event, dict) or int(event.get("seq", 0)) <= self._seq:
+                continue  # 已包含在快照中
+            self._apply(event)
+            self._seq = int(event["seq"])
+            applied += 1
+        return applied
+
+    def _apply(self, event: dict) -> None:
+        op = event.get("op")
+        if op == "step":
+            self.data.setdefault("steps_done", {})[event["key"]] = event["step"]
+            self.data["current_file"] = event["file"]
+            self.data["current_step"] = event["step"]
+        elif op == "done":
+            self.data.setdefault("files_done", {})[event["key"]] = event.get("fingerprint")
+            self.data.get("steps_done", {}).pop(event["key"], None)
+
+    def _append(self, event: dict) -> None:
+        """应用事件并追加到日志（fsync 后返回）"""
+        with self._lock:
+            if not self._synced:
+                self.save()
+            self._seq += 1
+            event["seq"] = self._seq
+            self._apply(event)
+            if self._journal is None:
+                self._journal = open(self.journal_file, "ab")
+            self._journal.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._pending += 1
+            if self._pending >= COMPACT_EVERY:
+                self.save()
+
+    def _close_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def save(self):
+        """写入完整快照并清空已合并的日志"""
+        with self._lock:
+            self.data["journal_seq"] = self._seq
+            write_json_atomic(self.state_file, self.data)
+            # 快照已包含全部事件；清空前崩溃也无妨，重放时按 journal_seq 跳过
+            self._close_journal()
+            if self.journal_file.exists():
+                os.truncate(self.journal_file, 0)
+            self._pending = 0
+            self._synced = True
+
+    def add_file_done(self, req_file: Path, fingerprint: Optional[dict] = None):
+        """记录已完成的需求文件并落盘；fingerprint 为开始处理时的内容指纹（默认取当前内容）"""
+        if fingerprint is None:
+            fingerprint = file_fingerprint(req_file)
+        self._append({"op": "done", "key": file_key(req_file), "fingerprint": fingerprint})
+
+    def is_file_done(self, req_file: Path) -> bool:
+        """需求文件是否已完成且内容未变（旧版无指纹的记录只比较路径）"""
+        files_done = self.data.get("files_done") or {}
+        key = file_key(req_file)
+        if key not in files_done:
+            return False
+        recorded = files_done[key]
+        if not isinstance(recorded, dict):
+            return True
+        try:
+            st = os.stat(req_file)
+        except OSError:
+            return False
+        if st.st_size == recorded.get("size") and st.st_mtime_ns == recorded.get("mtime_ns"):
+            return True
+        return file_digest(req_file) == recorded.get("sha256")
+
+    def mark_step_done(self, req_file: Path, step: int):
+        """记录需求文件已完成的步骤（检查点）并落盘"""
+        self._append({"op": "step", "file": str(req_file), "key": file_key(req_file), "step": step})
+
+    def get_steps_done(self, req_file: Path) -> int:
+        """需求文件最后一个已完成的步骤号（无检查点时为 0）"""
+        return int(self.data.get("steps_done", {}).get(file_key(req_file), 0))
+
+    def get_output_path(self, base: str, suffix: str) -> Path:
+        return self.state_file.parent / "outputs" / f"{base}{suffix}"
@@ -0,0 +1,163 @@
+"""codingplan stats：基于运行历史（.codingplan/history.db）的统计"""
+
+import argparse
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+from .history import history_db_path
+from .timeouts import percentile
+
+
+def _fmt_sec(sec: Optional[float]) -> str:
+    """耗时：秒 / 分 / 小时"""
+    if sec is None:
+        return "-"
+    if sec < 60:
+        return f"{sec:.0f}s"
+    if sec < 3600:
+        return f"{sec / 60:.1f}m"
+    return f"{sec / 3600:.1f}h"
+
+
+def _fmt_rate(part: int, total: int) -> str:
+    return f"{part / total * 100:.0f}%" if total else "-"
+
+
+def _print_table(headers: list[str], rows: list[list[str]]) -> None:
+    """按列宽对齐输出（中文按 2 个字符宽度计）"""
+    def width(text: str) -> int:
+        return sum(2 if ord(ch) > 0x2E80 else 1 for ch in text)
+
+    widths = [max(width(str(row[i])) for row in [headers, *rows]) for i in range(len(headers))]
+    for row in [headers, *rows]:
+        print("  " + "  ".join(str(cell) + " " * (widths[i] - width(str(cell))) for i, cell in enumerate(row)).rstrip())
+
+
+def _step_section(conn: sqlite3.Connection, since: str) -> None:
+    print("\n== 各步骤耗时与失败率 ==")
+    rows = conn.execute(
+        "SELECT step, step_name, duration_sec, success, timeouts, stalls, agent_calls FROM steps"
+        " WHERE started_at >= ? ORDER BY step",
+        (since,),
+    ).fetchall()
+    if not rows:
+        print("  （无记录）")
+        return
+    by_step: dict[int, list[tuple]] = {}
+    for row in rows:
+        by_step.setdefault(row[0], []).append(row)
+    table = []
+    for step, items in sorted(by_step.items()):
+        # 耗时只统计实际调用了 Agent 的成功记录（排除缓存命中）
+        durations = [r[2] for r in items if r[3] and r[6] > 0] or [r[2] for r in items if r[3]]
+        failed = sum(1 for r in items if not r[3])
+        table.append([
+            str(step), items[0][1], str(len(items)),
+            _fmt_sec(percentile(durations, 50)) if durations else "-",
+            _fmt_sec(percentile(durations, 95)) if durations else "-",
+            _fmt_sec(max(durations)) if durations else "-",
+            _fmt_rate(failed, len(items)),
+            str(sum(r[4] for r in items)), str(sum(r[5] for r in items)),
+            f"{sum(r[6] for r in items) / len(items):.1f}",
+        ])
+    _print_table(["步骤", "名称", "次数", "p50", "p95", "最大", "失败率", "超时", "卡死", "平均调用"], table)
+
+
+def _slowest_section(conn: sqlite3.Connection, since: str, top: int) -> None:
+    print(f"\n== 最慢需求（Top {top}，按平均耗时）==")
+    rows = conn.execute(
+        "SELECT file, COUNT(*), AVG(duration_sec), MAX(duration_sec), SUM(success) FROM files"
+        " WHERE started_at >= ? GROUP BY file ORDER BY AVG(duration_sec) DESC LIMIT ?",
+        (since, top),
+    ).fetchall()
+    if not rows:
+        print("  （无记录）")
+        return
+    _print_table(
+        ["需求文件", "处理次数", "平均耗时", "最长", "成功率"],
+        [[file, str(n), _fmt_sec(avg), _fmt_sec(mx), _fmt_rate(ok, n)] for file, n, avg, mx, ok in rows],
+    )
+
+
+def _trend_section(conn: sqlite3.Connection, since: str, by: str) -> None:
+    key = "substr(started_at, 1, 10)" if by == "day" else "strftime('%Y-W%W', started_at)"
+    print(f"\n== 趋势（按{'天' if by == 'day' else '周'}）==")
+    runs = {
+        period: (n, ok, interrupted)
+        for period, n, ok, interrupted in conn.execute(
+            f"SELECT {key}, COUNT(*), SUM(success = 1), SUM(ended_at IS NULL) FROM runs"
+            f" WHERE started_at >= ? GROUP BY 1",
+            (since,),
+        )
+    }
+    files = {
+        period: (n, avg)
+        for period, n, avg in conn.execute(
+            f"SELECT {key}, COUNT(*), AVG(duration_sec) FROM files WHERE started_at >= ? GROUP BY 1",
+            (since,),
+        )
+    }
+    steps: dict[str, list[float]] = {}
+    failed_steps: dict[str, tuple[int, int]] = {}
+    for period, duration, success, calls in conn.execute(
+        f"SELECT {key}, duration_sec, success, agent_calls FROM steps WHERE started_at >= ?",
+        (since,),
+    ):
+        if success and calls > 0:
+            steps.setdefault(period, []).append(duration)
+        total, failed = failed_steps.get(period, (0, 0))
+        failed_steps[period] = (total + 1, failed + (0 if success else 1))
+    periods = sorted(set(runs) | set(files))
+    if not periods:
+        print("  （无记录）")
+        return
+    table = []
+    for period in periods:
+        n, ok, interrupted = runs.get(period, (0, 0, 0))
+        fn, favg = files.get(period, (0, None))
+        durations = steps.get(period)
+        total, failed = failed_steps.get(period, (0, 0))
+        table.append([
+            period, str(n), _fmt_rate(ok or 0, n), str(interrupted or 0), str(fn), _fmt_sec(favg),
+            _fmt_sec(percentile(durations, 95)) if durations else "-", _fmt_rate(failed, total),
+        ])
+    _print_table(["时间", "运行", "成功率", "中断", "需求数", "需求平均耗时", "步骤 p95", "步骤失败率"], table)
+
+
+def run_stats(project_root: Path, argv: list[str]) -> int:
+    """输出运行历史统计"""
+    parser = argparse.ArgumentParser(prog="codingplan stats", description="运行历史统计（.codingplan/history.db）")
+    parser.add_argument("--days", type=int, default=30, help="统计最近 N 天（默认 30，0 表示全部）")
+    parser.add_argument("--top", type=int, default=10, help="最慢需求显示条数（默认 10）")
+    parser.add_argument("--by", choices=["day", "week"], default="day", help="趋势按天或按周汇总（默认 day）")
+    parser.add_argument("--db", type=str, default=None, help="历史库路径（默认 .codingplan/history.db）")
+    args = parser.parse_args(argv)
+
+    db_path = Path(args.db) if args.db else history_db_path(project_root)
+    if not db_path.exists():
+        print(f"未找到运行历史: {db_path}（运行一次工作流后自动生成）")
+        return 1
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        if args.days > 0:
+            (since,) = conn.execute("SELECT datetime('now', 'localtime', ?)", (f"-{args.days} days",)).fetchone()
+        else:
+            since = ""
+        total, ok, interrupted, first, last = conn.execute(
+            "SELECT COUNT(*), SUM(success = 1), SUM(ended_at IS NULL), MIN(started_at), MAX(started_at)"
+            " FROM runs WHERE started_at >= ?",
+            (since,),
+        ).fetchone()
+        scope = f"最近 {args.days} 天" if args.days > 0 else "全部"
+        print(f"运行历史: {db_path}（{scope}）")
+        if not total:
+            print("  无运行记录")
+            return 0
+        print(f"  运行 {total} 次，成功 {ok or 0} 次，中断 {interrupted or 0} 次 | {first} ~ {last}")
+        _step_section(conn, since)
+        _slowest_section(conn, since, max(1, args.top))
+        _trend_section(conn, since, args.by)
+    finally:
+        conn.close()
+    return 0
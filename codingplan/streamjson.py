@@ -0,0 +1,256 @@
+"""Agent stream-json 输出解析：增量解析事件流，渲染可读进度并统计各步骤指标"""
+
+import json
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+# 指标文件名（位于 .codingplan/logs/）
+METRICS_FILE = "metrics.jsonl"
+
+# 工具名中表示修改文件的关键字
+_WRITE_TOOL_KEYWORDS = ("write", "edit", "delete", "create", "patch", "replace")
+
+# 工具参数中表示文件路径的键
+_PATH_KEYS = ("path", "file_path", "filePath", "target_file", "targetFile")
+
+# 工具参数中表示命令的键
+_COMMAND_KEYS = ("command", "cmd")
+
+
+@dataclass
+class StreamStats:
+    """一个步骤内（可能多次调用 Agent）的指标汇总"""
+
+    agent_calls: int = 0
+    agent_sec: float = 0.0
+    first_output_sec: Optional[float] = None  # 第一次调用启动到首个输出事件的耗时
+    tool_calls: Counter = field(default_factory=Counter)
+    files_modified: set = field(default_factory=set)
+    files_read: set = field(default_factory=set)
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    events: int = 0
+    parse_errors: int = 0
+
+    def add_tokens(self, input_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+        if input_tokens is not None:
+            self.input_tokens = (self.input_tokens or 0) + input_tokens
+        if output_tokens is not None:
+            self.output_tokens = (self.output_tokens or 0) + output_tokens
+
+    def to_dict(self) -> dict:
+        return {
+            "agent_calls": self.agent_calls,
+            "agent_sec": round(self.agent_sec, 1),
+            "first_output_sec": round(self.first_output_sec, 1) if self.first_output_sec is not None else None,
+            "tool_calls_total": sum(self.tool_calls.values()),
+            "tool_calls": dict(self.tool_calls.most_common()),
+            "files_modified": sorted(self.files_modified),
+            "files_read": len(self.files_read),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "events": self.events,
+            "parse_errors": self.parse_errors,
+        }
+
+
+def _tool_name(key: str) -> str:
+    """readToolCall -> read"""
+    return key[: -len("ToolCall")] if key.endswith("ToolCall") else key
+
+
+def _first_str(args: dict, keys: tuple[str, ...]) -> Optional[str]:
+    for key in keys:
+        value = args.get(key)
+        if isinstance(value, str) and value:
+            return value
+    return None
+
+
+def _usage_tokens(usage: Any) -> tuple[Optional[int], Optional[int]]:
+    """从 usage 字段提取 (输入 tokens, 输出 tokens)"""
+    if not isinstance(usage, dict):
+        return None, None
+
+    def pick(*keys: str) -> Optional[int]:
+        for key in keys:
+            value = usage.get(key)
+            if isinstance(value, (int, float)):
+                return int(value)
+        return None
+
+    return (
+        pick("input_tokens", "inputTokens", "prompt_tokens"),
+        pick("output_tokens", "outputTokens", "completion_tokens"),
+    )
+
+
+class StreamJsonParser:
+    """
+    一次 Agent 调用的 stream-json 增量解析器
+
+    feed() 接收任意切分的输出块，按行解析事件，返回可读文本（用于输出到终端）；
+    指标累加到传入的 StreamStats（同一步骤的多次调用共用一个）
+    """
+
+    def __init__(self, stats: Optional[StreamStats] = None):
+        self.stats = stats if stats is not None else StreamStats()
+        self.started = time.monotonic()
+        self._pending = ""
+        self._first_output = False
+        self._seen_calls: set = set()
+        self._message_tokens: tuple[Optional[int], Optional[int]] = (None, None)
+        self._result_tokens: Optional[tuple[Optional[int], Optional[int]]] = None
+        self.finished = False
+        self.stats.agent_calls += 1
+
+    def feed(self, text: str) -> str:
+        self._pending += text
+        *lines, self._pending = self._pending.split("\n")
+        return "".join(self._render_line(line) for line in lines)
+
+    def finish(self) -> str:
+        """处理剩余输出并汇总本次调用的耗时与 tokens（仅首次调用生效）"""
+        if self.finished:
+            return ""
+        self.finished = True
+        rendered = self._render_line(self._pending) if self._pending else ""
+        self._pending = ""
+        self.stats.agent_sec += time.monotonic() - self.started
+        # 优先使用结束事件报告的总量，否则累加各消息的用量
+        self.stats.add_tokens(*(self._result_tokens or self._message_tokens))
+        return rendered
+
+    def _mark_output(self) -> None:
+        if not self._first_output:
+            self._first_output = True
+            if self.stats.first_output_sec is None:
+                self.stats.first_output_sec = time.monotonic() - self.started
+
+    def _render_line(self, line: str) -> str:
+        if not line.strip():
+            return ""
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            self.stats.parse_errors += 1
+            return line + "\n"
+        if not isinstance(event, dict):
+            self.stats.parse_errors += 1
+            return line + "\n"
+        self.stats.events += 1
+        etype = event.get("type")
+        if etype == "assistant":
+            return self._render_assistant(event)
+        if etype == "tool_call":
+            return self._render_tool_call(event)
+        if etype == "result":
+            self._result_tokens = _usage_tokens(event.get("usage"))
+            if self._result_tokens == (None, None):
+                self._result_tokens = None
+            if event.get("is_error") or event.get("subtype") not in (None, "success"):
+                return f"[结果] {event.get('subtype') or '失败'}: {event.get('result', '')}\n"
+            return ""
+        return ""
+
+    def _render_assistant(self, event: dict) -> str:
+        self._mark_output()
+        message = event.get("message") or {}
+        inp, out = _usage_tokens(message.get("usage") or event.get("usage"))
+        if inp is not None or out is not None:
+            prev_in, prev_out = self._message_tokens
+            self._message_tokens = (
+                (prev_in or 0) + inp if inp is not None else prev_in,
+                (prev_out or 0) + out if out is not None else prev_out,
+            )
+        content = message.get("content")
+        if isinstance(content, str):
+            text = content
+        elif isinstance(content, list):
+            text = "".join(part.get("text", "") for part in content if isinstance(part, dict) and part.get("type") == "text")
+        else:
+            text = ""
+        if not text:
+            return ""
+        return text if text.endswith("\n") else text + "\n"
+
+    def _render_tool_call(self, event: dict) -> str:
+        self._mark_output()
+        tool_call = event.get("tool_call") or {}
+        if not isinstance(tool_call, dict) or not tool_call:
+            return ""
+        key, payload = next(iter(tool_call.items()))
+        name = _tool_name(key)
+        args = payload.get("args", {}) if isinstance(payload, dict) else {}
+        args = args if isinstance(args, dict) else {}
+        path = _first_str(args, _PATH_KEYS)
+        call_id = event.get("call_id")
+        subtype = event.get("subtype")
+        # 以 started 事件计数；只有 completed 事件时以其计数
+        new_call = subtype == "started" or (call_id is not None and call_id not in self._seen_calls)
+        if call_id is not None:
+            self._seen_calls.add(call_id)
+        if not new_call:
+            return ""
+        self.stats.tool_calls[name] += 1
+        if path:
+            if any(k in name.lower() for k in _WRITE_TOOL_KEYWORDS):
+                self.stats.files_modified.add(path)
+            else:
+                self.stats.files_read.add(path)
+        detail = path or _first_str(args, _COMMAND_KEYS) or ""
+        return f"  ▸ {name} {detail}".rstrip() + "\n"
+
+
+class MetricsLog:
+    """各步骤指标写入 .codingplan/logs/metrics.jsonl（每行一个 JSON 对象），并汇总全程统计"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.total = StreamStats()
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        file_name: str,
+        step: int,
+        step_name: str,
+        success: bool,
+        duration_sec: float,
+        stats: StreamStats,
+    ) -> None:
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "file": file_name,
+            "step": step,
+            "step_name": step_name,
+            "success": success,
+            "duration_sec": round(duration_sec, 1),
+            **stats.to_dict(),
+        }
+        with self._lock:
+            self.total.agent_calls += stats.agent_calls
+            self.total.agent_sec += stats.agent_sec
+            self.total.tool_calls.update(stats.tool_calls)
+            self.total.files_modified |= stats.files_modified
+            self.total.add_tokens(stats.input_tokens, stats.output_tokens)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def summary(self) -> str:
+        """全程统计说明"""
+        t = self.total
+        parts = [
+            f"Agent 调用 {t.agent_calls} 次（{t.agent_sec:.0f}s）",
+            f"工具调用 {sum(t.tool_calls.values())} 次",
+            f"修改文件 {len(t.files_modified)} 个",
+        ]
+        if t.input_tokens is not None or t.output_tokens is not None:
+            parts.append(f"tokens 输入 {t.input_tokens or 0} / 输出 {t.output_tokens or 0}")
+        return "Agent 指标: " + "，".join(parts) + f"（明细: {self.path}）"
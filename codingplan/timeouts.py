@@ -0,0 +1,159 @@
+"""单步超时：按步骤配置，或由历史耗时（p95）自适应推算"""
+
+import math
+import os
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from .config import load_project_config
+from .history import history_db_path, load_step_durations as load_history_durations
+from .logger import get_step_timeout_seconds
+
+# 配置节名（.codingplan/codingplan.conf）
+TIMEOUTS_SECTION = "timeouts"
+
+# 超时下限（秒），与 CODINGPLAN_STEP_TIMEOUT 的下限一致
+MIN_TIMEOUT = 60
+
+DEFAULT_ADAPTIVE_FACTOR = 2.0
+DEFAULT_ADAPTIVE_MIN_SAMPLES = 5
+
+# 每个步骤参与统计的最近样本数
+_MAX_SAMPLES = 200
+
+# log_step_end 写入的步骤结束行：[文件名] Step N: 步骤名 结束 | 成功 | 耗时 X.Xs[ | Agent 调用 N 次]
+_STEP_END_PATTERN = re.compile(r"\] Step (\d+): .* 结束 \| 成功 \| 耗时 ([\d.]+)s(?: \| Agent 调用 (\d+) 次)?")
+
+
+@dataclass
+class StepTimeouts:
+    """各步骤的 Agent 调用超时"""
+
+    default: int
+    per_step: dict[int, int] = field(default_factory=dict)  # 显式配置的步骤超时
+    adaptive: dict[int, int] = field(default_factory=dict)  # 由历史耗时推算的步骤超时
+
+    def for_step(self, step: int) -> int:
+        """步骤超时：显式配置 > 自适应推算 > 默认值"""
+        return self.per_step.get(step) or self.adaptive.get(step) or self.default
+
+    def describe(self) -> str:
+        """超时配置说明（用于启动时输出）"""
+        parts = [f"默认 {self.default}s"]
+        merged = {**self.adaptive, **self.per_step}
+        if merged:
+            parts.append(" ".join(
+                f"S{step}={merged[step]}s{'*' if step in self.adaptive and step not in self.per_step else ''}"
+                for step in sorted(merged)
+            ))
+        if self.adaptive:
+            parts.append("（* 为按历史耗时自适应）")
+        return " | ".join(parts)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """最近秩法百分位数"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def load_step_durations(log_file: Path) -> dict[int, list[float]]:
+    """
+    从 codingplan.log 读取各步骤成功时的耗时（每步骤保留最近 _MAX_SAMPLES 条）
+
+    未调用 Agent 的步骤（缓存命中、本地转换、本地编译测试直接通过）不计入，同 history.load_step_durations
+    """
+    durations: dict[int, deque] = {}
+    try:
+        with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                m = _STEP_END_PATTERN.search(line)
+                if m and m.group(3) != "0":
+                    durations.setdefault(int(m.group(1)), deque(maxlen=_MAX_SAMPLES)).append(float(m.group(2)))
+    except OSError:
+        return {}
+    return {step: list(samples) for step, samples in durations.items()}
+
+
+def adaptive_timeouts(
+    durations: dict[int, list[float]],
+    factor: float,
+    min_samples: int,
+    cap: int,
+) -> dict[int, int]:
+    """按 p95 × factor 推算超时（样本不足的步骤不推算），结果限制在 [MIN_TIMEOUT, cap]"""
+    result = {}
+    for step, samples in durations.items():
+        if len(samples) < min_samples:
+            continue
+        result[step] = min(cap, max(MIN_TIMEOUT, math.ceil(percentile(samples, 95) * factor)))
+    return result
+
+
+def load_step_timeouts(project_root: Path, log_dir: Optional[Path] = None) -> StepTimeouts:
+    """
+    读取 [timeouts] 配置
+
+    示例:
+        [timeouts]
+        default = 3600
+        step1 = 600
+        step5 = 7200
+        adaptive = true
+        factor = 2.0
+        min_samples = 5
+
+    命令行 --timeout / 环境变量 CODINGPLAN_STEP_TIMEOUT 优先于 default，二者均未设置时为 3600。
+    adaptive 开启时，未显式配置的步骤按该步骤历史成功耗时（.codingplan/history.db，
+    不存在时解析 codingplan.log）的 p95 × factor 推算，
+    不超过 default；样本数少于 min_samples 的步骤仍使用 default
+    """
+    default = get_step_timeout_seconds()
+    cp = load_project_config(project_root)
+    if not cp.has_section(TIMEOUTS_SECTION):
+        return StepTimeouts(default=default)
+    section = cp[TIMEOUTS_SECTION]
+
+    def seconds(key: str, fallback: int) -> int:
+        """读取秒数；0、负数或非法值视为未配置（返回 fallback），其余不低于 MIN_TIMEOUT"""
+        try:
+            value = section.getint(key, fallback)
+        except ValueError:
+            return fallback
+        if value <= 0:
+            return fallback
+        return max(MIN_TIMEOUT, value)
+
+    if "CODINGPLAN_STEP_TIMEOUT" not in os.environ:
+        default = seconds("default", default)
+    per_step = {}
+    for key in section:
+        m = re.fullmatch(r"step(\d+)", key)
+        if m:
+            value = seconds(key, 0)
+            if value:
+                per_step[int(m.group(1))] = value
+
+    adaptive = {}
+    try:
+        adaptive_on = section.getboolean("adaptive", False)
+    except ValueError:
+        adaptive_on = False
+    if adaptive_on:
+        try:
+            factor = max(1.0, section.getfloat("factor", DEFAULT_ADAPTIVE_FACTOR))
+            min_samples = max(1, section.getint("min_samples", DEFAULT_ADAPTIVE_MIN_SAMPLES))
+        except ValueError:
+            factor, min_samples = DEFAULT_ADAPTIVE_FACTOR, DEFAULT_ADAPTIVE_MIN_SAMPLES
+        # 优先使用运行历史库（排除缓存命中），不存在时解析 codingplan.log
+        db_path = history_db_path(project_root)
+        if db_path.exists():
+            durations = load_history_durations(db_path, _MAX_SAMPLES)
+        else:
+            durations = load_step_durations((log_dir or project_root / ".codingplan" / "logs") / "codingplan.log")
+        adaptive = adaptive_timeouts(durations, factor, min_samples, default)
+    return StepTimeouts(default=default, per_step=per_step, adaptive=adaptive)
@@ -0,0 +1,83 @@
+"""工作流运行追踪：导出 Chrome Trace Event Format（chrome://tracing、Perfetto 可直接打开）"""
+
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Iterator, Optional
+
+from .fsutil import write_json_atomic
+
+# 所有事件归属同一进程
+_PID = 1
+
+
+class Tracer:
+    """
+    收集完整事件（ph = "X"），每个线程一条泳道（主线程、各并发 job 线程），save() 时写出 JSON
+
+    时间戳为相对追踪开始的微秒数
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.start = time.time()
+        self._events: list[dict] = []
+        self._lanes: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _tid(self) -> int:
+        """当前线程的泳道号（首次出现时写入线程名元数据）"""
+        ident = threading.get_ident()
+        tid = self._lanes.get(ident)
+        if tid is None:
+            tid = self._lanes[ident] = len(self._lanes) + 1
+            name = threading.current_thread().name
+            self._events.append({"ph": "M", "name": "thread_name", "pid": _PID, "tid": tid, "args": {"name": name}})
+            self._events.append({"ph": "M", "name": "thread_sort_index", "pid": _PID, "tid": tid, "args": {"sort_index": tid}})
+        return tid
+
+    def record(self, name: str, cat: str, start: float, end: Optional[float] = None, **args: Any) -> None:
+        """记录一个已结束的区间（start/end 为 time.time() 时间戳，end 默认当前时间）"""
+        end = time.time() if end is None else end
+        with self._lock:
+            self._events.append({
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": round((start - self.start) * 1e6),
+                "dur": max(0, round((end - start) * 1e6)),
+                "pid": _PID,
+                "tid": self._tid(),
+                "args": {k: v for k, v in args.items() if v is not None},
+            })
+
+    @contextmanager
+    def span(self, name: str, cat: str, **args: Any) -> Iterator[dict]:
+        """记录代码块耗时；可向产出的 dict 中补充结束时才知道的参数（如 success）"""
+        start = time.time()
+        extra: dict = {}
+        try:
+            yield extra
+        finally:
+            self.record(name, cat, start, **args, **extra)
+
+    def save(self) -> None:
+        """写出追踪文件（原子写入）"""
+        with self._lock:
+            data = {
+                "traceEvents": [
+                    {"ph": "M", "name": "process_name", "pid": _PID, "args": {"name": "codingplan"}},
+                    *self._events,
+                ],
+                "displayTimeUnit": "ms",
+                "otherData": {"start_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.start))},
+            }
+            write_json_atomic(self.path, data, indent=None)
+
+
+def span(tracer: Optional[Tracer], name: str, cat: str, **args: Any) -> ContextManager[dict]:
+    """tracer 为 None 时返回空上下文，产出的 dict 可照常写入"""
+    if tracer is None:
+        return nullcontext({})
+    return tracer.span(name, cat, **args)
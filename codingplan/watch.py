@@ -0,0 +1,230 @@
+"""监听需求目录：新增或修改的需求文件在静默一段时间后送入处理队列（--watch）
+
+哪些文件是需求、是否包含子目录，与需求发现使用同一套规则（discovery.RequirementFilter）
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from .discovery import RequirementFilter, discover
+
+# 默认去抖时间（秒）：文件最后一次变化后静默该时长才视为写入完成
+DEFAULT_DEBOUNCE = 2.0
+
+# 轮询模式的扫描间隔（秒）
+POLL_INTERVAL = 1.0
+
+# inotify 事件位（<sys/inotify.h>）
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+
+# struct inotify_event 定长部分：wd、mask、cookie、len
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """定期扫描目录（与需求发现相同的遍历），比较各需求文件的 (mtime, size)"""
+
+    kind = "轮询"
+
+    def __init__(self, directory: Path, rules: Optional[RequirementFilter] = None, interval: float = POLL_INTERVAL):
+        self.directory = directory
+        self.rules = rules or RequirementFilter()
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        return {f.rel: (f.mtime_ns, f.size) for f in discover(self.directory, self.rules)}
+
+    def wait(self, timeout: float) -> set[str]:
+        """等待至多 timeout 秒，返回期间新增或修改的文件（相对路径）"""
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._scan()
+        changed = {rel for rel, sig in snapshot.items() if self._snapshot.get(rel) != sig}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Linux inotify（通过 ctypes 调用 libc，无第三方依赖）
+
+    recursive 时为每个需遍历的子目录各添加一个 watch，新建或移入的子目录随即加入监听
+    """
+
+    kind = "inotify"
+
+    def __init__(self, directory: Path, rules: Optional[RequirementFilter] = None):
+        self.directory = directory
+        self.rules = rules or RequirementFilter()
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs: dict[int, str] = {}  # watch 描述符 -> 目录相对路径前缀（顶层为 ""）
+        try:
+            self._add_tree(os.fspath(directory), "")
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _add_watch(self, path: str, prefix: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _IN_WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch 失败: {path}（{os.strerror(errno)}）")
+        self._dirs[wd] = prefix
+
+    def _add_tree(self, path: str, prefix: str) -> None:
+        """监听目录及其中需遍历的子目录（规则同 discovery.discover）"""
+        stack = [(path, prefix)]
+        while stack:
+            directory, prefix = stack.pop()
+            self._add_watch(directory, prefix)
+            if not self.rules.recursive:
+                continue
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        rel = prefix + entry.name
+                        if entry.is_dir(follow_symlinks=False) and self.rules.enters(entry.path, entry.name, rel):
+                            stack.append((entry.path, rel + "/"))
+            except OSError:
+                continue
+
+    def _new_dir(self, rel: str) -> set[str]:
+        """新建或移入的子目录：加入监听，并返回其中已有的需求文件（添加 watch 前写入的文件没有事件）"""
+        path = self.directory / rel
+        if not self.rules.enters(os.fspath(path), path.name, rel):
+            return set()
+        try:
+            self._add_tree(os.fspath(path), rel + "/")
+        except OSError as e:
+            print(f"警告: 无法监听新目录 {rel}: {e}（其中的需求变化需重启 --watch 后处理）", flush=True)
+            return set()
+        return {f.rel for f in discover(path, self.rules, prefix=rel + "/")}
+
+    def wait(self, timeout: float) -> set[str]:
+        """等待至多 timeout 秒，返回期间新增或修改的文件（相对路径；队列溢出时全量扫描）"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", errors="surrogateescape")
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                changed.update(f.rel for f in discover(self.directory, self.rules))
+                continue
+            if mask & _IN_IGNORED:
+                self._dirs.pop(wd, None)  # 目录已删除或移走
+                continue
+            prefix = self._dirs.get(wd)
+            if prefix is None or not name:
+                continue
+            rel = prefix + name
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    changed.update(self._new_dir(rel))
+            elif self.rules.matches(name, rel):
+                changed.add(rel)
+        return changed
+
+    def close(self) -> None:
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+
+def open_watcher(directory: Path, rules: Optional[RequirementFilter] = None):
+    """
+    Linux 上优先使用 inotify，不可用（非 Linux、watch 数量达上限、网络文件系统等）时回退到轮询
+
+    环境变量 CODINGPLAN_WATCH=poll 可强制使用轮询
+    """
+    if sys.platform.startswith("linux") and os.environ.get("CODINGPLAN_WATCH", "").strip().lower() != "poll":
+        try:
+            return InotifyWatcher(directory, rules)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory, rules)
+
+
+class RequirementWatcher:
+    """
+    后台线程监听需求目录，文件最后一次变化后静默 debounce 秒再调用 on_ready(path)
+
+    rules 决定哪些文件是需求及是否监听子目录（默认同 RequirementFilter()：仅顶层、默认包含/排除模式）。
+    同一文件在去抖期内的多次变化只触发一次；触发时文件已删除则忽略
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        on_ready: Callable[[Path], None],
+        debounce: float = DEFAULT_DEBOUNCE,
+        rules: Optional[RequirementFilter] = None,
+    ):
+        self.directory = directory
+        self.on_ready = on_ready
+        self.debounce = max(0.0, debounce)
+        self._watcher = open_watcher(directory, rules)
+        self._pending: dict[str, float] = {}  # 相对路径 -> 最后一次变化的 monotonic 时间
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def kind(self) -> str:
+        return self._watcher.kind
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="codingplan-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._watcher.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if self._pending:
+                timeout = max(0.05, min(self._pending.values()) + self.debounce - now)
+            else:
+                timeout = 0.5
+            changed = self._watcher.wait(min(timeout, 0.5))
+            now = time.monotonic()
+            for rel in changed:
+                self._pending[rel] = now
+            for rel in sorted(r for r, t in self._pending.items() if now - t >= self.debounce):
+                del self._pending[rel]
+                path = self.directory / rel
+                if path.is_file():
+                    self.on_ready(path)
@@ -0,0 +1,336 @@
+"""codingplan worker：多个 worker（可在不同主机上）通过共享的 .codingplan/queue/ 分摊同一需求目录"""
+
+import argparse
+import hashlib
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from .agent import check_agent_installed, get_agent_cmd
+from .cache import file_digest
+from .config import OUTPUT_DIR_NAMES, get_output_dirs
+from . import discovery
+from . import graph as graph_mod
+from . import ingest as ingest_mod
+from .history import RunHistory
+from .logger import get_log_dir, log_workflow_start, setup_logger
+from .state import WorkflowState, file_key
+from .workflow import (
+    _format_failed_step,
+    _log_run_end,
+    _print_run_config,
+    _report_run_stats,
+    _resume_step,
+    build_run_context,
+    collect_requirement_files,
+    process_project_check,
+    process_single_file,
+    report_duplicate_stems,
+)
+from .workqueue import (
+    DEFAULT_LEASE_TTL,
+    PROJECT_CHECK_KEY,
+    QUEUE_DIR,
+    DirLock,
+    Heartbeat,
+    LeaseQueue,
+    default_worker_name,
+    key_filename,
+    update_json,
+)
+
+# 无可认领文件时的轮询间隔（秒）
+DEFAULT_POLL = 10
+
+
+def _default_state() -> dict:
+    return {"current_file": None, "current_step": 0, "files_done": {}}
+
+
+def _queue_key(req_dir: Path, req_file: Path) -> str:
+    """需求文件在队列中的键：相对需求目录的路径（/ 分隔），子目录中的同名需求互不冲突"""
+    return req_file.relative_to(req_dir).as_posix()
+
+
+def _done_fingerprint(queue: LeaseQueue, req_dir: Path, files: list[Path]) -> str:
+    """已完成需求集合（相对路径 + 内容摘要）的指纹，变化时项目级检查需重新执行"""
+    h = hashlib.sha256()
+    for f in files:
+        key = _queue_key(req_dir, f)
+        record = queue.done(key) or {}
+        h.update(f"{key}\0{record.get('digest')}\0".encode("utf-8", errors="replace"))
+    return h.hexdigest()
+
+
+def _status(queue: LeaseQueue, req_dir: Path, files: list[Path]) -> int:
+    """输出队列状态"""
+    leases = queue.active_leases()
+    counts = {"完成": 0, "失败": 0, "处理中": 0, "待处理": 0}
+    for f in files:
+        key = _queue_key(req_dir, f)
+        done, failed = queue.done(key), queue.failed(key)
+        if key in leases:
+            lease = leases[key]
+            status = f"处理中（{lease.get('worker')}，{lease['age']:.0f} 秒前心跳）"
+            counts["处理中"] += 1
+        elif done and done.get("digest") == file_digest(f):
+            status = f"完成（{done.get('worker')}，{done.get('finished_at')}）"
+            counts["完成"] += 1
+        elif failed and failed.get("digest") == file_digest(f):
+            status = f"失败（{_format_failed_step(failed.get('failed_step'), failed.get('failed_step_name'))}，{failed.get('worker')}）"
+            counts["失败"] += 1
+        else:
+            status = "待处理（需求已修改）" if done or failed else "待处理"
+            counts["待处理"] += 1
+        print(f"  {key}: {status}")
+    print("  " + "，".join(f"{k} {v}" for k, v in counts.items()))
+    check = queue.done(PROJECT_CHECK_KEY)
+    if PROJECT_CHECK_KEY in leases:
+        print(f"  项目级检查: 执行中（{leases[PROJECT_CHECK_KEY].get('worker')}）")
+    elif check and check.get("fingerprint") == _done_fingerprint(queue, req_dir, files):
+        print(f"  项目级检查: {'通过' if check.get('success') else '未完全成功'}（{check.get('worker')}，{check.get('finished_at')}）")
+    return 0
+
+
+def run_worker(project_root: Path, argv: list[str]) -> int:
+    """认领并处理需求文件，直到全部完成（--follow 时持续等待新需求）"""
+    parser = argparse.ArgumentParser(
+        prog="codingplan worker",
+        description="从共享队列（.codingplan/queue/）认领需求文件并处理；可在多台共享项目目录的主机上同时运行",
+    )
+    parser.add_argument("req_dir", help="需求文件所在目录（各 worker 须一致）")
+    parser.add_argument("--name", default=None, help="worker 名称（默认 主机名-进程号）")
+    parser.add_argument(
+        "--lease-ttl", type=int, default=DEFAULT_LEASE_TTL,
+        help=f"租约有效期秒数（默认 {DEFAULT_LEASE_TTL}），超过该时长未心跳的租约可被其他 worker 接管",
+    )
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL, help=f"无可认领文件时的轮询间隔秒数（默认 {DEFAULT_POLL}）")
+    parser.add_argument("--follow", action="store_true", help="全部完成后继续等待新增或修改的需求")
+    parser.add_argument("--retry-failed", action="store_true", help="清除失败记录，重新处理失败的需求")
+    parser.add_argument("--status", action="store_true", help="仅输出队列状态")
+    parser.add_argument("-s", "--scope", default=None, help="实现范围限制（同 codingplan -s）")
+    parser.add_argument("-H", "--hint", default=None, help="额外提醒（同 codingplan -H）")
+    parser.add_argument("-u", "--ui-dir", dest="ui_dir", default=None, help="UI 设计目录，默认 uidesign，空字符串表示不使用")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true", help="不使用文档缓存")
+    parser.add_argument("--no-convert", dest="no_convert", action="store_true", help="Step 1 不做本地转换，始终由 Agent 规范化")
+    parser.add_argument("--recursive", action="store_true", help="同时处理子目录中的需求文件（同 codingplan --recursive，各 worker 须一致）")
+    parser.add_argument("--include", action="append", metavar="PATTERN", help="需求文件包含模式（同 codingplan --include，各 worker 须一致）")
+    parser.add_argument("--exclude", action="append", metavar="PATTERN", help="需求文件排除模式（同 codingplan --exclude，各 worker 须一致）")
+    parser.add_argument("--stream-json", dest="stream_json", action="store_true", help="记录各步骤 Agent 指标（同 codingplan --stream-json）")
+    args = parser.parse_args(argv)
+
+    req_dir = project_root / args.req_dir
+    if not req_dir.is_dir():
+        print(f"错误: 目录不存在: {req_dir}")
+        return 1
+    if args.ui_dir is None:
+        ui_dir: Optional[Path] = project_root / "uidesign"
+    else:
+        ui_dir = project_root / args.ui_dir.strip() if args.ui_dir.strip() else None
+
+    def collect() -> list[Path]:
+        return collect_requirement_files(
+            req_dir, args.include, args.exclude,
+            skip_dirs=[*(project_root / d for d in OUTPUT_DIR_NAMES), project_root / ".codingplan", ui_dir],
+            recursive=args.recursive,
+        )
+
+    worker = args.name or default_worker_name()
+    queue = LeaseQueue(project_root / ".codingplan" / QUEUE_DIR, worker, max(10, args.lease_ttl))
+    if args.status:
+        print(f"队列: {queue.root}")
+        return _status(queue, req_dir, collect())
+    if args.retry_failed:
+        print(f"已清除 {queue.clear_failed()} 条失败记录")
+    if not check_agent_installed():
+        print(f"错误: 未检测到 Cursor Agent（{' '.join(get_agent_cmd())}）。请先安装: curl https://cursor.com/install -fsS | bash")
+        return 1
+
+    if report_duplicate_stems(discovery.duplicate_stems(_queue_key(req_dir, f) for f in collect())):
+        return 1
+
+    start_time = datetime.now()
+    print(f"worker {worker} 开始: {start_time.strftime('%Y-%m-%d %H:%M:%S')}（队列 {queue.root}，租约 {queue.ttl} 秒）")
+    dirs = get_output_dirs(project_root)
+    state_file = project_root / ".codingplan" / "state.json"
+    graph_file = project_root / ".codingplan" / "graph.json"
+
+    def record_state(data: dict) -> None:
+        data["req_dir"] = str(req_dir.resolve())
+        data.pop("completed", None)
+        for key, value in (("scope", args.scope), ("hint", args.hint)):
+            if value:
+                data[key] = value
+
+    # 单机运行遗留的步骤日志先在锁内合并进快照，此后各 worker 均在锁内直接更新快照
+    with DirLock(state_file.with_name(state_file.name + ".lock")):
+        state = WorkflowState(state_file)
+        state.load()
+        record_state(state.data)
+        state.save()
+
+    # 依赖图：本 worker 的记录只保存在内存中，每个需求结束后在锁内合并到共享的 graph.json
+    graph = graph_mod.ArtifactGraph(graph_file)
+    graph.load()
+
+    logger = setup_logger(project_root)
+    files = collect()
+    log_workflow_start(logger, f"{req_dir}（worker {worker}）", len(files))
+    # 运行历史：共享目录可能在 NFS 上，各 worker 写入各自的库（回滚日志模式，不用 WAL）
+    history = RunHistory(queue.root / "history" / f"{key_filename(worker)}.db", wal=False)
+    ctx = build_run_context(
+        project_root, graph, use_cache=not args.no_cache, stream_json=args.stream_json,
+        local_convert=not args.no_convert, history=history,
+    )
+    ctx.history.start_run(project_root, req_dir, len(files), 1)
+    _print_run_config(ctx, logger)
+
+    processed: list[str] = []
+    failed: list[str] = []
+
+    def is_finished(f: Path) -> bool:
+        digest = file_digest(f)
+        key = _queue_key(req_dir, f)
+        return any(r and r.get("digest") == digest for r in (queue.done(key), queue.failed(key)))
+
+    def claim(pending: list[Path]) -> Optional[Path]:
+        """认领第一个可认领的需求；认领前的完成检查与认领之间其他 worker 可能刚完成并释放，认领后须再检查"""
+        for f in pending:
+            key = _queue_key(req_dir, f)
+            if not queue.try_claim(key):
+                continue
+            if not is_finished(f):
+                return f
+            queue.release(key)
+        return None
+
+    def process(req_file: Path) -> None:
+        key = _queue_key(req_dir, req_file)
+        state = WorkflowState(state_file)
+        state.load()
+        resume_from_step = _resume_step(state, req_file, dirs)
+        ingestion = ingest_mod.ingest_file(req_file)
+        fingerprint = ingestion.fingerprint()
+        digest = fingerprint["sha256"] if fingerprint else None
+        print(f"\n[{worker}] 处理: {key}" + (f"（从 Step {resume_from_step} 继续）" if resume_from_step else ""), flush=True)
+
+        def on_step_done(step: int) -> None:
+            def update(data: dict) -> None:
+                data.setdefault("steps_done", {})[file_key(req_file)] = step
+                data["current_file"] = str(req_file)
+                data["current_step"] = step
+            update_json(state_file, update, _default_state)
+
+        file_start = datetime.now()
+        with Heartbeat(queue, key) as heartbeat, ctx.span(key, "file", worker=worker) as span_args:
+            success, failed_step, failed_step_name = process_single_file(
+                req_file, project_root, dirs, resume_from_step=resume_from_step,
+                scope=args.scope, hint=args.hint, ui_dir=ui_dir, on_step_done=on_step_done, ctx=ctx,
+                ingestion=ingestion,
+            )
+            span_args.update(success=success, failed_step=failed_step)
+        ctx.history.record_file(key, file_start, success, failed_step)
+
+        graph_key = str(req_file.resolve())
+        if graph_key in graph.data["files"]:
+            update_json(
+                graph_file,
+                lambda data: data.setdefault("files", {}).__setitem__(graph_key, graph.data["files"][graph_key]),
+                lambda: {"version": 1, "files": {}},
+                indent=None,
+            )
+        record = {
+            "file": key, "digest": digest, "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_sec": (datetime.now() - file_start).total_seconds(),
+        }
+        if success:
+            queue.mark_done(key, record)
+
+            def update(data: dict) -> None:
+                data.setdefault("files_done", {})[file_key(req_file)] = fingerprint
+                data.get("steps_done", {}).pop(file_key(req_file), None)
+            update_json(state_file, update, _default_state)
+            processed.append(key)
+            print(f"[{worker}] 完成: {key}", flush=True)
+        else:
+            queue.mark_failed(key, {**record, "failed_step": failed_step, "failed_step_name": failed_step_name})
+            failed.append(key)
+            print(f"[{worker}] 失败: {key}（{_format_failed_step(failed_step, failed_step_name)}）", flush=True)
+        if heartbeat.lost:
+            print(f"[{worker}] 提示: {key} 处理期间租约被接管，结果仍已记录", flush=True)
+
+    def project_check(files: list[Path]) -> Optional[bool]:
+        """全部需求成功后由第一个认领到检查租约的 worker 执行；无需执行或已被他人认领时返回 None"""
+        fingerprint = _done_fingerprint(queue, req_dir, files)
+        record = queue.done(PROJECT_CHECK_KEY)
+        if record and record.get("fingerprint") == fingerprint:
+            return None
+        if not queue.try_claim(PROJECT_CHECK_KEY):
+            return None
+        try:
+            print(f"\n[{worker}] 全部需求已完成，执行项目整体完成度与测试检查...", flush=True)
+            with Heartbeat(queue, PROJECT_CHECK_KEY):
+                success = process_project_check(project_root, dirs, scope=args.scope, hint=args.hint, ctx=ctx)
+            queue.mark_done(PROJECT_CHECK_KEY, {
+                "fingerprint": fingerprint, "success": success, "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            if success:
+                update_json(state_file, lambda data: data.update(completed=True, current_file=None), _default_state)
+            print(f"[{worker}] 项目级检查{'完成' if success else '未完全成功'}", flush=True)
+            return success
+        finally:
+            queue.release(PROJECT_CHECK_KEY)
+
+    check_ok: Optional[bool] = None
+    duplicates: dict[str, list[str]] = {}
+    warned_duplicates: set[tuple[str, ...]] = set()
+    try:
+        while True:
+            files = collect()
+            # --follow 期间新出现的同名需求：产出文档会互相覆盖，双方均暂不处理，直至重命名
+            duplicates = discovery.duplicate_stems(_queue_key(req_dir, f) for f in files)
+            for rels in duplicates.values():
+                if tuple(rels) not in warned_duplicates:
+                    warned_duplicates.add(tuple(rels))
+                    print(f"[{worker}] 警告: 需求 {', '.join(rels)} 同名，暂不处理，请重命名", flush=True)
+            pending = [f for f in files if f.stem not in duplicates and not is_finished(f)]
+            claimed = claim(pending)
+            if claimed is not None:
+                try:
+                    process(claimed)
+                finally:
+                    queue.release(_queue_key(req_dir, claimed))
+                continue
+            if pending or PROJECT_CHECK_KEY in queue.active_leases():
+                # 其余需求或项目级检查由其他 worker 处理中：等待其完成，或租约过期后接管
+                time.sleep(args.poll)
+                continue
+            if duplicates or any(queue.failed(_queue_key(req_dir, f)) for f in files):
+                if not args.follow:
+                    break
+            elif files:
+                result = project_check(files)
+                if result is not None:
+                    check_ok = result
+            if not args.follow:
+                break
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        print(f"\n[{worker}] 已中断，租约已释放，其他 worker 可从检查点继续")
+
+    _report_run_stats(ctx, logger)
+    duration_sec = (datetime.now() - start_time).total_seconds()
+    success = not failed and not duplicates and check_ok is not False
+    if failed:
+        error = f"失败: {', '.join(failed)}"
+    elif duplicates:
+        error = f"同名需求未处理: {', '.join(rel for rels in duplicates.values() for rel in rels)}"
+    else:
+        error = None if check_ok is not False else "项目级检查或补充未完全成功"
+    _log_run_end(ctx, logger, success, duration_sec, len(processed), error)
+    print(f"\n[{worker}] 结束: 完成 {len(processed)} 个，失败 {len(failed)} 个" + (f"（{', '.join(failed)}）" if failed else ""))
+    if get_log_dir():
+        print(f"运行日志: {get_log_dir() / 'codingplan.log'}")
+    _status(queue, req_dir, collect())
+    return 0 if success else 1
@@ -1,17 +1,38 @@
 """工作流编排器"""
 
-import json
+import queue
+import shlex
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from types import SimpleNamespace
+from typing import Callable, Iterable, Optional
 
-from .agent import run_agent, run_plan, run_ask, check_agent_installed
+from .agent import run_agent, run_plan, run_ask, check_agent_installed, get_agent_cmd
+from . import buildtest
+from . import convert as convert_mod
+from . import discovery
+from .cache import StepCache, file_digest
 from . import figma as figma_mod
+from . import graph as graph_mod
+from .history import RunHistory, StepCalls, history_db_path
+from . import ingest as ingest_mod
 from . import notify
-from .config import get_output_dirs, REQUIREMENT_EXTENSIONS, STEPS
+from .config import get_output_dirs, REQUIREMENT_EXTENSIONS
 from . import prompts
+from .stall import WatchdogConfig, load_watchdog_config
+from .state import WorkflowState, file_key
+from .streamjson import METRICS_FILE, MetricsLog, StreamStats
+from . import stall as stall_mod
+from .timeouts import StepTimeouts, load_step_timeouts
+from . import trace as trace_mod
+from . import watch as watch_mod
+from . import worktree as worktree_mod
 from .logger import (
     setup_logger,
+    get_log_dir,
     log_step_start,
     log_step_end,
     log_workflow_start,
@@ -31,35 +52,105 @@ STEP_NAMES = {
     9: "完成度校验",
 }
 
+# 并发模式下保证多个 job 的进度输出按行完整输出
+_print_lock = threading.Lock()
 
-class WorkflowState:
-    """工作流状态（用于断点续传）"""
-    def __init__(self, state_file: Path):
-        self.state_file = state_file
-        self.data: dict = {}
 
-    def load(self):
-        if self.state_file.exists():
-            with open(self.state_file, "r", encoding="utf-8") as f:
-                self.data = json.load(f)
-        else:
-            self.data = {"current_file": None, "current_step": 0, "files_done": []}
+def _progress(msg: str, label: Optional[str] = None) -> None:
+    """输出进度；并发模式下以 [label] 前缀区分各 job"""
+    if label:
+        msg = "\n".join(f"[{label}] {line}" if line.strip() else line for line in msg.split("\n"))
+    with _print_lock:
+        print(msg, flush=True)
+
+
+@dataclass
+class RunContext:
+    """一次工作流运行中各需求文件共享的组件（均为可选）"""
+
+    cache: Optional[StepCache] = None
+    graph: Optional[graph_mod.ArtifactGraph] = None
+    build: Optional[buildtest.BuildConfig] = None  # Step 8 本地编译测试命令（.codingplan/codingplan.conf [build]）
+    timeouts: Optional[StepTimeouts] = None  # 各步骤 Agent 调用超时（.codingplan/codingplan.conf [timeouts]）
+    watchdog: Optional[WatchdogConfig] = None  # 卡死检测（.codingplan/codingplan.conf [watchdog]）
+    metrics: Optional[MetricsLog] = None  # --stream-json 时记录各步骤 Agent 指标
+    history: Optional[RunHistory] = None  # 运行历史（.codingplan/history.db）
+    tracer: Optional[trace_mod.Tracer] = None  # --trace 时记录各阶段区间
+    local_convert: bool = True  # Step 1 先尝试本地转换为 Markdown（--no-convert 关闭）
+    designs: Optional[figma_mod.DesignIndex] = None  # 设计文件索引与解析缓存（.codingplan/figma-cache.json）
+
+    def timeout_for(self, step: int) -> Optional[int]:
+        """步骤的 Agent 调用超时，未配置时返回 None（使用 CODINGPLAN_STEP_TIMEOUT）"""
+        return self.timeouts.for_step(step) if self.timeouts is not None else None
+
+    def span(self, name: str, cat: str, **args):
+        """追踪区间（未开启 --trace 时为空上下文）"""
+        return trace_mod.span(self.tracer, name, cat, **args)
+
+    def agent_options(self, step: int) -> dict:
+        """步骤内 Agent 调用的超时与卡死检测参数（传给 run_agent 等）"""
+        options: dict = {"timeout": self.timeout_for(step)}
+        if self.watchdog is not None:
+            options["stall_timeout"] = self.watchdog.stall_timeout
+            options["stall_retries"] = self.watchdog.retries
+        if self.metrics is not None:
+            options["output_format"] = "stream-json"
+        return options
+
+
+# 各文档步骤的产出文件后缀（用于无检查点时根据 outputs/ 推断续传步骤）
+STEP_OUTPUT_SUFFIXES = {
+    1: "-normalized.md",
+    2: "-requirements.md",
+    3: "-outline-design.md",
+    4: "-detail-design.md",
+}
 
-    def save(self):
-        self.state_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.state_file, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
 
-    def get_output_path(self, base: str, suffix: str) -> Path:
-        return self.state_file.parent / "outputs" / f"{base}{suffix}"
+def _infer_steps_done(req_file: Path, dirs: dict) -> int:
+    """
+    根据 outputs/ 中已存在的产出推断已完成的步骤号。
+
+    仅能推断到 Step 4（之后的步骤产出为代码，无法可靠判断），用于旧版无检查点的状态文件
+    """
+    done = 0
+    for step in sorted(STEP_OUTPUT_SUFFIXES):
+        if not (dirs["outputs"] / f"{req_file.stem}{STEP_OUTPUT_SUFFIXES[step]}").exists():
+            break
+        done = step
+    return done
+
+
+def _resume_step(state: WorkflowState, req_file: Path, dirs: dict) -> Optional[int]:
+    """续传时需求文件应开始的步骤（None 表示从 Step 1 开始）"""
+    done = state.get_steps_done(req_file)
+    current_file = state.data.get("current_file")
+    if not done and current_file and file_key(Path(current_file)) == file_key(req_file):
+        done = _infer_steps_done(req_file, dirs)
+    if done <= 0:
+        return None
+    return min(done + 1, len(STEP_NAMES))
 
 
-def collect_requirement_files(req_dir: Path) -> list[Path]:
-    """收集需求目录下的所有需求文件（按名称排序）"""
-    files = []
-    for ext in REQUIREMENT_EXTENSIONS:
-        files.extend(req_dir.glob(f"*{ext}"))
-    return sorted(files, key=lambda p: p.name)
+def report_duplicate_stems(duplicates: dict[str, list[str]]) -> bool:
+    """输出同名需求（见 discovery.duplicate_stems）的错误说明；存在同名需求时返回 True，调用方应拒绝运行"""
+    for stem, rels in duplicates.items():
+        print(f"错误: 需求 {', '.join(rels)} 同名，产出文档 outputs/{stem}-*.md、worktree 与分支会互相覆盖")
+    if duplicates:
+        print("  请重命名其中的需求，或用 --exclude 排除多余的文件后重试")
+    return bool(duplicates)
+
+
+def collect_requirement_files(
+    req_dir: Path,
+    include: Optional[list[str]] = None,
+    exclude: Optional[list[str]] = None,
+    skip_dirs: Iterable[Optional[Path]] = (),
+    recursive: bool = False,
+) -> list[Path]:
+    """收集需求目录下的需求文件（按相对路径排序，模式、recursive 与 skip_dirs 见 discovery.RequirementFilter）"""
+    rules = discovery.RequirementFilter(include, exclude, recursive=recursive, skip_dirs=skip_dirs)
+    return [f.path for f in discovery.order_files(discovery.discover(req_dir, rules))]
 
 
 def process_single_file(
@@ -70,10 +161,19 @@ def process_single_file(
     scope: Optional[str] = None,
     hint: Optional[str] = None,
     ui_dir: Optional[Path] = None,
+    label: Optional[str] = None,
+    on_step_done: Optional[Callable[[int], None]] = None,
+    ctx: Optional[RunContext] = None,
+    ingestion: Optional[ingest_mod.Ingestion] = None,
 ) -> tuple[bool, Optional[int], Optional[str]]:
     """
     处理单个需求文件的完整流程
 
+    label 非空时（并发模式），进度输出以 [label] 为前缀；
+    每个步骤成功后调用 on_step_done(步骤号)，用于持久化检查点；
+    ctx 提供运行级共享组件（如文档缓存）；
+    ingestion 为调用方已完成的需求文件摄取结果（为空时在此读取）
+
     Returns:
         (成功, 失败步骤号, 失败步骤名)，成功时后两者为 None
     """
@@ -85,25 +185,106 @@ def process_single_file(
     outline_path = dirs["outputs"] / f"{base_name}-outline-design.md"
     detail_path = dirs["outputs"] / f"{base_name}-detail-design.md"
     test_design_path = dirs["outputs"] / f"{base_name}-test-design.md"
+    # 文档类步骤顺带写入的不确定项（随缓存一并恢复）
+    doc_extras = (dirs["uncertain"] / f"{base_name}-uncertain.md",)
 
     start_step = resume_from_step or 1
+    if start_step > 1:
+        _progress(f"  Step 1-{start_step - 1} 已完成，从 Step {start_step} 继续", label)
+
+    ctx = ctx or RunContext()
 
-    # 提取 Figma 设计信息（需求文件、同目录 .figma.md、UI 设计目录）
-    req_dir = req_file.parent
-    figma_info = figma_mod.extract_from_req_dir(req_dir, req_file, ui_dir=ui_dir)
+    def step_done(step: int) -> None:
+        if ctx.graph is not None:
+            ctx.graph.record_step(
+                req_file, step,
+                graph_mod.artifact_paths(req_file, dirs, ui_dir),
+                graph_mod.params_fingerprint(scope, hint),
+            )
+        if on_step_done:
+            on_step_done(step)
+
+    # 各步骤的 Agent 指标（--stream-json）与调用汇总（运行历史）
+    step_stats: dict[int, StreamStats] = {}
+    step_calls: dict[int, StepCalls] = {}
+
+    def agent_opts(step: int) -> dict:
+        options = ctx.agent_options(step)
+        if ctx.metrics is not None:
+            options["stats"] = step_stats.setdefault(step, StreamStats())
+        options["on_result"] = step_calls.setdefault(step, StepCalls()).add
+        return options
+
+    def end_step(step: int, success: bool, step_start: datetime) -> None:
+        duration_sec = (datetime.now() - step_start).total_seconds()
+        calls = step_calls.pop(step, None)
+        log_step_end(logger, file_name, step, STEP_NAMES[step], success, duration_sec, calls.attempts if calls else 0)
+        if ctx.metrics is not None and step in step_stats:
+            ctx.metrics.record(file_name, step, STEP_NAMES[step], success, duration_sec, step_stats.pop(step))
+        if ctx.history is not None:
+            ctx.history.record_step(file_name, step, STEP_NAMES[step], step_start, success, calls)
+        if ctx.tracer is not None:
+            ctx.tracer.record(
+                f"Step {step} {STEP_NAMES[step]}", "step", step_start.timestamp(),
+                file=file_name, step=step, success=success, agent_calls=calls.attempts if calls else None,
+            )
 
-    # Step 1: 文档规范化
-    if start_step <= 1:
+    def run_doc_step(step: int, prompt: str, output_path: Path, inputs: list[Path]):
+        """执行文档类步骤：缓存命中时恢复产出并跳过 Agent 调用"""
+        if ctx.cache is None:
+            return run_agent(prompt, cwd=project_root, prefix=label, **agent_opts(step))
+        key = ctx.cache.key(step, prompt, [req_file, *inputs], scope=scope, hint=hint)
+        if ctx.cache.restore(key, output_path, doc_extras):
+            _progress(f"  Step {step}/9: 缓存命中，已恢复 {output_path.name}", label)
+            logger.info(f"[{file_name}] Step {step}: 缓存命中 {key[:12]}")
+            return SimpleNamespace(returncode=0)
+        result = run_agent(prompt, cwd=project_root, prefix=label, **agent_opts(step))
+        if result.returncode == 0:
+            ctx.cache.store(key, output_path, doc_extras)
+        return result
+
+    # 需求文件只流式读取一次：摘要、Step 1 预览与 Figma 信息一并得到
+    if ingestion is None:
+        with ctx.span("读取需求", "ingest", file=file_name):
+            ingestion = ingest_mod.ingest_file(req_file)
+
+    # 提取 Figma 设计信息（需求文件、同目录 .figma.md、UI 设计目录，见 DesignIndex.lookup）
+    designs = ctx.designs or figma_mod.DesignIndex()
+    req_figma = ingestion.figma
+    with ctx.span("Figma 提取", "figma", file=file_name):
+        # 续传跳过 Step 2 时，补全文档中新增的 Figma 信息同样需要合并
+        figma_info = designs.lookup(req_file, ui_dir, req_info=req_figma, documents=[req_path] if start_step > 2 else ())
+
+    # Step 1: 文档规范化（本地转换成功时不调用 Agent）
+    conversion: Optional[convert_mod.Conversion] = None
+    if start_step <= 1 and ctx.local_convert:
+        try:
+            with ctx.span("本地转换", "convert", file=file_name):
+                conversion = convert_mod.convert_to_markdown(req_file)
+        except convert_mod.ConversionError as e:
+            _progress(f"  Step 1/9: 本地转换失败（{e}），由 Agent 规范化", label)
+            logger.info(f"[{file_name}] Step 1: 本地转换失败: {e}")
+    if conversion is not None:
+        step_start = datetime.now()
+        log_step_start(logger, file_name, 1, STEP_NAMES[1])
+        normalized_path.write_text(conversion.markdown, encoding="utf-8")
+        _progress(f"  Step 1/9: {STEP_NAMES[1]}（本地转换 {conversion.source_format}，已写入 {normalized_path.name}）", label)
+        if conversion.source_format in ("docx", "pdf"):
+            # 二进制格式无法直接提取 Figma 信息，以转换结果作为需求文件内容
+            req_figma = figma_mod.extract_figma_info(conversion.markdown)
+            figma_info = designs.lookup(req_file, ui_dir, req_info=req_figma)
+        end_step(1, True, step_start)
+        step_done(1)
+    elif start_step <= 1:
         step_start = datetime.now()
         log_step_start(logger, file_name, 1, STEP_NAMES[1])
-        print(f"  Step 1/9: {STEP_NAMES[1]}...")
-        content = req_file.read_text(encoding="utf-8", errors="replace")
-        content = content.replace("\x00", "")
-        prompt = prompts.step1_normalize(str(req_file), content[:1000], hint=hint)
-        result = run_agent(prompt, cwd=project_root)
-        log_step_end(logger, file_name, 1, STEP_NAMES[1], result.returncode == 0, (datetime.now() - step_start).total_seconds())
+        _progress(f"  Step 1/9: {STEP_NAMES[1]}...", label)
+        prompt = prompts.step1_normalize(str(req_file), ingestion.preview, hint=hint)
+        result = run_doc_step(1, prompt, normalized_path, [])
+        end_step(1, result.returncode == 0, step_start)
         if result.returncode != 0:
             return False, 1, STEP_NAMES[1]
+        step_done(1)
         if not normalized_path.exists():
             # Agent 可能用了不同命名，尝试查找
             for f in dirs["outputs"].glob(f"{base_name}*.md"):
@@ -114,117 +295,216 @@ def process_single_file(
     if start_step <= 2:
         step_start = datetime.now()
         log_step_start(logger, file_name, 2, STEP_NAMES[2])
-        print(f"  Step 2/9: {STEP_NAMES[2]}...")
+        _progress(f"  Step 2/9: {STEP_NAMES[2]}...", label)
         req_input = normalized_path if normalized_path.exists() else req_file
         prompt = prompts.step2_complete(str(req_file), str(req_input), hint=hint)
-        result = run_agent(prompt, cwd=project_root)
-        log_step_end(logger, file_name, 2, STEP_NAMES[2], result.returncode == 0, (datetime.now() - step_start).total_seconds())
+        result = run_doc_step(2, prompt, req_path, [req_input])
+        end_step(2, result.returncode == 0, step_start)
         if result.returncode != 0:
             return False, 2, STEP_NAMES[2]
-        # 补全后可能新增 Figma 信息，重新提取
+        # 补全后可能新增 Figma 信息，与设计文件一并重新合并
         if req_path.exists():
-            merged = figma_mod.extract_from_file(req_path)
-            for link in merged.links:
-                if link not in figma_info.links:
-                    figma_info.links.append(link)
-            if merged.interaction_desc:
-                figma_info.interaction_desc = (figma_info.interaction_desc + "\n\n" + merged.interaction_desc).strip()
+            with ctx.span("Figma 提取（补全文档）", "figma", file=file_name):
+                figma_info = designs.lookup(req_file, ui_dir, req_info=req_figma, documents=[req_path])
+        step_done(2)
 
     # Step 3: 概要设计
     if start_step <= 3:
         step_start = datetime.now()
         log_step_start(logger, file_name, 3, STEP_NAMES[3])
-        print(f"  Step 3/9: {STEP_NAMES[3]}...")
+        _progress(f"  Step 3/9: {STEP_NAMES[3]}...", label)
         req_input = req_path if req_path.exists() else normalized_path
         prompt = prompts.step3_outline(str(req_input), base_name, scope=scope, hint=hint, figma=figma_info)
-        result = run_agent(prompt, cwd=project_root)
-        log_step_end(logger, file_name, 3, STEP_NAMES[3], result.returncode == 0, (datetime.now() - step_start).total_seconds())
+        result = run_doc_step(3, prompt, outline_path, [req_input])
+        end_step(3, result.returncode == 0, step_start)
         if result.returncode != 0:
             return False, 3, STEP_NAMES[3]
+        step_done(3)
 
     # Step 4: 详细设计
     if start_step <= 4:
         step_start = datetime.now()
         log_step_start(logger, file_name, 4, STEP_NAMES[4])
-        print(f"  Step 4/9: {STEP_NAMES[4]}...")
+        _progress(f"  Step 4/9: {STEP_NAMES[4]}...", label)
         ol_input = outline_path if outline_path.exists() else dirs["outputs"] / f"{base_name}-outline-design.md"
         prompt = prompts.step4_detail(str(ol_input), str(req_path), base_name, scope=scope, hint=hint, figma=figma_info)
-        result = run_agent(prompt, cwd=project_root)
-        log_step_end(logger, file_name, 4, STEP_NAMES[4], result.returncode == 0, (datetime.now() - step_start).total_seconds())
+        result = run_doc_step(4, prompt, detail_path, [ol_input, req_path])
+        end_step(4, result.returncode == 0, step_start)
         if result.returncode != 0:
             return False, 4, STEP_NAMES[4]
+        step_done(4)
 
     # Step 5: 代码实现（Plan 模式）
     if start_step <= 5:
         step_start = datetime.now()
         log_step_start(logger, file_name, 5, STEP_NAMES[5])
-        print(f"  Step 5/9: {STEP_NAMES[5]}...")
+        _progress(f"  Step 5/9: {STEP_NAMES[5]}...", label)
         detail_input = detail_path if detail_path.exists() else dirs["outputs"] / f"{base_name}-detail-design.md"
         prompt = prompts.step5_implement(str(detail_input), str(req_path), scope=scope, hint=hint, figma=figma_info)
-        result = run_plan(prompt, cwd=project_root)
-        log_step_end(logger, file_name, 5, STEP_NAMES[5], result.returncode == 0, (datetime.now() - step_start).total_seconds())
+        result = run_plan(prompt, cwd=project_root, prefix=label, **agent_opts(5))
+        end_step(5, result.returncode == 0, step_start)
         if result.returncode != 0:
             return False, 5, STEP_NAMES[5]
+        step_done(5)
 
     # Step 6: 测试设计
     if start_step <= 6:
         step_start = datetime.now()
         log_step_start(logger, file_name, 6, STEP_NAMES[6])
-        print(f"  Step 6/9: {STEP_NAMES[6]}...")
+        _progress(f"  Step 6/9: {STEP_NAMES[6]}...", label)
         prompt = prompts.step6_test_design(str(req_path), str(detail_path), base_name, scope=scope, hint=hint, figma=figma_info)
-        result = run_agent(prompt, cwd=project_root)
-        log_step_end(logger, file_name, 6, STEP_NAMES[6], result.returncode == 0, (datetime.now() - step_start).total_seconds())
+        # 测试设计依据已实现的代码，代码不在缓存键中，不使用文档缓存
+        result = run_agent(prompt, cwd=project_root, prefix=label, **agent_opts(6))
+        end_step(6, result.returncode == 0, step_start)
         if result.returncode != 0:
             return False, 6, STEP_NAMES[6]
+        step_done(6)
 
     # Step 7: 测试实现
     if start_step <= 7:
         step_start = datetime.now()
         log_step_start(logger, file_name, 7, STEP_NAMES[7])
-        print(f"  Step 7/9: {STEP_NAMES[7]}...")
+        _progress(f"  Step 7/9: {STEP_NAMES[7]}...", label)
         td_input = test_design_path if test_design_path.exists() else dirs["outputs"] / f"{base_name}-test-design.md"
         prompt = prompts.step7_test_impl(str(td_input), scope=scope, hint=hint)
-        result = run_plan(prompt, cwd=project_root)
-        log_step_end(logger, file_name, 7, STEP_NAMES[7], result.returncode == 0, (datetime.now() - step_start).total_seconds())
+        result = run_plan(prompt, cwd=project_root, prefix=label, **agent_opts(7))
+        end_step(7, result.returncode == 0, step_start)
         if result.returncode != 0:
             return False, 7, STEP_NAMES[7]
+        step_done(7)
 
     # Step 8: 编译、运行、测试（循环直至成功）
     if start_step <= 8:
         step_start = datetime.now()
         log_step_start(logger, file_name, 8, STEP_NAMES[8])
-        print(f"  Step 8/9: {STEP_NAMES[8]}...")
-        max_retries = 5
-        for attempt in range(max_retries):
-            prompt = prompts.step8_build_test(scope=scope, hint=hint)
-            result = run_agent(prompt, cwd=project_root)
-            if result.returncode == 0:
-                log_step_end(logger, file_name, 8, STEP_NAMES[8], True, (datetime.now() - step_start).total_seconds())
-                break
-            # 失败时用 Ask 分析
-            ask_prompt = f"""
-编译/运行/测试失败。请分析失败原因并给出修复建议。
-当前是第 {attempt + 1} 次重试。
-"""
-            run_ask(ask_prompt, cwd=project_root)
+        _progress(f"  Step 8/9: {STEP_NAMES[8]}...", label)
+        if ctx.build is not None:
+            passed = _build_test_native(
+                ctx.build, req_file, project_root, scope=scope, hint=hint, label=label, options=agent_opts(8),
+                tracer=ctx.tracer,
+            )
         else:
-            log_step_end(logger, file_name, 8, STEP_NAMES[8], False, (datetime.now() - step_start).total_seconds())
+            passed = _build_test_with_agent(
+                req_file, project_root, scope=scope, hint=hint, label=label, options=agent_opts(8), tracer=ctx.tracer,
+            )
+        end_step(8, passed, step_start)
+        if not passed:
             return False, 8, STEP_NAMES[8]
+        step_done(8)
 
     # Step 9: 完成度校验
     if start_step <= 9:
         step_start = datetime.now()
         log_step_start(logger, file_name, 9, STEP_NAMES[9])
-        print(f"  Step 9/9: {STEP_NAMES[9]}...")
+        _progress(f"  Step 9/9: {STEP_NAMES[9]}...", label)
         prompt = prompts.step9_validate(str(req_path), base_name, scope=scope, hint=hint)
-        result = run_agent(prompt, cwd=project_root)
-        log_step_end(logger, file_name, 9, STEP_NAMES[9], result.returncode == 0, (datetime.now() - step_start).total_seconds())
+        result = run_agent(prompt, cwd=project_root, prefix=label, **agent_opts(9))
+        end_step(9, result.returncode == 0, step_start)
         if result.returncode != 0:
             return False, 9, STEP_NAMES[9]
+        step_done(9)
 
     return True, None, None
 
 
+def _build_test_with_agent(
+    req_file: Path,
+    project_root: Path,
+    scope: Optional[str] = None,
+    hint: Optional[str] = None,
+    label: Optional[str] = None,
+    options: Optional[dict] = None,
+    tracer: Optional[trace_mod.Tracer] = None,
+) -> bool:
+    """
+    Step 8（未配置本地命令）：由 Agent 编译运行测试，失败时 Ask 分析后重试
+
+    失败输出与 Ask 分析结果附在下一轮的 prompt 中。Agent 的回复是自由文本、每次都不同，
+    因此失败特征只取其按约定标记给出的构建/测试输出（buildtest.extract_reported_failure）：
+    连续两次特征相同时提前停止，未给出时不提前停止
+    """
+    max_retries = 5
+    previous_failure: Optional[str] = None
+    analysis: Optional[str] = None
+    last_signature: Optional[str] = None
+    for attempt in range(1, max_retries + 1):
+        prompt = prompts.step8_build_test(scope=scope, hint=hint, previous_failure=previous_failure, analysis=analysis)
+        with trace_mod.span(tracer, f"Step 8 尝试 {attempt}", "step8", file=req_file.name, attempt=attempt) as span_args:
+            result = run_agent(prompt, cwd=project_root, prefix=label, capture=True, **(options or {}))
+            span_args["exit_code"] = result.returncode
+        if result.returncode == 0:
+            return True
+        output = result.stdout or ""
+        reported = buildtest.extract_reported_failure(output)
+        signature = buildtest.failure_signature(reported) if reported else None
+        if signature is not None and signature == last_signature:
+            _progress(f"    连续两次失败特征相同，上一轮修复未生效，提前停止（第 {attempt} 次）", label)
+            return False
+        last_signature = signature
+        if attempt == max_retries:
+            break
+        # 失败时用 Ask 分析，分析结果交给下一轮
+        previous_failure = buildtest.tail_text(reported or output)
+        ask_prompt = prompts.step8_analyze_failure(attempt, previous_failure, scope=scope)
+        with trace_mod.span(tracer, f"Ask 分析 {attempt}", "ask", file=req_file.name, attempt=attempt):
+            ask_result = run_ask(ask_prompt, cwd=project_root, prefix=label, capture=True, **(options or {}))
+        analysis = buildtest.tail_text(ask_result.stdout or "") if ask_result.returncode == 0 else None
+    return False
+
+
+def _build_test_native(
+    config: buildtest.BuildConfig,
+    req_file: Path,
+    project_root: Path,
+    scope: Optional[str] = None,
+    hint: Optional[str] = None,
+    label: Optional[str] = None,
+    options: Optional[dict] = None,
+    tracer: Optional[trace_mod.Tracer] = None,
+) -> bool:
+    """
+    Step 8（已配置本地命令）：直接执行编译/运行/测试命令，
+    仅在失败时将捕获的失败日志交给 Agent 修复，然后重新执行
+    """
+    logger = setup_logger(project_root)
+    log_dir = (get_log_dir() or project_root / ".codingplan" / "logs") / "build"
+    last_signature: Optional[str] = None
+    for attempt in range(1, config.max_attempts + 1):
+        log_path = log_dir / f"{req_file.stem}-attempt{attempt}.log"
+        with trace_mod.span(tracer, f"Step 8 本地执行 {attempt}", "step8", file=req_file.name, attempt=attempt) as span_args:
+            result = buildtest.run_build(config, project_root, log_path)
+            span_args.update(success=result.success, stage=result.stage, exit_code=result.exit_code)
+        if result.success:
+            _progress(f"    本地编译运行测试通过（第 {attempt} 次，耗时 {result.duration_sec:.1f}s）", label)
+            logger.info(f"[{req_file.name}] Step 8: 本地编译运行测试通过 | 第 {attempt} 次 | 耗时 {result.duration_sec:.1f}s")
+            return True
+        stage = buildtest.stage_label(result.stage)
+        _progress(f"    本地{stage}失败: {result.command}（{result.exit_desc}），日志: {log_path}", label)
+        logger.info(f"[{req_file.name}] Step 8: 本地{stage}失败 | 第 {attempt} 次 | {result.exit_desc} | 日志 {log_path}")
+        if result.signature == last_signature:
+            _progress("    连续两次失败特征相同，上一轮修复未生效，提前停止", label)
+            logger.info(f"[{req_file.name}] Step 8: 失败特征重复，提前停止 | 第 {attempt} 次")
+            break
+        last_signature = result.signature
+        if attempt == config.max_attempts:
+            break
+        prompt = prompts.step8_fix_build_failure(
+            stage=stage,
+            command=result.command or "",
+            exit_desc=result.exit_desc,
+            failure_lines=result.failure_lines,
+            output_tail=result.output_tail,
+            log_path=str(log_path),
+            attempt=attempt,
+            max_attempts=config.max_attempts,
+            scope=scope,
+            hint=hint,
+        )
+        with trace_mod.span(tracer, f"Step 8 修复 {attempt}", "step8", file=req_file.name, attempt=attempt):
+            run_agent(prompt, cwd=project_root, prefix=label, **(options or {}))
+    return False
+
+
 def _format_duration(start_time: datetime) -> str:
     """返回耗时字符串"""
     end_time = datetime.now()
@@ -246,16 +526,329 @@ def _print_duration(start_time: datetime) -> str:
     return duration_str
 
 
-def process_project_check(project_root: Path, dirs: dict, scope: Optional[str] = None, hint: Optional[str] = None) -> bool:
+def _report_run_stats(ctx: RunContext, logger) -> None:
+    """输出并记录运行统计（缓存命中等）"""
+    if ctx.cache is not None and (ctx.cache.hits or ctx.cache.misses):
+        print(ctx.cache.summary())
+        logger.info(ctx.cache.summary())
+    if ctx.metrics is not None and ctx.metrics.total.agent_calls:
+        print(ctx.metrics.summary())
+        logger.info(ctx.metrics.summary())
+
+
+def _log_run_end(
+    ctx: RunContext,
+    logger,
+    success: bool,
+    duration_sec: float,
+    files_done: int,
+    error_msg: Optional[str] = None,
+) -> None:
+    """记录工作流结束（运行日志与运行历史）"""
+    log_workflow_end(logger, success, duration_sec, files_done, error_msg)
+    if ctx.designs is not None:
+        ctx.designs.save()
+    if ctx.history is not None:
+        ctx.history.end_run(success, duration_sec, files_done, error_msg)
+        ctx.history.close()
+    if ctx.tracer is not None:
+        ctx.tracer.record("workflow", "workflow", ctx.tracer.start, success=success, files_done=files_done, error=error_msg)
+        ctx.tracer.save()
+        print(f"追踪文件: {ctx.tracer.path}（可在 https://ui.perfetto.dev 或 chrome://tracing 打开）")
+
+
+def process_project_check(
+    project_root: Path,
+    dirs: dict,
+    scope: Optional[str] = None,
+    hint: Optional[str] = None,
+    ctx: Optional[RunContext] = None,
+) -> bool:
     """Step 10 & 11: 项目整体检查与补充"""
-    prompt = prompts.step10_project_check(scope=scope, hint=hint)
-    result = run_agent(prompt, cwd=project_root)
-    if result.returncode != 0:
+    ctx = ctx or RunContext()
+
+    def run_check(step: int, name: str, prompt: str) -> bool:
+        options = ctx.agent_options(step)
+        stats = options["stats"] = StreamStats() if ctx.metrics is not None else None
+        calls = StepCalls()
+        options["on_result"] = calls.add
+        step_start = datetime.now()
+        with ctx.span(f"Step {step} {name}", "project", step=step) as span_args:
+            result = run_agent(prompt, cwd=project_root, **options)
+            success = span_args["success"] = result.returncode == 0
+        if stats is not None:
+            duration_sec = (datetime.now() - step_start).total_seconds()
+            ctx.metrics.record("<project>", step, name, success, duration_sec, stats)
+        if ctx.history is not None:
+            ctx.history.record_step("<project>", step, name, step_start, success, calls)
+        return success
+
+    if not run_check(10, "项目整体检查", prompts.step10_project_check(scope=scope, hint=hint)):
         return False
+    return run_check(11, "项目级补充", prompts.step11_project_fix(scope=scope, hint=hint))
+
+
+# 处理单个需求文件的回调：(序号, 需求文件, 进度前缀) -> (成功, 失败步骤号, 失败步骤名)
+FileProcessor = Callable[[int, Path, Optional[str]], tuple[bool, Optional[int], Optional[str]]]
+
+
+def _process_files_sequential(
+    files: list[Path],
+    files_done: list[str],
+    process: FileProcessor,
+) -> list[tuple[Path, Optional[int], Optional[str]]]:
+    """逐个处理需求文件，遇到失败立即停止。返回失败列表"""
+    for i, req_file in enumerate(files, 1):
+        print(f"\n[{i}/{len(files)}] 处理: {req_file.name}")
+        success, failed_step, failed_step_name = process(i - 1, req_file, None)
+        if not success:
+            return [(req_file, failed_step, failed_step_name)]
+        files_done.append(req_file.name)
+    return []
+
+
+def _process_files_parallel(
+    files: list[Path],
+    files_done: list[str],
+    jobs: int,
+    process: FileProcessor,
+) -> list[tuple[Path, Optional[int], Optional[str]]]:
+    """
+    以最多 jobs 个 worker 并发处理需求文件。
+
+    单个文件失败不影响其他文件，全部结束后返回失败列表（按原文件顺序）
+    """
+    failures: dict[Path, tuple[Path, Optional[int], Optional[str]]] = {}
+    total = len(files)
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="codingplan-job") as pool:
+        futures = {
+            pool.submit(process, index, req_file, req_file.stem): req_file
+            for index, req_file in enumerate(files)
+        }
+        finished = 0
+        for future in as_completed(futures):
+            req_file = futures[future]
+            finished += 1
+            try:
+                success, failed_step, failed_step_name = future.result()
+            except Exception as e:
+                success, failed_step, failed_step_name = False, None, f"异常: {e}"
+            if success:
+                files_done.append(req_file.name)
+                _progress(f"[{finished}/{total}] 完成: {req_file.name}")
+            else:
+                failures[req_file] = (req_file, failed_step, failed_step_name)
+                _progress(f"[{finished}/{total}] 失败: {req_file.name}（{_format_failed_step(failed_step, failed_step_name)}）")
+    return [failures[f] for f in files if f in failures]
+
+
+def _process_files_watch(
+    files: list[Path],
+    req_dir: Path,
+    files_done: list[str],
+    jobs: int,
+    process: FileProcessor,
+    prepare: Callable[[Path], bool],
+    project_check: Callable[[], bool],
+    debounce: float,
+    rules: Optional[discovery.RequirementFilter] = None,
+) -> tuple[list[tuple[Path, Optional[int], Optional[str]]], bool]:
+    """
+    --watch：先处理 files，之后持续监听 req_dir（按 rules 筛选，recursive 时包含子目录），
+    新增或修改的需求文件去抖后送入线程池（最多 jobs 个并发）。
 
-    prompt = prompts.step11_project_fix(scope=scope, hint=hint)
-    result = run_agent(prompt, cwd=project_root)
-    return result.returncode == 0
+    队列排空（无进行中与待处理的文件）且期间有需求完成时，合并执行一次项目级检查；
+    存在失败的需求时暂不检查，修改该需求后重新处理。Ctrl+C 停止监听并等待进行中的需求结束。
+    prepare(req_file) 返回 False 时跳过该文件（如增量模式下已是最新）
+
+    Returns: (仍失败的需求列表（按文件名）, 最近一次项目级检查是否成功；
+              停止时仍有完成的需求未经检查为 None，从未需要检查为 True)
+    """
+    events: queue.Queue = queue.Queue()
+    watcher = watch_mod.RequirementWatcher(req_dir, lambda p: events.put(("file", p)), debounce, rules)
+    watcher.start()
+    _progress(f"监听需求目录: {req_dir}（{watcher.kind}，去抖 {debounce:g} 秒，Ctrl+C 停止）")
+
+    pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="codingplan-job")
+    running: dict[Path, Future] = {}
+    rerun: set[Path] = set()  # 处理期间又被修改，结束后重新处理
+    digests: dict[Path, str] = {}  # 最近一次送入处理时的内容摘要
+    failures: dict[Path, tuple[Path, Optional[int], Optional[str]]] = {}
+    next_index = 0
+    dirty = False  # 上次项目级检查后是否有需求完成
+    check_ok = True
+
+    def submit(req_file: Path) -> None:
+        nonlocal next_index
+        digests[req_file] = (file_digest(req_file) or "")
+        future = pool.submit(process, next_index, req_file, req_file.stem if jobs > 1 else None)
+        next_index += 1
+        running[req_file] = future
+        future.add_done_callback(lambda _, p=req_file: events.put(("done", p)))
+
+    def finish(req_file: Path, future: Future) -> None:
+        nonlocal dirty
+        try:
+            success, failed_step, failed_step_name = future.result()
+        except Exception as e:
+            success, failed_step, failed_step_name = False, None, f"异常: {e}"
+        if success:
+            failures.pop(req_file, None)
+            if req_file.name not in files_done:
+                files_done.append(req_file.name)
+            dirty = True
+            _progress(f"完成: {req_file.name}")
+        else:
+            failures[req_file] = (req_file, failed_step, failed_step_name)
+            _progress(f"失败: {req_file.name}（{_format_failed_step(failed_step, failed_step_name)}），修改后将重新处理")
+
+    try:
+        for req_file in files:
+            _progress(f"\n处理: {req_file.name}")
+            submit(req_file)
+        while True:
+            if not running and events.empty() and dirty:
+                dirty = False
+                if failures:
+                    _progress(f"\n{len(failures)} 个需求处理失败，暂不执行项目级检查")
+                else:
+                    check_ok = project_check()
+                _progress(f"\n继续监听需求目录: {req_dir}")
+            try:
+                kind, req_file = events.get(timeout=1)
+            except queue.Empty:
+                continue
+            if kind == "done":
+                finish(req_file, running.pop(req_file))
+                if req_file in rerun:
+                    rerun.discard(req_file)
+                    events.put(("file", req_file))
+                continue
+            if req_file in running:
+                rerun.add(req_file)
+                continue
+            if req_file not in failures and digests.get(req_file) == (file_digest(req_file) or ""):
+                continue
+            if not prepare(req_file):
+                continue
+            _progress(f"\n检测到需求变化，开始处理: {req_file.name}")
+            submit(req_file)
+    except KeyboardInterrupt:
+        _progress(f"\n停止监听，等待进行中的 {len(running)} 个需求结束...")
+    finally:
+        watcher.stop()
+        pool.shutdown(wait=True, cancel_futures=True)
+    for req_file, future in running.items():
+        if not future.cancelled():
+            finish(req_file, future)
+    return [failures[f] for f in sorted(failures, key=lambda p: p.name)], None if dirty else check_ok
+
+
+def _process_in_worktree(
+    index: int,
+    req_file: Path,
+    project_root: Path,
+    merge_queue: worktree_mod.MergeQueue,
+    reset: bool = False,
+    resume_from_step: Optional[int] = None,
+    scope: Optional[str] = None,
+    hint: Optional[str] = None,
+    ui_dir: Optional[Path] = None,
+    label: Optional[str] = None,
+    on_step_done: Optional[Callable[[int], None]] = None,
+    ctx: Optional[RunContext] = None,
+    ingestion: Optional[ingest_mod.Ingestion] = None,
+    on_merged: Optional[Callable[[worktree_mod.MergeResult], None]] = None,
+) -> tuple[bool, Optional[int], Optional[str]]:
+    """
+    在独立 git worktree 中处理需求文件，成功后提交并加入有序合并队列。
+
+    前序需求尚未完成时合并会推迟，返回成功仅表示已提交；该需求实际合并（成功或冲突）后调用 on_merged。
+    失败（含异常）时向队列提交空结果，不阻塞后续需求；worktree 保留，续传时在其基础上继续
+    """
+    submitted = False
+    try:
+        try:
+            wt = worktree_mod.create_worktree(project_root, req_file.stem, reset=reset)
+        except RuntimeError as e:
+            return False, None, str(e)
+        _progress(f"  隔离工作区: {wt.path}（分支 {wt.branch}）", label)
+        success, failed_step, failed_step_name = process_single_file(
+            req_file, wt.path, get_output_dirs(wt.path),
+            resume_from_step=None if reset else resume_from_step,
+            scope=scope, hint=hint, ui_dir=ui_dir, label=label, on_step_done=on_step_done, ctx=ctx,
+            ingestion=ingestion,
+        )
+        if not success:
+            return success, failed_step, failed_step_name
+        ctx = ctx or RunContext()
+        with ctx.span("提交与合并", "merge", file=req_file.name):
+            if not worktree_mod.commit_worktree(wt, f"codingplan: {req_file.name}"):
+                return False, None, f"提交 worktree 改动失败（{wt.path}）"
+            submitted = True
+            for result in merge_queue.submit(index, wt, on_merged):
+                if result.worktree is wt and not result.success:
+                    return False, None, _format_conflict(result)
+        return True, None, None
+    finally:
+        if not submitted:
+            merge_queue.submit(index, None)
+
+
+def _format_conflict(result: worktree_mod.MergeResult) -> str:
+    """合并冲突说明"""
+    detail = f"冲突文件: {', '.join(result.conflicts)}" if result.conflicts else result.message
+    return f"合并冲突，分支 {result.worktree.branch} 已保留（{detail}）"
+
+
+def _report_merge(result: worktree_mod.MergeResult) -> None:
+    """输出合并结果"""
+    if result.success:
+        _progress(f"  已合并: {result.worktree.branch}")
+    else:
+        _progress(f"  合并冲突: {_format_conflict(result)}")
+
+
+def _format_failed_step(step: Optional[int], step_name: Optional[str]) -> str:
+    """失败步骤描述（合并冲突等非步骤失败时无步骤号）"""
+    if step is None:
+        return step_name or "未知原因"
+    return f"Step {step} - {step_name}"
+
+
+def build_run_context(
+    project_root: Path,
+    graph: Optional[graph_mod.ArtifactGraph] = None,
+    use_cache: bool = True,
+    stream_json: bool = False,
+    trace_path: Optional[Path] = None,
+    local_convert: bool = True,
+    history: Optional[RunHistory] = None,
+) -> RunContext:
+    """按项目配置创建运行上下文（需先调用 setup_logger，以确定日志目录）；history 默认为 .codingplan/history.db"""
+    return RunContext(
+        cache=StepCache(project_root / ".codingplan" / "cache") if use_cache else None,
+        graph=graph,
+        build=buildtest.load_build_config(project_root),
+        timeouts=load_step_timeouts(project_root, get_log_dir()),
+        watchdog=load_watchdog_config(project_root),
+        metrics=MetricsLog((get_log_dir() or project_root / ".codingplan" / "logs") / METRICS_FILE) if stream_json else None,
+        history=history or RunHistory(history_db_path(project_root)),
+        tracer=trace_mod.Tracer(trace_path) if trace_path else None,
+        local_convert=local_convert,
+        designs=figma_mod.DesignIndex(project_root / ".codingplan" / figma_mod.FIGMA_CACHE_NAME),
+    )
+
+
+def _print_run_config(ctx: RunContext, logger) -> None:
+    """输出 Step 8 本地命令、单步超时与卡死检测配置"""
+    if ctx.build is not None:
+        print(f"Step 8 本地执行: {'; '.join(cmd for _, cmd in ctx.build.commands)}")
+    if ctx.timeouts.per_step or ctx.timeouts.adaptive:
+        print(f"单步超时: {ctx.timeouts.describe()}")
+        logger.info(f"单步超时: {ctx.timeouts.describe()}")
+    if ctx.watchdog.stall_timeout:
+        print(f"卡死检测: {stall_mod.describe(ctx.watchdog)}")
 
 
 def _has_unfinished_state(state_file: Path, req_dir: Path) -> tuple[bool, str]:
@@ -263,16 +856,26 @@ def _has_unfinished_state(state_file: Path, req_dir: Path) -> tuple[bool, str]:
     检测是否存在未完成的状态（同需求目录）
     Returns: (是否续传, 原因说明)
     """
-    if not state_file.exists():
+    state = WorkflowState(state_file)
+    if not state_file.exists() and not state.journal_file.exists():
         return False, "无状态文件"
     try:
-        with open(state_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, OSError):
-        return False, "状态文件损坏"
+        state.load()
+    except OSError as e:
+        return False, f"状态文件无法读取（{e}）"
+    if state.recovered:
+        print(f"警告: {state.recovered}")
+    data = state.data
     if data.get("completed"):
         return False, "上次已全部完成"
     saved_req_dir = data.get("req_dir")
+    if not saved_req_dir and state.recovered:
+        # 快照丢失时由日志中记录的需求文件路径推断需求目录
+        parents = {str(Path(p).parent) for p in [data.get("current_file"), *data.get("files_done", [])] if p}
+        if len(parents) == 1:
+            saved_req_dir = parents.pop()
+            data["req_dir"] = saved_req_dir
+            state.save()
     if not saved_req_dir:
         return False, "状态中无 req_dir"
     # 使用 resolved 路径比较，避免 ./docs 与 docs、相对与绝对路径差异
@@ -299,15 +902,43 @@ def run_workflow(
     scope: Optional[str] = None,
     hint: Optional[str] = None,
     notify_emails: Optional[list[str]] = None,
+    jobs: int = 1,
+    isolate: bool = False,
+    use_cache: bool = True,
+    incremental: bool = False,
+    stream_json: bool = False,
+    trace_path: Optional[Path] = None,
+    watch: bool = False,
+    watch_debounce: float = watch_mod.DEFAULT_DEBOUNCE,
+    local_convert: bool = True,
+    include: Optional[list[str]] = None,
+    exclude: Optional[list[str]] = None,
+    order: str = discovery.DEFAULT_ORDER,
+    recursive: bool = False,
 ) -> int:
     """
     运行完整工作流
 
+    jobs > 1 时以有界线程池并发处理多个需求文件，失败在全部结束后汇总；
+    isolate 为 True 时每个需求在独立 git worktree 中实现，并按需求顺序合并回当前分支；
+    use_cache 为 True 时文档类步骤（Step 1-4）使用 .codingplan/cache/ 缓存；
+    incremental 为 True 时根据产物依赖图（.codingplan/graph.json）仅重跑输入有变化的步骤；
+    stream_json 为 True 时以 stream-json 运行 Agent 并将各步骤指标写入 .codingplan/logs/metrics.jsonl；
+    trace_path 非空时将运行各阶段区间写入该文件（Chrome Trace Event Format）；
+    watch 为 True 时处理完现有需求后持续监听 req_dir，新增或修改的需求文件静默 watch_debounce 秒后送入处理，Ctrl+C 结束；
+    local_convert 为 True 时 Step 1 先在本地将需求转换为 Markdown，成功则不调用 Agent；
+    include/exclude 为需求发现的包含/排除模式，order 为处理顺序（discovery.ORDERS），
+    recursive 为 True 时同时处理子目录中的需求（默认仅需求目录顶层）
+
     Returns:
         0 成功，1 失败
     """
     if not check_agent_installed():
-        print("错误: 未检测到 Cursor Agent。请先安装: curl https://cursor.com/install -fsS | bash")
+        print(f"错误: 未检测到 Cursor Agent（{shlex.join(get_agent_cmd())}）。请先安装: curl https://cursor.com/install -fsS | bash")
+        return 1
+
+    if isolate and not worktree_mod.is_git_repo(project_root):
+        print("错误: --isolate 需要在至少有一次提交的 git 仓库中运行")
         return 1
 
     start_time = datetime.now()
@@ -317,8 +948,8 @@ def run_workflow(
     state_file = project_root / ".codingplan" / "state.json"
     state = WorkflowState(state_file)
 
-    # 自动续传：未传 --fresh 且存在未完成状态时，自动从中断处继续
-    if not fresh:
+    # 自动续传：未传 --fresh 且存在未完成状态时，自动从中断处继续（增量模式自行判断起始步骤）
+    if not fresh and not incremental:
         can_resume, reason = _has_unfinished_state(state_file, req_dir)
         if can_resume:
             resume = True
@@ -326,8 +957,9 @@ def run_workflow(
         elif reason and state_file.exists():
             print(f"提示: 未续传（{reason}）")
 
-    if resume:
+    if resume or incremental:
         state.load()
+        state.data.pop("completed", None)
         # 恢复时沿用上次的 scope、hint（若本次未指定）
         if scope is None and state.data.get("scope"):
             scope = state.data["scope"]
@@ -340,23 +972,58 @@ def run_workflow(
     state.data["req_dir"] = str(req_dir.resolve())
     state.save()
 
-    files = collect_requirement_files(req_dir)
-    if not files:
+    # 发现需求文件，与上次的清单比较得出新增/修改/删除（大小与 mtime 未变的文件不读取）；--watch 沿用同一规则
+    rules = discovery.RequirementFilter(
+        include, exclude, recursive=recursive, skip_dirs=[*dirs.values(), project_root / ".codingplan", ui_dir],
+    )
+    found = discovery.discover(req_dir, rules)
+    manifest = discovery.Manifest(project_root / ".codingplan" / discovery.MANIFEST_NAME)
+    manifest.load()
+    changes = manifest.update(req_dir, found)
+    manifest.save()
+    if not found and not watch:
         print(f"未在 {req_dir} 中找到需求文件（支持: {', '.join(REQUIREMENT_EXTENSIONS)}）")
         return 1
+    print(f"需求清单: {changes.summary()}")
+    if changes.removed:
+        print(f"  已移除（文件删除或被排除）: {', '.join(changes.removed)}")
+    # --watch 中新出现的需求与已有需求同名时跳过（见 prepare_watched）
+    stem_owners = {f.path.stem: f.path for f in found}
 
     if single_file:
-        files = [f for f in files if f.name == single_file or f.stem == single_file]
-        if not files:
+        found = [f for f in found if single_file in (f.rel, f.path.name, f.path.stem)]
+        if not found:
             print(f"未找到文件: {single_file}")
             return 1
+    if report_duplicate_stems(discovery.duplicate_stems(f.rel for f in found)):
+        return 1
+    files = [f.path for f in discovery.order_files(found, order, changes)]
 
-    # 续传时跳过已完成文件
+    # 续传时跳过已完成且内容未变的文件（按绝对路径 + 内容摘要判断）
     if resume:
-        files_done_names = {Path(p).name for p in state.data.get("files_done", [])}
-        files = [f for f in files if f.name not in files_done_names]
+        total = len(files)
+        files = [f for f in files if not state.is_file_done(f)]
         if files:
-            print(f"续传: 跳过 {len(files_done_names)} 个已完成，剩余 {len(files)} 个待处理")
+            print(f"续传: 跳过 {total - len(files)} 个已完成，剩余 {len(files)} 个待处理")
+
+    graph = graph_mod.ArtifactGraph(project_root / ".codingplan" / "graph.json")
+    graph.load()
+
+    # 各文件的起始步骤（None 为 Step 1）：增量模式下为第一个需重跑的步骤，--watch 中检测到变化的文件从头处理
+    start_steps: dict[Path, Optional[int]] = {}
+    params = graph_mod.params_fingerprint(scope, hint)
+    if incremental:
+        for f in files:
+            step = graph.first_dirty_step(f, graph_mod.artifact_paths(f, dirs, ui_dir), params)
+            if step is not None:
+                start_steps[f] = step
+        print(f"增量模式: {len(start_steps)} 个需求文件需重跑，{len(files) - len(start_steps)} 个已是最新")
+        files = [f for f in files if f in start_steps]
+        for f in files:
+            print(f"  {f.name}: 从 Step {start_steps[f]} {STEP_NAMES[start_steps[f]]} 开始")
+        if not files and not watch:
+            print("全部需求均为最新，无需重跑")
+            return 0
 
     notify_emails = notify_emails or []
     files_done: list[str] = []
@@ -373,38 +1040,163 @@ def run_workflow(
     print(f"运行日志: {project_root / '.codingplan' / 'logs' / 'codingplan.log'}")
     logger = setup_logger(project_root)
     log_workflow_start(logger, str(req_dir), len(files))
-    for i, req_file in enumerate(files, 1):
-        print(f"\n[{i}/{len(files)}] 处理: {req_file.name}")
-        success, failed_step, failed_step_name = process_single_file(req_file, project_root, dirs, scope=scope, hint=hint, ui_dir=ui_dir)
-        if not success:
-            duration_str = _print_duration(start_time)
-            duration_sec = (datetime.now() - start_time).total_seconds()
-            log_workflow_end(logger, False, duration_sec, len(files_done), f"{req_file.name} 步骤 {failed_step} {failed_step_name or ''} 失败")
+    jobs = max(1, jobs)
+    ctx = build_run_context(
+        project_root, graph, use_cache=use_cache, stream_json=stream_json, trace_path=trace_path,
+        local_convert=local_convert,
+    )
+    ctx.history.start_run(project_root, req_dir, len(files), jobs)
+    _print_run_config(ctx, logger)
+
+    merge_queue: Optional[worktree_mod.MergeQueue] = None
+    if isolate:
+        merge_queue = worktree_mod.MergeQueue(project_root, on_merged=_report_merge)
+        print("隔离模式: 每个需求在独立 git worktree 中实现，完成后按顺序合并回当前分支")
+
+    def process(index: int, req_file: Path, label: Optional[str]) -> tuple[bool, Optional[int], Optional[str]]:
+        # 续传时从该文件第一个未完成的步骤开始，增量模式从第一个需重跑的步骤开始；每步完成后持久化检查点
+        if req_file in start_steps:
+            resume_from_step = start_steps[req_file]
+        else:
+            resume_from_step = _resume_step(state, req_file, dirs) if resume else None
+
+        def on_step_done(step: int) -> None:
+            state.mark_step_done(req_file, step)
+
+        # 完成记录使用开始处理时的内容指纹：处理期间需求被修改，续传时会重新处理
+        ingestion = ingest_mod.ingest_file(req_file)
+        file_start = datetime.now()
+        recorded = threading.Event()
+
+        def record(success: bool, failed_step: Optional[int] = None) -> None:
+            recorded.set()
+            ctx.history.record_file(req_file.name, file_start, success, failed_step)
+            if success:
+                state.add_file_done(req_file, ingestion.fingerprint())
+
+        with ctx.span(req_file.name, "file", index=index, resume_from_step=resume_from_step) as span_args:
+            try:
+                if merge_queue is not None:
+                    # 隔离模式下完成记录在该需求实际合并后写入（合并可能推迟到前序需求完成时）
+                    result = _process_in_worktree(
+                        index, req_file, project_root, merge_queue, reset=not (resume or incremental),
+                        resume_from_step=resume_from_step,
+                        scope=scope, hint=hint, ui_dir=ui_dir, label=label, on_step_done=on_step_done, ctx=ctx,
+                        ingestion=ingestion, on_merged=lambda merged: record(merged.success),
+                    )
+                else:
+                    result = process_single_file(
+                        req_file, project_root, dirs, resume_from_step=resume_from_step,
+                        scope=scope, hint=hint, ui_dir=ui_dir, label=label, on_step_done=on_step_done, ctx=ctx,
+                        ingestion=ingestion,
+                    )
+            finally:
+                # 依赖图每个需求落盘一次（中断时也保留已完成步骤的记录）
+                graph.save()
+            span_args.update(success=result[0], failed_step=result[1])
+        if merge_queue is None or not (result[0] or recorded.is_set()):
+            record(result[0], result[1])
+        return result
+
+    def prepare_watched(req_file: Path) -> bool:
+        """
+        --watch 检测到变化的文件：增量模式下从第一个需重跑的步骤开始，否则从头处理；
+        与仍存在的其他需求同名的文件跳过
+        """
+        owner = stem_owners.setdefault(req_file.stem, req_file)
+        if owner != req_file and owner.exists():
+            _progress(
+                f"\n跳过 {req_file.relative_to(req_dir).as_posix()}：与 {owner.relative_to(req_dir).as_posix()} 同名，"
+                "产出文档、worktree 与分支会互相覆盖，请重命名"
+            )
+            return False
+        stem_owners[req_file.stem] = req_file
+        step = None
+        if incremental:
+            step = graph.first_dirty_step(req_file, graph_mod.artifact_paths(req_file, dirs, ui_dir), params)
+            if step is None:
+                _progress(f"\n{req_file.name} 已是最新，无需重跑")
+                return False
+        start_steps[req_file] = step
+        return True
+
+    def project_check() -> bool:
+        _progress("\n执行项目整体完成度与测试检查...")
+        return process_project_check(project_root, dirs, scope=scope, hint=hint, ctx=ctx)
+
+    # 项目级检查结果；None 表示尚未执行
+    check_ok: Optional[bool] = None
+    if watch:
+        if jobs > 1:
+            print(f"并发处理: 最多同时处理 {jobs} 个需求文件")
+        failures, check_ok = _process_files_watch(
+            files, req_dir, files_done, jobs, process, prepare_watched, project_check, watch_debounce, rules,
+        )
+    elif jobs > 1 and len(files) > 1:
+        print(f"并发处理: 最多同时处理 {min(jobs, len(files))} 个需求文件")
+        failures = _process_files_parallel(files, files_done, jobs, process)
+    else:
+        failures = _process_files_sequential(files, files_done, process)
+
+    # 并发时合并可能由其他 job 触发，补充汇总尚未报告的冲突；
+    # 前序需求未提交结果（被取消或中断）时，排在其后的 worktree 始终未合并，同样计为失败
+    if merge_queue is not None:
+        reported = {f for f, _, _ in failures}
+        by_stem = {f.stem: f for f in files}
+        unmerged = [(r.worktree, _format_conflict(r)) for r in merge_queue.conflicts]
+        unmerged += [(wt, f"未合并：前序需求未完成，分支 {wt.branch} 已保留") for wt in merge_queue.waiting]
+        for wt, reason in unmerged:
+            req_file = by_stem.get(wt.name)
+            if req_file is not None and req_file not in reported:
+                reported.add(req_file)
+                failures.append((req_file, None, reason))
+                if req_file.name in files_done:
+                    files_done.remove(req_file.name)
+
+    if failures:
+        _report_run_stats(ctx, logger)
+        duration_str = _print_duration(start_time)
+        duration_sec = (datetime.now() - start_time).total_seconds()
+        summary = "；".join(f"{f.name} {_format_failed_step(step, name)}" for f, step, name in failures)
+        _log_run_end(ctx, logger, False, duration_sec, len(files_done), f"{summary} 失败")
+        if len(failures) == 1:
+            req_file, failed_step, failed_step_name = failures[0]
             print(f"\n处理失败: {req_file.name}")
-            print(f"  失败步骤: Step {failed_step} - {failed_step_name}")
-            print(f"  建议: 查看上方 Agent 输出排查原因；或使用 --resume 从断点继续后手动修复")
-            state.data["current_file"] = str(req_file)
-            state.save()
-            if notify_emails:
-                notify.send_workflow_complete(
-                    notify_emails,
-                    success=False,
-                    project_path=str(project_root),
-                    files_processed=[str(f) for f in files_done],
-                    duration_str=duration_str,
-                    error_msg=f"处理失败: {req_file.name}（步骤 {failed_step} {failed_step_name or ''}）",
-                )
-            return 1
-        files_done.append(req_file.name)
-        state.data.setdefault("files_done", []).append(str(req_file))
+            print(f"  失败步骤: {_format_failed_step(failed_step, failed_step_name)}")
+        else:
+            print(f"\n处理失败: {len(failures)} 个需求文件（成功 {len(files_done)} 个）")
+            for req_file, failed_step, failed_step_name in failures:
+                print(f"  {req_file.name}: {_format_failed_step(failed_step, failed_step_name)}")
+        print(f"  建议: 查看上方 Agent 输出排查原因；或使用 --resume 从断点继续后手动修复")
+        state.data["current_file"] = str(failures[0][0])
         state.save()
+        if notify_emails:
+            notify.send_workflow_complete(
+                notify_emails,
+                success=False,
+                project_path=str(project_root),
+                files_processed=[str(f) for f in files_done],
+                duration_str=duration_str,
+                error_msg=f"处理失败: {summary}",
+            )
+        return 1
+
+    if watch and check_ok is None:
+        _report_run_stats(ctx, logger)
+        _print_duration(start_time)
+        duration_sec = (datetime.now() - start_time).total_seconds()
+        _log_run_end(ctx, logger, False, duration_sec, len(files_done), "停止监听时项目级检查未执行")
+        print("已停止监听。最近完成的需求尚未执行项目级检查，再次运行将自动续传并执行检查")
+        return 1
 
-    # 全部需求完成后，执行项目级检查
-    print("\n执行项目整体完成度与测试检查...")
-    if not process_project_check(project_root, dirs, scope=scope, hint=hint):
+    # 全部需求完成后，执行项目级检查（--watch 时已在队列排空时执行）
+    if check_ok is None:
+        check_ok = project_check()
+    if not check_ok:
+        _report_run_stats(ctx, logger)
         duration_str = _print_duration(start_time)
         duration_sec = (datetime.now() - start_time).total_seconds()
-        log_workflow_end(logger, False, duration_sec, len(files_done), "项目级检查或补充未完全成功")
+        _log_run_end(ctx, logger, False, duration_sec, len(files_done), "项目级检查或补充未完全成功")
         print("项目级检查或补充未完全成功")
         if notify_emails:
             notify.send_workflow_complete(
@@ -417,9 +1209,10 @@ def run_workflow(
             )
         return 1
 
+    _report_run_stats(ctx, logger)
     duration_str = _print_duration(start_time)
     duration_sec = (datetime.now() - start_time).total_seconds()
-    log_workflow_end(logger, True, duration_sec, len(files_done))
+    _log_run_end(ctx, logger, True, duration_sec, len(files_done))
     print("\n所有需求处理完成。")
     state.data["completed"] = True
     state.data["current_file"] = None
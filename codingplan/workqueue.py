@@ -0,0 +1,275 @@
+"""
+多机共享的需求队列：共享文件系统上的租约文件（.codingplan/queue/），供 codingplan worker 使用
+
+    leases/<键>.lease   认领中（O_EXCL 创建；持有者定期更新 mtime 作为心跳）
+    done/<键>.json      已成功（记录需求内容摘要，需求修改后重新处理）
+    failed/<键>.json    已失败（默认不再认领，worker --retry-failed 清除）
+
+键为需求文件相对需求目录的路径（如 app/login.md），不同子目录下的同名需求互不冲突；
+文件名中 % 与 / 转义为 %25、%2F，过长时截断并附加摘要（见 key_filename）
+
+只依赖 O_EXCL 创建、rename 与 mkdir 的原子性，NFS 等共享文件系统上同样适用；
+心跳与过期判断均使用文件系统时间，不受各机器时钟偏差影响
+"""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import unquote
+
+from .fsutil import write_json_atomic
+
+QUEUE_DIR = "queue"
+
+# 租约有效期（秒）：持有者超过该时长未心跳即视为崩溃，租约可被其他 worker 接管
+DEFAULT_LEASE_TTL = 120
+
+# 项目级检查（Step 10/11）的租约与结果键
+PROJECT_CHECK_KEY = "__project_check__"
+
+# 目录锁持有超过该时长（秒）视为持有者已崩溃
+LOCK_STALE_SECONDS = 60
+
+# 键转义后超过该字节数时截断并附加摘要（留出 .lease 等后缀与临时文件前后缀的余量）
+_MAX_KEY_BYTES = 180
+
+
+def fs_now(directory: Path) -> float:
+    """文件系统当前时间（更新 directory/.clock 的 mtime 后读取）"""
+    clock = directory / ".clock"
+    try:
+        with open(clock, "a"):
+            pass
+        os.utime(clock, None)
+        return clock.stat().st_mtime
+    except OSError:
+        return time.time()
+
+
+def _read_json(path: Path) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class DirLock:
+    """基于 mkdir 原子性的跨进程、跨主机锁；持有超过 stale 秒的锁视为遗留并被接管"""
+
+    def __init__(self, path: Path, stale: float = LOCK_STALE_SECONDS, timeout: float = 300):
+        self.path = path
+        self.stale = stale
+        self.timeout = timeout
+
+    def __enter__(self) -> "DirLock":
+        deadline = time.monotonic() + self.timeout
+        delay = 0.02
+        while True:
+            try:
+                os.mkdir(self.path)
+                return self
+            except FileExistsError:
+                pass
+            try:
+                if fs_now(self.path.parent) - self.path.stat().st_mtime > self.stale:
+                    stale = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}.stale")
+                    os.rename(self.path, stale)
+                    os.rmdir(stale)
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"等待锁超时: {self.path}")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def __exit__(self, *exc) -> None:
+        try:
+            os.rmdir(self.path)
+        except OSError:
+            pass
+
+
+def update_json(
+    path: Path,
+    update: Callable[[dict], None],
+    default: Optional[Callable[[], dict]] = None,
+    indent: Optional[int] = 2,
+) -> dict:
+    """在目录锁保护下读取 JSON 文件、调用 update(data) 修改后原子写回，返回写入的数据（indent 同 write_json_atomic）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with DirLock(path.with_name(path.name + ".lock")):
+        data = _read_json(path)
+        if data is None:
+            data = default() if default else {}
+        update(data)
+        write_json_atomic(path, data, indent=indent)
+    return data
+
+
+def key_filename(key: str) -> str:
+    """队列键对应的文件名（不含后缀）：转义 % 与 /，过长时保留开头并附加 sha256 前 16 位"""
+    name = key.replace("%", "%25").replace("/", "%2F")
+    if len(name.encode("utf-8")) <= _MAX_KEY_BYTES:
+        return name
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    head = name.encode("utf-8")[:_MAX_KEY_BYTES - 17].decode("utf-8", errors="ignore")
+    return f"{head}~{digest}"
+
+
+def default_worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseQueue:
+    """需求文件的认领、心跳、过期接管与结果记录"""
+
+    def __init__(self, root: Path, worker: str, ttl: int = DEFAULT_LEASE_TTL):
+        self.root = root
+        self.worker = worker
+        self.ttl = ttl
+        self.leases_dir = root / "leases"
+        self.done_dir = root / "done"
+        self.failed_dir = root / "failed"
+        for d in (self.leases_dir, self.done_dir, self.failed_dir):
+            d.mkdir(parents=True, exist_ok=True)
+        self._tokens: dict[str, str] = {}  # 本 worker 持有的租约 -> 令牌
+
+    def _lease_path(self, key: str) -> Path:
+        return self.leases_dir / f"{key_filename(key)}.lease"
+
+    def _record_path(self, directory: Path, key: str) -> Path:
+        return directory / f"{key_filename(key)}.json"
+
+    def _expired(self, path: Path) -> bool:
+        try:
+            return fs_now(self.root) - path.stat().st_mtime > self.ttl
+        except FileNotFoundError:
+            return True
+
+    def try_claim(self, key: str) -> bool:
+        """认领 key；已被持有且未过期时返回 False，过期的租约先接管（rename 保证只有一个 worker 成功）"""
+        path = self._lease_path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not self._expired(path):
+                    return False
+                previous = _read_json(path) or {}
+                stale = path.with_name(f"{path.name}.{uuid.uuid4().hex}.stale")
+                try:
+                    os.rename(path, stale)
+                except FileNotFoundError:
+                    return False  # 已被其他 worker 接管
+                stolen = _read_json(stale) or {}
+                if stolen.get("token") != previous.get("token") or not self._expired(stale):
+                    # 判断过期后、重命名前，租约已被重新认领或刚续约：归还（link 不覆盖已存在的租约）
+                    try:
+                        os.link(stale, path)
+                    except OSError:
+                        pass
+                    stale.unlink(missing_ok=True)
+                    return False
+                stale.unlink(missing_ok=True)
+                print(f"接管过期租约: {key}（原持有者 {previous.get('worker', '未知')}）", flush=True)
+                continue
+            token = uuid.uuid4().hex
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({
+                    "worker": self.worker, "host": socket.gethostname(), "pid": os.getpid(),
+                    "key": key, "token": token, "claimed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                }, f, ensure_ascii=False)
+            self._tokens[key] = token
+            return True
+        return False
+
+    def owns(self, key: str) -> bool:
+        info = _read_json(self._lease_path(key))
+        return info is not None and info.get("token") == self._tokens.get(key)
+
+    def heartbeat(self, key: str) -> bool:
+        """续约；租约已被接管（过期后被其他 worker 认领）时返回 False"""
+        if not self.owns(key):
+            return False
+        try:
+            os.utime(self._lease_path(key), None)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def release(self, key: str) -> None:
+        if self.owns(key):
+            self._lease_path(key).unlink(missing_ok=True)
+        self._tokens.pop(key, None)
+
+    def active_leases(self) -> dict[str, dict]:
+        """未过期的租约：key -> 租约信息（含 age 秒）"""
+        leases = {}
+        now = fs_now(self.root)
+        for path in self.leases_dir.glob("*.lease"):
+            try:
+                age = now - path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if age <= self.ttl:
+                info = _read_json(path) or {}
+                info["age"] = age
+                leases[info.get("key") or unquote(path.name[: -len(".lease")])] = info
+        return leases
+
+    def mark_done(self, key: str, record: dict) -> None:
+        write_json_atomic(self._record_path(self.done_dir, key), {**record, "key": key, "worker": self.worker})
+        self._record_path(self.failed_dir, key).unlink(missing_ok=True)
+
+    def mark_failed(self, key: str, record: dict) -> None:
+        write_json_atomic(self._record_path(self.failed_dir, key), {**record, "key": key, "worker": self.worker})
+        self._record_path(self.done_dir, key).unlink(missing_ok=True)
+
+    def done(self, key: str) -> Optional[dict]:
+        return _read_json(self._record_path(self.done_dir, key))
+
+    def failed(self, key: str) -> Optional[dict]:
+        return _read_json(self._record_path(self.failed_dir, key))
+
+    def clear_failed(self) -> int:
+        count = 0
+        for path in self.failed_dir.glob("*.json"):
+            path.unlink(missing_ok=True)
+            count += 1
+        return count
+
+
+class Heartbeat:
+    """后台线程定期续约（间隔为有效期的 1/4），租约丢失时 lost 置为 True"""
+
+    def __init__(self, queue: LeaseQueue, key: str):
+        self.queue = queue
+        self.key = key
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"codingplan-heartbeat-{key_filename(key)}", daemon=True)
+
+    def _run(self) -> None:
+        interval = max(1.0, self.queue.ttl / 4)
+        while not self._stop.wait(interval):
+            if not self.queue.heartbeat(self.key):
+                self.lost = True
+                print(f"警告: {self.key} 的租约已丢失（心跳中断过久，已被其他 worker 接管）", flush=True)
+                return
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
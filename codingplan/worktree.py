@@ -0,0 +1,228 @@
+"""Git worktree 隔离：每个需求在独立 worktree 中实现，完成后按顺序合并回主分支"""
+
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+from .config import DIR_OUTPUTS, DIR_UNCERTAIN
+
+# worktree 存放目录（相对项目根目录），目录内自带 .gitignore 避免被主仓库跟踪
+WORKTREES_DIR = ".codingplan/worktrees"
+BRANCH_PREFIX = "codingplan/"
+
+# 未配置 git 身份时用于 worktree 提交的默认身份
+_FALLBACK_IDENTITY = ["-c", "user.name=CodingPlan", "-c", "user.email=codingplan@localhost"]
+
+
+@dataclass
+class Worktree:
+    """单个需求对应的 worktree"""
+
+    name: str
+    path: Path
+    branch: str
+
+
+@dataclass
+class MergeResult:
+    """合并结果"""
+
+    worktree: Worktree
+    success: bool
+    message: str = ""
+    conflicts: list[str] = field(default_factory=list)
+
+
+def _git(args: list[str], cwd: Path, check: bool = False) -> subprocess.CompletedProcess:
+    """执行 git 命令并捕获输出"""
+    return subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=check,
+    )
+
+
+def is_git_repo(project_root: Path) -> bool:
+    """检查目录是否为含至少一次提交的 git 仓库"""
+    try:
+        result = _git(["rev-parse", "--verify", "HEAD"], project_root)
+    except FileNotFoundError:
+        return False
+    return result.returncode == 0
+
+
+def _identity_args(cwd: Path) -> list[str]:
+    """若未配置 user.email，则提交时使用默认身份"""
+    result = _git(["config", "user.email"], cwd)
+    if result.returncode == 0 and result.stdout.strip():
+        return []
+    return list(_FALLBACK_IDENTITY)
+
+
+def _safe_name(name: str) -> str:
+    """将需求名转换为可用作分支名/目录名的字符串"""
+    safe = "".join(c if c.isalnum() or c in "-_." else "-" for c in name)
+    return safe.strip(".-") or "req"
+
+
+def create_worktree(project_root: Path, name: str, reset: bool = False) -> Worktree:
+    """
+    基于当前 HEAD 为需求创建 worktree。
+
+    已存在的同名 worktree（上次失败运行残留）默认直接复用以便续传；reset=True 时先移除再重建。
+    """
+    safe = _safe_name(name)
+    base_dir = project_root / WORKTREES_DIR
+    base_dir.mkdir(parents=True, exist_ok=True)
+    ignore_file = base_dir / ".gitignore"
+    if not ignore_file.exists():
+        ignore_file.write_text("*\n", encoding="utf-8")
+
+    wt = Worktree(name=name, path=base_dir / safe, branch=f"{BRANCH_PREFIX}{safe}")
+    if not reset and (wt.path / ".git").exists():
+        return wt
+    branch_exists = _git(["rev-parse", "--verify", "--quiet", f"refs/heads/{wt.branch}"], project_root).returncode == 0
+    if not reset and branch_exists:
+        # 上次合并冲突时保留的分支：在其基础上继续
+        remove_worktree(project_root, wt, delete_branch=False)
+        result = _git(["worktree", "add", str(wt.path), wt.branch], project_root)
+    else:
+        remove_worktree(project_root, wt, delete_branch=True)
+        result = _git(["worktree", "add", "-b", wt.branch, str(wt.path), "HEAD"], project_root)
+    if result.returncode != 0:
+        raise RuntimeError(f"创建 worktree 失败: {result.stderr.strip()}")
+    return wt
+
+
+def commit_worktree(wt: Worktree, message: str) -> bool:
+    """提交 worktree 中的全部改动（无改动时视为成功）"""
+    _git(["add", "-A"], wt.path)
+    status = _git(["status", "--porcelain"], wt.path)
+    if not status.stdout.strip():
+        return True
+    result = _git([*_identity_args(wt.path), "commit", "-q", "-m", message], wt.path)
+    return result.returncode == 0
+
+
+def merge_worktree(project_root: Path, wt: Worktree) -> MergeResult:
+    """
+    将 worktree 分支合并到主工作区当前分支。
+
+    冲突时中止合并（git merge --abort），保留分支供手动处理，主工作区不会留下冲突标记。
+    """
+    result = _git(
+        [*_identity_args(project_root), "merge", "--no-ff", "--no-edit", "-m", f"Merge {wt.branch}", wt.branch],
+        project_root,
+    )
+    if result.returncode == 0:
+        return MergeResult(worktree=wt, success=True)
+    conflicts = [
+        line.strip()
+        for line in _git(["diff", "--name-only", "--diff-filter=U"], project_root).stdout.splitlines()
+        if line.strip()
+    ]
+    _git(["merge", "--abort"], project_root)
+    message = (result.stderr or result.stdout).strip().splitlines()
+    return MergeResult(
+        worktree=wt,
+        success=False,
+        message=message[-1] if message else "合并失败",
+        conflicts=conflicts,
+    )
+
+
+def sync_ignored_outputs(project_root: Path, wt: Worktree) -> None:
+    """
+    将 worktree 中被 git 忽略的 outputs/、uncertain/ 文件复制回主工作区。
+
+    已跟踪的文档随合并带回；被忽略的文档不会进入分支，需单独复制。
+    """
+    for dir_name in (DIR_OUTPUTS, DIR_UNCERTAIN):
+        src_dir = wt.path / dir_name
+        if not src_dir.is_dir():
+            continue
+        for src in src_dir.rglob("*"):
+            if not src.is_file():
+                continue
+            rel = src.relative_to(wt.path)
+            if _git(["check-ignore", "-q", str(rel)], project_root).returncode != 0:
+                continue
+            dst = project_root / rel
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(src, dst)
+
+
+def remove_worktree(project_root: Path, wt: Worktree, delete_branch: bool = True) -> None:
+    """移除 worktree（及其分支）"""
+    if wt.path.exists():
+        _git(["worktree", "remove", "--force", str(wt.path)], project_root)
+        if wt.path.exists():
+            shutil.rmtree(wt.path, ignore_errors=True)
+    _git(["worktree", "prune"], project_root)
+    if delete_branch:
+        _git(["branch", "-D", wt.branch], project_root)
+
+
+class MergeQueue:
+    """
+    按需求顺序合并 worktree 的队列。
+
+    各需求完成顺序不定，第 i 个需求的合并会等待前 i-1 个需求全部完成（成功或失败）后才执行，
+    保证合并顺序与需求文件顺序一致。失败的需求不合并、也不阻塞后续需求。
+    提交时可附带 on_done，在该需求实际合并（成功或冲突）后调用，合并可能由之后提交的其他需求触发
+    """
+
+    def __init__(self, project_root: Path, on_merged: Optional[Callable[[MergeResult], None]] = None):
+        self.project_root = project_root
+        self.on_merged = on_merged
+        self.results: list[MergeResult] = []
+        self._pending: dict[int, tuple[Optional[Worktree], Optional[Callable[[MergeResult], None]]]] = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def submit(
+        self, index: int, wt: Optional[Worktree], on_done: Optional[Callable[[MergeResult], None]] = None
+    ) -> list[MergeResult]:
+        """
+        提交第 index 个需求的结果（wt 为 None 表示该需求失败，跳过合并）。
+
+        Returns:
+            本次提交触发的合并结果
+        """
+        merged: list[MergeResult] = []
+        with self._lock:
+            self._pending[index] = (wt, on_done)
+            while self._next in self._pending:
+                ready, done = self._pending.pop(self._next)
+                self._next += 1
+                if ready is None:
+                    continue
+                result = merge_worktree(self.project_root, ready)
+                sync_ignored_outputs(self.project_root, ready)
+                if result.success:
+                    remove_worktree(self.project_root, ready, delete_branch=True)
+                else:
+                    # 保留分支，便于手动解决冲突
+                    remove_worktree(self.project_root, ready, delete_branch=False)
+                self.results.append(result)
+                merged.append(result)
+                if self.on_merged:
+                    self.on_merged(result)
+                if done:
+                    done(result)
+        return merged
+
+    @property
+    def waiting(self) -> list[Worktree]:
+        """已提交但因前序需求未提交结果而仍未合并的 worktree"""
+        with self._lock:
+            return [wt for _, (wt, _) in sorted(self._pending.items()) if wt is not None]
+
+    @property
+    def conflicts(self) -> list[MergeResult]:
+        return [r for r in self.results if not r.success]
@@ -0,0 +1,237 @@
+"""convert：需求文档本地转换（DOCX / PDF 解析及畸形输入）"""
+
+import zipfile
+import zlib
+from pathlib import Path
+
+import pytest
+
+from codingplan.convert import ConversionError, convert_to_markdown
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+# ---------------------------------------------------------------- 构造测试文件
+
+
+def make_docx(path: Path, body: str, styles: str = "", rels: str = "", document: str = None) -> Path:
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr(
+            "word/document.xml",
+            document if document is not None
+            else f'<w:document xmlns:w="{W_NS}" xmlns:r="{R_NS}"><w:body>{body}</w:body></w:document>',
+        )
+        if styles:
+            zf.writestr("word/styles.xml", f'<w:styles xmlns:w="{W_NS}">{styles}</w:styles>')
+        if rels:
+            zf.writestr(
+                "word/_rels/document.xml.rels",
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                f"{rels}</Relationships>",
+            )
+    return path
+
+
+def para(text: str, style: str = "", bold: bool = False, num: tuple = None) -> str:
+    ppr = ""
+    if style or num:
+        ppr = "<w:pPr>"
+        if style:
+            ppr += f'<w:pStyle w:val="{style}"/>'
+        if num:
+            ppr += f'<w:numPr><w:ilvl w:val="{num[1]}"/><w:numId w:val="{num[0]}"/></w:numPr>'
+        ppr += "</w:pPr>"
+    rpr = "<w:rPr><w:b/></w:rPr>" if bold else ""
+    return f"<w:p>{ppr}<w:r>{rpr}<w:t>{text}</w:t></w:r></w:p>"
+
+
+def make_pdf(path: Path, objects: dict, trailer: bytes = b"<< /Root 1 0 R >>", header: bytes = b"%PDF-1.4\n") -> Path:
+    """按对象号写入 PDF（不含 xref，解析器按 "n 0 obj" 建立索引）"""
+    out = bytearray(header)
+    for num, body in objects.items():
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    out += b"trailer\n" + trailer + b"\n%%EOF\n"
+    path.write_bytes(bytes(out))
+    return path
+
+
+def stream(data: bytes, attrs: bytes = b"") -> bytes:
+    return b"<< /Length %d %s >>\nstream\n" % (len(data), attrs) + data + b"\nendstream"
+
+
+def simple_pdf(path: Path, content: bytes, font: bytes = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+               extra: dict = None, content_attrs: bytes = b"") -> Path:
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        3: b"<< /Type /Page /Parent 2 0 R /Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        4: stream(content, content_attrs),
+        5: font,
+    }
+    objects.update(extra or {})
+    return make_pdf(path, objects)
+
+
+def cmap(bfchar: bytes) -> bytes:
+    return (
+        b"/CIDInit /ProcSet findresource begin\nbegincmap\n"
+        b"1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+        b"1 beginbfchar\n" + bfchar + b"\nendbfchar\nendcmap\nend"
+    )
+
+
+TYPE0_FONT = b"<< /Type /Font /Subtype /Type0 /BaseFont /SimSun /Encoding /Identity-H /ToUnicode 6 0 R >>"
+
+
+# ---------------------------------------------------------------- 文本
+
+
+def test_md_normalizes_bom_and_newlines(tmp_path):
+    path = tmp_path / "a.md"
+    path.write_bytes("﻿# 标题\r\n\r\n正文\x00\r\n".encode("utf-8"))
+    result = convert_to_markdown(path)
+    assert result.source_format == "md"
+    assert result.markdown == "# 标题\n\n正文\n"
+
+
+def test_txt_gb18030_gets_title(tmp_path):
+    path = tmp_path / "登录.txt"
+    path.write_bytes("用户可以登录".encode("gb18030"))
+    assert convert_to_markdown(path).markdown == "# 登录\n\n用户可以登录\n"
+
+
+def test_unsupported_extension(tmp_path):
+    path = tmp_path / "a.rtf"
+    path.write_text("x")
+    with pytest.raises(ConversionError, match="不支持的格式"):
+        convert_to_markdown(path)
+
+
+# ---------------------------------------------------------------- DOCX
+
+
+def test_docx_headings_lists_bold_links_and_tables(tmp_path):
+    body = (
+        para("登录需求", style="Heading1")
+        + para("用户名", bold=True)
+        + para("第一项", num=("1", "0"))
+        + para("第二项", num=("1", "1"))
+        + '<w:p><w:hyperlink r:id="rId9"><w:r><w:t>设计稿</w:t></w:r></w:hyperlink></w:p>'
+        + "<w:tbl>"
+        + "<w:tr><w:tc>" + para("字段") + "</w:tc><w:tc>" + para("说明") + "</w:tc></w:tr>"
+        + "<w:tr><w:tc>" + para("a|b") + "</w:tc><w:tc>" + para("必填") + "</w:tc></w:tr>"
+        + "</w:tbl>"
+    )
+    styles = '<w:style w:styleId="Heading1"><w:name w:val="heading 1"/></w:style>'
+    rels = '<Relationship Id="rId9" Target="https://www.figma.com/design/abc" TargetMode="External"/>'
+    result = convert_to_markdown(make_docx(tmp_path / "a.docx", body, styles, rels))
+    assert result.source_format == "docx"
+    assert result.markdown == (
+        "# 登录需求\n\n"
+        "**用户名**\n\n"
+        "- 第一项\n"
+        "  - 第二项\n\n"
+        "[设计稿](https://www.figma.com/design/abc)\n\n"
+        "| 字段 | 说明 |\n| --- | --- |\n| a\\|b | 必填 |\n"
+    )
+
+
+def test_docx_not_a_zip(tmp_path):
+    path = tmp_path / "a.docx"
+    path.write_bytes(b"not a zip file")
+    with pytest.raises(ConversionError):
+        convert_to_markdown(path)
+
+
+def test_docx_missing_document_xml(tmp_path):
+    path = tmp_path / "a.docx"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("word/styles.xml", "<x/>")
+    with pytest.raises(ConversionError):
+        convert_to_markdown(path)
+
+
+def test_docx_malformed_xml(tmp_path):
+    with pytest.raises(ConversionError):
+        convert_to_markdown(make_docx(tmp_path / "a.docx", "", document="<w:document><w:body>"))
+
+
+def test_docx_without_text(tmp_path):
+    with pytest.raises(ConversionError, match="未提取到文本"):
+        convert_to_markdown(make_docx(tmp_path / "a.docx", "<w:p/>"))
+
+
+# ---------------------------------------------------------------- PDF
+
+
+def test_pdf_latin_text_lines(tmp_path):
+    content = b"BT /F1 12 Tf 72 700 Td (Hello) Tj 0 -14 Td [(Wor) -20 (ld)] TJ ET"
+    result = convert_to_markdown(simple_pdf(tmp_path / "doc.pdf", content))
+    assert result.source_format == "pdf"
+    assert result.pages == 1
+    assert result.markdown == "# doc\n\nHello\nWorld\n"
+
+
+def test_pdf_flate_content_and_tounicode(tmp_path):
+    content = zlib.compress(b"BT /F1 12 Tf 72 700 Td <00010002> Tj ET")
+    to_unicode = stream(cmap(b"<0001> <767B>\n<0002> <5F55>"))
+    path = simple_pdf(
+        tmp_path / "cn.pdf", content, font=TYPE0_FONT, extra={6: to_unicode}, content_attrs=b"/Filter /FlateDecode"
+    )
+    assert convert_to_markdown(path).markdown == "# cn\n\n登录\n"
+
+
+def test_pdf_malformed_bfchar_falls_back(tmp_path):
+    # 目标为奇数位十六进制（<004>）
+    to_unicode = stream(cmap(b"<41> <004>"))
+    path = simple_pdf(tmp_path / "a.pdf", b"BT /F1 12 Tf (A) Tj ET", font=TYPE0_FONT, extra={6: to_unicode})
+    with pytest.raises(ConversionError):
+        convert_to_markdown(path)
+
+
+def test_pdf_not_pdf(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"hello")
+    with pytest.raises(ConversionError, match="不是 PDF"):
+        convert_to_markdown(path)
+
+
+def test_pdf_empty_file(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"")
+    with pytest.raises(ConversionError, match="空文件"):
+        convert_to_markdown(path)
+
+
+def test_pdf_encrypted(tmp_path):
+    path = make_pdf(tmp_path / "a.pdf", {1: b"<< /Type /Catalog >>"}, trailer=b"<< /Root 1 0 R /Encrypt 9 0 R >>")
+    with pytest.raises(ConversionError, match="已加密"):
+        convert_to_markdown(path)
+
+
+def test_pdf_unsupported_filter(tmp_path):
+    path = simple_pdf(tmp_path / "a.pdf", b"xx", content_attrs=b"/Filter /DCTDecode")
+    with pytest.raises(ConversionError, match="不支持的 PDF 压缩方式"):
+        convert_to_markdown(path)
+
+
+def test_pdf_without_text(tmp_path):
+    path = simple_pdf(tmp_path / "a.pdf", b"q 100 0 0 100 0 0 cm /Im0 Do Q")
+    with pytest.raises(ConversionError, match="未提取到文本"):
+        convert_to_markdown(path)
+
+
+def test_pdf_truncated_never_crashes(tmp_path):
+    content = zlib.compress(b"BT /F1 12 Tf 72 700 Td <00010002> Tj ET")
+    full = simple_pdf(
+        tmp_path / "full.pdf", content, font=TYPE0_FONT,
+        extra={6: stream(cmap(b"<0001> <767B>\n<0002> <5F55>"))}, content_attrs=b"/Filter /FlateDecode",
+    ).read_bytes()
+    path = tmp_path / "cut.pdf"
+    for size in range(1, len(full), 7):
+        path.write_bytes(full[:size])
+        try:
+            convert_to_markdown(path)
+        except ConversionError:
+            pass